@@ -1,24 +1,90 @@
 #
 #  Copyright (c) 2026
-#  External Joyce Messaging API (token auth, single POST /send).
+#  External Joyce Messaging API (token auth: POST /send, sync and ASGI views; GET message log).
 #
 from __future__ import annotations
 
+import json
 import logging
 
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from quark.jasmin.connection import JasminNotConfigured
-from quark.jasmin.models import JasminUser
+from quark.jasmin.user_cache import get_sending_user
+from quark.messaging.async_send import asubmit_send, send_context
 from quark.messaging.authentication import MessagingAPITokenAuthentication
+from quark.messaging.message_log import (
+    InvalidCursor,
+    apply_outbound_message_filters,
+    count_messages,
+    keyset_page,
+    page_size,
+)
+from quark.messaging.models import OutboundMessage
 from quark.messaging.services import expand_send_payload, submit_send
 
 logger = logging.getLogger(__name__)
 
 
+def send_options(payload: dict) -> dict:
+    """Optional submit arguments of a send payload, with the API defaults."""
+    from_addr = (payload.get("from") or payload.get("from_addr") or "").strip()
+    try:
+        dlr_level = int(payload.get("dlr_level") or payload.get("dlr-level") or 3)
+    except (TypeError, ValueError):
+        dlr_level = 3
+    try:
+        priority = int(payload.get("priority") or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    # Optional: hand REST sendbatch dispatch to workers and answer 202 at once
+    defer_rest = payload.get("async")
+    if not isinstance(defer_rest, bool):
+        defer_rest = None
+    return {"from_addr": from_addr, "dlr_level": dlr_level, "priority": priority, "defer_rest": defer_rest}
+
+
+def result_body(result) -> dict:
+    return {
+        "batch_id": result.batch_id,
+        "client_batch_id": result.client_batch_id or None,
+        "mode": result.mode,
+        "message_count": result.message_count,
+        "counts": result.counts,
+        "jasmin_batch_ids": result.jasmin_batch_ids,
+        "messages": [
+            {
+                "id": m.pk,
+                "to": m.to_addr,
+                "status": m.status,
+                "client_message_id": m.client_message_id or None,
+                "client_batch_id": m.client_batch_id or None,
+                "jasmin_msg_id": m.jasmin_msg_id or None,
+                "error": m.error_message or None,
+            }
+            for m in result.messages[:100]
+        ],
+        "messages_truncated": result.message_count > len(result.messages[:100]),
+        "throttle": result.throttle or None,
+    }
+
+
+def result_status(result) -> int:
+    if result.mode in ("single_async", "bulk_async", "bulk_rest_async"):
+        return status.HTTP_202_ACCEPTED
+    return status.HTTP_200_OK
+
+
 class MessagingSendAPIView(APIView):
     """
     POST /api/v1/messaging/send/
@@ -46,15 +112,7 @@ class MessagingSendAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        jasmin_user = (
-            JasminUser.objects.filter(
-                username=username,
-                group__workspace=workspace,
-                enabled=True,
-            )
-            .select_related("group")
-            .first()
-        )
+        jasmin_user = get_sending_user(workspace, username)
         if not jasmin_user:
             return Response(
                 {"error": f"Enabled Jasmin user '{username}' not found in this workspace"},
@@ -66,26 +124,14 @@ class MessagingSendAPIView(APIView):
         except ValueError as exc:
             return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        from_addr = (payload.get("from") or payload.get("from_addr") or "").strip()
-        try:
-            dlr_level = int(payload.get("dlr_level") or payload.get("dlr-level") or 3)
-        except (TypeError, ValueError):
-            dlr_level = 3
-        try:
-            priority = int(payload.get("priority") or 0)
-        except (TypeError, ValueError):
-            priority = 0
-
         try:
             result = submit_send(
                 workspace=workspace,
                 jasmin_user=jasmin_user,
                 items=items,
-                from_addr=from_addr,
-                dlr_level=dlr_level,
-                priority=priority,
                 client_batch_id=client_batch_id,
                 created_by=request.user,
+                **send_options(payload),
             )
         except JasminNotConfigured as exc:
             return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -96,28 +142,186 @@ class MessagingSendAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+        return Response(result_body(result), status=result_status(result))
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncMessagingSendView(View):
+    """
+    POST /api/v1/messaging/send/ as a native async view (JOYCE_ASYNC_SEND_API).
+
+    Same token auth, payload and responses as MessagingSendAPIView (JSON body
+    only). Under ASGI a single send awaits Jasmin on the event loop instead
+    of holding a worker thread; see quark.messaging.async_send.
+    """
+
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(payload, dict):
+            payload = {}
+
+        # Token, owner, Jasmin user and connection in one hop to the ORM (all cached when warm)
+        error, context = await sync_to_async(self.authenticate)(request, payload)
+        if error:
+            return error
+        user, workspace, jasmin_user, single_send = context
+
+        try:
+            items, client_batch_id = expand_send_payload(payload)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = await asubmit_send(
+                workspace=workspace,
+                jasmin_user=jasmin_user,
+                items=items,
+                client_batch_id=client_batch_id,
+                created_by=user,
+                context=single_send,
+                **send_options(payload),
+            )
+        except JasminNotConfigured as exc:
+            return JsonResponse({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception:
+            logger.exception("Messaging send API failed")
+            return JsonResponse(
+                {"error": "Failed to submit messages"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return JsonResponse(result_body(result), status=result_status(result))
+
+    @staticmethod
+    def authenticate(request, payload: dict):
+        """
+        ``(error response, None)`` or ``(None, (user, workspace, jasmin user,
+        send_context))``; sync, so the view runs it through ``sync_to_async``.
+        """
+        try:
+            authenticated = MessagingAPITokenAuthentication().authenticate(request)
+        except AuthenticationFailed as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=status.HTTP_403_FORBIDDEN), None
+        if authenticated is None:
+            return (
+                JsonResponse({"detail": str(NotAuthenticated.default_detail)}, status=status.HTTP_403_FORBIDDEN),
+                None,
+            )
+
+        user, workspace = authenticated[0], request.workspace
+        if not workspace.messaging_api_enabled:
+            return (
+                JsonResponse(
+                    {"error": "Messaging API is not enabled for this workspace"},
+                    status=status.HTTP_403_FORBIDDEN,
+                ),
+                None,
+            )
+
+        username = (payload.get("username") or "").strip()
+        if not username:
+            return (
+                JsonResponse(
+                    {"error": "'username' (Jasmin user) is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                ),
+                None,
+            )
+
+        jasmin_user = get_sending_user(workspace, username)
+        if not jasmin_user:
+            return (
+                JsonResponse(
+                    {"error": f"Enabled Jasmin user '{username}' not found in this workspace"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                ),
+                None,
+            )
+
+        try:
+            single_send = send_context(workspace, jasmin_user)
+        except JasminNotConfigured as exc:
+            return JsonResponse({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE), None
+        return None, (user, workspace, jasmin_user, single_send)
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def log_message_body(message) -> dict:
+    return {
+        "id": message.pk,
+        "to": message.to_addr,
+        "from": message.from_addr or None,
+        "status": message.status,
+        "username": message.jasmin_user.username if message.jasmin_user_id else None,
+        "batch_id": message.batch_id or None,
+        "batch_kind": message.batch_kind,
+        "client_batch_id": message.client_batch_id or None,
+        "client_message_id": message.client_message_id or None,
+        "jasmin_msg_id": message.jasmin_msg_id or None,
+        "dlr_status": message.dlr_status or None,
+        "error": message.error_message or None,
+        "created_on": _timestamp(message.created_on),
+        "submitted_at": _timestamp(message.submitted_at),
+        "delivered_at": _timestamp(message.delivered_at),
+    }
+
+
+class MessagingLogAPIView(APIView):
+    """
+    GET /api/v1/messaging/messages/
+
+    The workspace message log, newest first, one cursor page at a time.
+    Filters as in the console log (jasmin_user, status, to, date_from, date_to);
+    ``after`` / ``before`` take the ``next`` / ``previous`` cursor of a page,
+    ``page_size`` is at most 500 and ``order=asc`` lists oldest first.
+    ``count`` is approximate unless ``exact_count=1``.
+    """
+
+    authentication_classes = [MessagingAPITokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        workspace = getattr(request, "workspace", None)
+        if not workspace or not workspace.messaging_api_enabled:
+            return Response(
+                {"error": "Messaging API is not enabled for this workspace"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        params = request.query_params
+        exact = (params.get("exact_count") or "").strip() == "1"
+        # The token picks the workspace after the timezone middleware ran; dates are workspace days
+        with timezone.override(workspace.timezone):
+            qs = apply_outbound_message_filters(
+                OutboundMessage.objects.filter(workspace=workspace).select_related("jasmin_user"),
+                params,
+            )
+            try:
+                page = keyset_page(
+                    qs,
+                    after=(params.get("after") or "").strip(),
+                    before=(params.get("before") or "").strip(),
+                    size=page_size(params.get("page_size")),
+                    descending=(params.get("order") or "").strip().lower() != "asc",
+                )
+            except InvalidCursor as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            count = count_messages(qs, workspace, params, exact=exact)
+
         return Response(
             {
-                "batch_id": result.batch_id,
-                "client_batch_id": result.client_batch_id or None,
-                "mode": result.mode,
-                "message_count": result.message_count,
-                "jasmin_batch_ids": result.jasmin_batch_ids,
-                "messages": [
-                    {
-                        "id": m.pk,
-                        "to": m.to_addr,
-                        "status": m.status,
-                        "client_message_id": m.client_message_id or None,
-                        "client_batch_id": m.client_batch_id or None,
-                        "jasmin_msg_id": m.jasmin_msg_id or None,
-                        "error": m.error_message or None,
-                    }
-                    for m in result.messages[:100]
-                ],
-                "messages_truncated": len(result.messages) > 100,
-            },
-            status=status.HTTP_202_ACCEPTED
-            if result.mode == "bulk_async"
-            else status.HTTP_200_OK,
+                "count": count.as_dict(),
+                "status_counts": count.status_counts or None,
+                "next": page.next_cursor or None,
+                "previous": page.previous_cursor or None,
+                "results": [log_message_body(m) for m in page.object_list],
+            }
         )
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path, re_path
 from rest_framework.urlpatterns import format_suffix_patterns
 
-from quark.api.v1.messaging import MessagingSendAPIView
+from quark.api.v1.messaging import AsyncMessagingSendView, MessagingLogAPIView, MessagingSendAPIView
+
+# Native async send under ASGI (see quark/asgi.py); the DRF view otherwise
+send_view = AsyncMessagingSendView if settings.JOYCE_ASYNC_SEND_API else MessagingSendAPIView
 
 urlpatterns = [
-    path("messaging/send/", MessagingSendAPIView.as_view(), name="api.v1.messaging_send"),
+    path("messaging/send/", send_view.as_view(), name="api.v1.messaging_send"),
+    path("messaging/messages/", MessagingLogAPIView.as_view(), name="api.v1.messaging_messages"),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns, allowed=["json"])
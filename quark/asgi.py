@@ -32,5 +32,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quark.settings')
+# Serve POST /api/v1/messaging/send/ from the native async view
+os.environ.setdefault('JOYCE_ASYNC_SEND_API', '1')
 
 application = get_asgi_application()
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from kombu import Queue
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quark.settings')
@@ -13,6 +14,13 @@ app = Celery('quark')
 #   should have a `CELERY_` prefix.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# The default queue (short periodic jobs: DLR drain/forward, user sync) and then the
+# priority lanes for submit work (quark.messaging.lanes), most urgent first.
+# Workers consume all of them unless started with -Q.
+app.conf.task_queues = [
+    Queue(name) for name in (app.conf.task_default_queue, "joyce.p3", "joyce.p2", "joyce.p1", "joyce.p0")
+]
+
 # Load task modules from all registered Django apps + explicit cron imports.
 app.autodiscover_tasks()
 app.conf.imports = tuple(
@@ -5,18 +5,42 @@ Pull live Jasmin user credentials/quotas into Django on a per-workspace schedule
 
 Celery beat ticks this task frequently; each workspace's
 ``jasmin_user_sync_interval_mins`` decides whether it is due.
+
+``user_get_all`` is issued on every due Jasmin endpoint at once from the
+reactor (a DeferredList), each call bounded by
+``JOYCE_JASMIN_USER_SYNC_TIMEOUT``, so one dead endpoint no longer delays the
+others. An endpoint that fails, times out or answers slower than
+``JOYCE_JASMIN_USER_SYNC_SLOW_SECS`` is skipped for a while, doubling from
+``JOYCE_JASMIN_USER_SYNC_BACKOFF_SECS`` up to
+``JOYCE_JASMIN_USER_SYNC_BACKOFF_MAX_SECS``; its workspaces stay due. A cache
+lock keeps overlapping beat runs from syncing at the same time.
+
+The lock and the back-off state live in the Django cache, so every worker
+must share it: set ``JOYCE_CACHE_URL`` (the compose files point it at Redis).
+With the default per-process memory cache, each worker process keeps its
+own lock and back-off.
 """
 from __future__ import annotations
 
 import logging
+import time
+import uuid
 from collections import defaultdict
 from datetime import timedelta
 
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+LOCK_KEY = "joyce:jasmin-user-sync:lock"
+DEFAULT_TIMEOUT = 20
+DEFAULT_SLOW_SECS = 10
+DEFAULT_BACKOFF_SECS = 60
+DEFAULT_BACKOFF_MAX_SECS = 1800
+
 
 def _workspaces_due_for_sync(*, now=None):
     from quark.workspace.models import WorkSpace
@@ -38,70 +62,166 @@ def _workspaces_due_for_sync(*, now=None):
     return due
 
 
+def fetch_timeout() -> float:
+    return float(getattr(settings, "JOYCE_JASMIN_USER_SYNC_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def _backoff_key(endpoint_key: str) -> str:
+    return f"joyce:jasmin-user-sync:backoff:{endpoint_key}"
+
+
+def backed_off_until(endpoint_key: str) -> float:
+    """Unix time before which ``endpoint_key`` is skipped (0 when it is not)."""
+    state = cache.get(_backoff_key(endpoint_key)) or {}
+    until = float(state.get("until") or 0)
+    return until if until > time.time() else 0
+
+
+def back_off(endpoint_key: str) -> float:
+    """Skip ``endpoint_key`` for twice as long as last time; returns the delay."""
+    maximum = float(getattr(settings, "JOYCE_JASMIN_USER_SYNC_BACKOFF_MAX_SECS", DEFAULT_BACKOFF_MAX_SECS))
+    state = cache.get(_backoff_key(endpoint_key)) or {}
+    failures = int(state.get("failures") or 0) + 1
+    base = float(getattr(settings, "JOYCE_JASMIN_USER_SYNC_BACKOFF_SECS", DEFAULT_BACKOFF_SECS))
+    delay = min(maximum, base * 2 ** (failures - 1))
+    # Kept past the delay so the next failure doubles it; forgotten after a quiet spell
+    cache.set(_backoff_key(endpoint_key), {"failures": failures, "until": time.time() + delay}, int(maximum * 2))
+    return delay
+
+
+def clear_backoff(endpoint_key: str):
+    cache.delete(_backoff_key(endpoint_key))
+
+
+def fetch_all_users(connections: dict, timeout: float) -> dict:
+    """
+    ``user_get_all`` on every connection concurrently.
+
+    Returns ``endpoint key -> (users or Failure, seconds taken)``; a call that
+    outlives ``timeout`` is cancelled and reported as a Failure.
+    """
+    from twisted.internet import defer, reactor
+
+    from quark.jasmin.reactor import run_in_reactor
+    from quark.jasmin.router_pb import RouterPBInterface
+
+    keys = list(connections)
+
+    def timed(key):
+        started = reactor.seconds()
+        d = defer.maybeDeferred(RouterPBInterface(connections[key]).get_all_users)
+        d.addTimeout(timeout, reactor)
+        d.addBoth(lambda result: (result, reactor.seconds() - started))
+        return d
+
+    def fetch():
+        d = defer.DeferredList([timed(key) for key in keys], consumeErrors=True)
+        d.addCallback(lambda results: {key: value for key, (_, value) in zip(keys, results)})
+        return d
+
+    # Every call times out on its own; the margin only covers the reactor hop
+    return run_in_reactor(fetch, timeout=timeout + 5)
+
+
 @shared_task(name="quark.crons.jasmin_user_sync.sync_jasmin_users")
 def sync_jasmin_users():
     """
     Sync Jasmin user MT/SMPP credentials into Django for workspaces that are due.
 
-    Fetches ``user_get_all`` once per distinct Jasmin endpoint, then updates
-    local rows for each due workspace on that endpoint.
+    Fetches ``user_get_all`` once per distinct Jasmin endpoint, all endpoints
+    concurrently, then updates local rows for each due workspace on that
+    endpoint; only users whose credentials changed are written
+    (quark.jasmin.user_sync). The result carries checked / changed /
+    unchanged / missing counts, duration_ms and the endpoints that failed or
+    were backed off.
     """
+    from twisted.python.failure import Failure
+
     from quark.jasmin.connection import JasminNotConfigured, resolve_jasmin_connection
-    from quark.jasmin.models import JasminUser
-    from quark.jasmin.reactor import run_in_reactor
-    from quark.jasmin.router_pb import RouterPBInterface
+    from quark.jasmin.user_sync import UserSyncStats, remote_users_by_uid, sync_workspace_users
+    from quark.workspace.cache import bump_workspace
     from quark.workspace.models import WorkSpace
 
-    now = timezone.now()
-    due = _workspaces_due_for_sync(now=now)
-    if not due:
-        logger.debug("Jasmin user sync: no workspaces due")
-        return {"synced_workspaces": 0, "synced_users": 0}
-
-    by_endpoint = defaultdict(list)
-    connections = {}
-    for workspace in due:
-        try:
-            connection = resolve_jasmin_connection(workspace)
-        except JasminNotConfigured as exc:
-            logger.warning("Skipping workspace %s: %s", workspace.pk, exc)
-            continue
-        key = connection.endpoint_key
-        connections[key] = connection
-        by_endpoint[key].append(workspace)
-
-    synced_users = 0
-    synced_workspaces = 0
-    for key, workspaces in by_endpoint.items():
-        connection = connections[key]
-        try:
-            remote_users = run_in_reactor(RouterPBInterface(connection).get_all_users) or []
-        except Exception as exc:
-            logger.error("Jasmin user sync failed for endpoint %s: %s", key, exc)
-            continue
-
-        by_uid = {
-            getattr(u, "uid", None) or getattr(u, "username", None): u
-            for u in remote_users
-        }
-
-        for workspace in workspaces:
-            locals_qs = JasminUser.objects.filter(group__workspace=workspace)
-            for local in locals_qs.iterator():
-                remote = by_uid.get(local.username)
-                if remote is None:
-                    continue
-                local.apply_jasmin_user(remote, save=True)
-                synced_users += 1
-
-            WorkSpace.objects.filter(pk=workspace.pk).update(jasmin_user_last_synced_at=now)
-            synced_workspaces += 1
-            logger.info(
-                "Synced Jasmin users for workspace %s (%s)",
-                workspace.prefix or workspace.pk,
-                workspace.name,
-            )
-
-    result = {"synced_workspaces": synced_workspaces, "synced_users": synced_users}
-    logger.info("Jasmin user sync finished: %s", result)
-    return result
+    result = {
+        "synced_workspaces": 0,
+        "synced_users": 0,
+        "failed_endpoints": [],
+        "backed_off_endpoints": [],
+        **UserSyncStats().as_dict(),
+    }
+    timeout = fetch_timeout()
+    token = uuid.uuid4().hex
+    # A run never takes much more than one fetch timeout plus the writes
+    if not cache.add(LOCK_KEY, token, int(max(120, timeout * 4))):
+        logger.info("Jasmin user sync: previous run still in progress, skipping")
+        return {**result, "locked": True}
+    try:
+        now = timezone.now()
+        due = _workspaces_due_for_sync(now=now)
+        if not due:
+            logger.debug("Jasmin user sync: no workspaces due")
+            return result
+
+        by_endpoint = defaultdict(list)
+        connections = {}
+        for workspace in due:
+            try:
+                connection = resolve_jasmin_connection(workspace)
+            except JasminNotConfigured as exc:
+                logger.warning("Skipping workspace %s: %s", workspace.pk, exc)
+                continue
+            key = connection.endpoint_key
+            if backed_off_until(key):
+                if key not in result["backed_off_endpoints"]:
+                    result["backed_off_endpoints"].append(key)
+                continue
+            connections[key] = connection
+            by_endpoint[key].append(workspace)
+
+        started = time.monotonic()
+        fetched = fetch_all_users(connections, timeout) if connections else {}
+        slow = float(getattr(settings, "JOYCE_JASMIN_USER_SYNC_SLOW_SECS", DEFAULT_SLOW_SECS))
+        totals = UserSyncStats()
+        for key, workspaces in by_endpoint.items():
+            remote_users, elapsed = fetched[key]
+            if isinstance(remote_users, Failure):
+                delay = back_off(key)
+                result["failed_endpoints"].append(key)
+                logger.error(
+                    "Jasmin user sync failed for endpoint %s: %s (retrying in %ss)",
+                    key, remote_users.getErrorMessage(), int(delay),
+                )
+                continue
+            if elapsed > slow:
+                delay = back_off(key)
+                logger.warning(
+                    "Jasmin endpoint %s took %.1fs for user_get_all; next sync in %ss", key, elapsed, int(delay)
+                )
+            else:
+                clear_backoff(key)
+
+            by_uid = remote_users_by_uid(remote_users)
+            for workspace in workspaces:
+                stats = sync_workspace_users(workspace, by_uid)
+                totals.merge(stats)
+                WorkSpace.objects.filter(pk=workspace.pk).update(jasmin_user_last_synced_at=now)
+                # update() skips WorkSpace.save: drop the row WorkspaceMiddleware cached
+                bump_workspace(workspace.pk)
+                result["synced_workspaces"] += 1
+                logger.info(
+                    "Synced Jasmin users for workspace %s (%s): %s changed, %s unchanged",
+                    workspace.prefix or workspace.pk,
+                    workspace.name,
+                    stats.changed,
+                    stats.unchanged,
+                )
+
+        totals.duration_ms = int((time.monotonic() - started) * 1000)
+        result.update(totals.as_dict())
+        result["synced_users"] = totals.changed + totals.unchanged
+        logger.info("Jasmin user sync finished: %s", result)
+        return result
+    finally:
+        # An expired lock may belong to a newer run by now: only release our own
+        if cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
@@ -3,6 +3,8 @@
 """Resolve which Jasmin instance a workspace should talk to."""
 from __future__ import annotations
 
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Literal, Optional
 
@@ -37,6 +39,12 @@ class JasminConnection:
         r = self.router_pb
         return f"{r.host}:{r.port}:{r.username}:{self.http_api_url}"
 
+    @property
+    def smpp_endpoint_key(self) -> str:
+        """Same as endpoint_key, for the SMPP PB side of this Jasmin."""
+        s = self.smpp_pb
+        return f"{s.host}:{s.port}:{s.username}:{self.http_api_url}"
+
     @property
     def has_rest_api(self) -> bool:
         return bool((self.rest_api_url or "").strip())
@@ -63,16 +71,7 @@ def _demo_connection() -> JasminConnection:
     )
 
 
-def resolve_jasmin_connection(workspace=None) -> JasminConnection:
-    """
-    Return the Jasmin endpoints for this workspace.
-
-    Raises JasminNotConfigured when the workspace has not opted into demo or
-    finished a custom connection yet.
-    """
-    if workspace is None:
-        raise JasminNotConfigured("No workspace available to resolve Jasmin connection")
-
+def _build_connection(workspace) -> JasminConnection:
     link = getattr(workspace, "jasmin_link", "") or ""
     if link == workspace.JASMIN_LINK_DEMO:
         return _demo_connection()
@@ -105,6 +104,126 @@ def resolve_jasmin_connection(workspace=None) -> JasminConnection:
     )
 
 
+# Custom-connection fields of WorkSpace; any change makes a new version stamp
+CONNECTION_FIELDS = (
+    "jasmin_link",
+    "jasmin_router_pb_host",
+    "jasmin_router_pb_port",
+    "jasmin_router_pb_username",
+    "jasmin_router_pb_password",
+    "jasmin_smpp_pb_host",
+    "jasmin_smpp_pb_port",
+    "jasmin_smpp_pb_username",
+    "jasmin_smpp_pb_password",
+    "jasmin_http_api_url",
+    "jasmin_rest_api_url",
+)
+
+_DEMO_SETTINGS = (
+    "JASMIN_ROUTER_PB_HOST",
+    "JASMIN_ROUTER_PB_PORT",
+    "JASMIN_ROUTER_PB_USERNAME",
+    "JASMIN_ROUTER_PB_PASSWORD",
+    "JASMIN_SMPP_PB_HOST",
+    "JASMIN_SMPP_PB_PORT",
+    "JASMIN_SMPP_PB_USERNAME",
+    "JASMIN_SMPP_PB_PASSWORD",
+    "JASMIN_HTTP_API_URL",
+    "JASMIN_REST_API_URL",
+)
+
+
+class ConnectionCache:
+    """
+    Resolved connections per workspace id, shared by all threads of a process.
+
+    Entries carry a version stamp made of the workspace's connection fields
+    (stored ciphertext included) or, for demo, the JASMIN_* settings. A row
+    saved by another process therefore misses on its next use here; saves in
+    this process also drop the entry (``invalidate_jasmin_connection``).
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def stamp(workspace) -> tuple:
+        link = getattr(workspace, "jasmin_link", "") or ""
+        if link == workspace.JASMIN_LINK_DEMO:
+            return (link,) + tuple(getattr(settings, name, "") for name in _DEMO_SETTINGS)
+        return tuple(getattr(workspace, name, None) for name in CONNECTION_FIELDS)
+
+    def get(self, workspace) -> JasminConnection:
+        key, stamp = workspace.pk, self.stamp(workspace)
+        if key is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == stamp:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+
+        # Built outside the lock: decrypting must not serialize other workspaces
+        connection = _build_connection(workspace)
+        if key is not None:
+            with self._lock:
+                self._entries[key] = (stamp, connection)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return connection
+
+    def invalidate(self, workspace_id=None):
+        with self._lock:
+            if workspace_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(workspace_id, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+_connections = ConnectionCache(int(getattr(settings, "JASMIN_CONNECTION_CACHE_SIZE", 1024)))
+
+
+def resolve_jasmin_connection(workspace=None) -> JasminConnection:
+    """
+    Return the Jasmin endpoints for this workspace.
+
+    Raises JasminNotConfigured when the workspace has not opted into demo or
+    finished a custom connection yet. Resolved connections are cached per
+    workspace (see ConnectionCache), so custom passwords are decrypted once.
+    """
+    if workspace is None:
+        raise JasminNotConfigured("No workspace available to resolve Jasmin connection")
+    return _connections.get(workspace)
+
+
+def invalidate_jasmin_connection(workspace_id=None):
+    """Drop the cached connection of one workspace (or all of them)."""
+    _connections.invalidate(workspace_id)
+
+
+def connection_cache_stats() -> dict:
+    return _connections.stats()
+
+
 def workspace_from_jasmin_model(obj) -> Optional[object]:
     """Best-effort workspace lookup from a BaseJasminModel instance."""
     if hasattr(obj, "workspace_id") and getattr(obj, "workspace_id", None):
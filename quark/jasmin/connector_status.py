@@ -0,0 +1,128 @@
+#  Copyright (c) 2026
+#
+#  This project is licensed under the GNU General Public License v3.0. You may
+#  redistribute it and/or modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+#  without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along with this project.
+#  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Batched live status for SMPP client connectors.
+
+One SMPP PB ``connector_list`` call returns the running flag of every
+connector on a Jasmin, so statuses are fetched per endpoint (not per row)
+and cached for ``JASMIN_CONNECTOR_STATUS_TTL`` seconds. Querysets opt in
+with ``JasminSMPPConnector.objects.with_live_status()``; loading a connector
+row on its own never talks to Jasmin.
+"""
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from quark.jasmin.connection import JasminNotConfigured, resolve_jasmin_connection
+from quark.jasmin.reactor import run_in_reactor
+from quark.jasmin.smpp_pb import SmppPBAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 10
+
+
+def _cache_key(connection) -> str:
+    digest = hashlib.sha1(connection.smpp_endpoint_key.encode("utf-8")).hexdigest()
+    return f"jasmin:smpp-status:{digest}"
+
+
+def get_connector_statuses(connection, *, refresh: bool = False) -> Dict[str, bool]:
+    """
+    Map of cid -> running for every connector on this Jasmin endpoint.
+
+    Served from cache when fresh. A failed fetch is cached as empty for the
+    same TTL so a down Jasmin does not stall every page load on the PB timeout.
+    """
+    key = _cache_key(connection)
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        listed = run_in_reactor(SmppPBAdapter(connection).list_connectors) or []
+        statuses = {
+            str(details["id"]): details.get("service_status") == 1
+            for details in listed
+            if details and details.get("id")
+        }
+    except Exception as e:
+        logger.warning("Could not fetch SMPP connector statuses from %s: %s", connection.smpp_pb.host, e)
+        statuses = {}
+
+    cache.set(key, statuses, getattr(settings, "JASMIN_CONNECTOR_STATUS_TTL", DEFAULT_TTL))
+    return statuses
+
+
+def invalidate_connector_statuses(workspace) -> None:
+    """Forget cached statuses for the workspace's endpoint (after start/stop/add/remove)."""
+    try:
+        connection = resolve_jasmin_connection(workspace)
+    except JasminNotConfigured:
+        return
+    cache.delete(_cache_key(connection))
+
+
+def attach_live_status(connectors: Iterable) -> None:
+    """
+    Set ``live_status`` (True/False, or None when unknown) on each connector.
+
+    Resolves one connection per workspace and one status fetch per endpoint.
+    Rows whose stored ``is_active`` disagrees with Jasmin are corrected in
+    memory and in the database with at most two UPDATEs.
+    """
+    from quark.workspace.models import WorkSpace
+
+    by_workspace = defaultdict(list)
+    for connector in connectors:
+        connector.live_status = None
+        by_workspace[connector.workspace_id].append(connector)
+    if not by_workspace:
+        return
+
+    workspaces = WorkSpace.objects.in_bulk(list(by_workspace.keys()))
+    changed = {True: [], False: []}
+    for workspace_id, rows in by_workspace.items():
+        workspace = workspaces.get(workspace_id)
+        statuses = _statuses_for_workspace(workspace)
+        if statuses is None:
+            continue
+        for connector in rows:
+            running = statuses.get(str(connector.cid)) if connector.cid else None
+            connector.live_status = running
+            if running is not None and connector.is_active != running:
+                connector.is_active = running
+                changed[running].append(connector.pk)
+
+    model = type(next(iter(by_workspace.values()))[0])
+    for running, pks in changed.items():
+        if pks:
+            model.objects.filter(pk__in=pks).update(is_active=running)
+
+
+def _statuses_for_workspace(workspace) -> Optional[Dict[str, bool]]:
+    if workspace is None:
+        return None
+    try:
+        connection = resolve_jasmin_connection(workspace)
+    except JasminNotConfigured as e:
+        logger.warning("Jasmin not configured for workspace %s: %s", workspace.pk, e)
+        return None
+    return get_connector_statuses(connection)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jasmin', '0006_route_order_unique_and_config_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jasminuser',
+            name='credential_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -36,9 +36,11 @@ from smartmin.models import SmartModel
 from smpp.pdu.constants import *
 from smpp.pdu.pdu_types import RegisteredDelivery
 
+from quark.jasmin.connector_status import attach_live_status, invalidate_connector_statuses
+from quark.jasmin.user_cache import invalidate_workspace_jasmin_users
 from quark.jasmin.utils import PRIORITY_VALUES, TON_VALUES, NPI_VALUES, REGISTERED_DELIVERY_VALUES, \
     REPLACE_IF_PRESENT_VALUES
-from quark.jasmin.utils.utils import from_jasmin_mt_creds, from_jasmin_smpp_creds
+from quark.jasmin.utils.utils import credential_hash, from_jasmin_mt_creds, from_jasmin_smpp_creds
 from quark.jasmin.utils.connectors import BaseJasminConnector
 from quark.jasmin.utils.filters import (
     JasminBaseFilter, MO, MoFilters, MTFilters, MT, AllFilters, validate_py_script,
@@ -131,6 +133,7 @@ class JasminGroup(BaseJasminModel, SmartModel):
         is_new = self.pk is None
         # Save the Django model first
         super().save(*args, **kwargs)
+        invalidate_workspace_jasmin_users(self.workspace_id)
         if run_on_reactor:
             self.jasmin_add_group(is_new)
 
@@ -140,6 +143,7 @@ class JasminGroup(BaseJasminModel, SmartModel):
             self.jasmin_remove_group()
         else:
             super().delete(*args, **kwargs)
+            invalidate_workspace_jasmin_users(self.workspace_id)
 
     @classmethod
     def map_from_jasmin(cls, jasmin_group):
@@ -190,6 +194,8 @@ class JasminUser(SmartModel, BaseJasminModel):
     enabled = models.BooleanField(default=True)
     mt_credential = models.JSONField(default=dict, blank=True)
     smpps_credential = models.JSONField(default=dict, blank=True)
+    # credential_hash() of the three fields above; the Jasmin sync skips rows whose hash matches
+    credential_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
 
     def save(self, *args, **kwargs):
 
@@ -206,9 +212,11 @@ class JasminUser(SmartModel, BaseJasminModel):
                 'authorizations': SMPP_AUTHORIZATIONS,
                 'quotas': SMPP_QUOTAS,
             }
+        self.credential_hash = self.current_credential_hash()
         run_on_reactor = kwargs.pop('run_on_reactor', True)
         is_new = self.pk is None
         super().save(*args, **kwargs)
+        self.invalidate_sending_cache()
         if run_on_reactor:
             self.jasmin_add_user(is_new)
 
@@ -218,19 +226,32 @@ class JasminUser(SmartModel, BaseJasminModel):
             self.jasmin_remove_user()
         else:
             super().delete(*args, **kwargs)
+            self.invalidate_sending_cache()
+
+    def current_credential_hash(self) -> str:
+        return credential_hash(self.mt_credential, self.smpps_credential, self.enabled)
+
+    def invalidate_sending_cache(self):
+        """Drop cached send-path copies of this workspace's users (quark.jasmin.user_cache)."""
+        if self.group_id:
+            invalidate_workspace_jasmin_users(self.group.workspace_id)
 
     def apply_jasmin_user(self, jasmin_user, *, save: bool = True):
         """
         Copy live credentials (and enabled flag) from a Jasmin User into this row.
         Always saves with run_on_reactor=False so we do not push stale values back.
+
+        Returns True when anything changed; with ``save=True`` only then is the
+        row written (many rows: see quark.jasmin.user_sync).
         """
         self.mt_credential = from_jasmin_mt_creds(jasmin_user.mt_credential)
         self.smpps_credential = from_jasmin_smpp_creds(jasmin_user.smpps_credential)
         if hasattr(jasmin_user, "enabled"):
             self.enabled = bool(jasmin_user.enabled)
-        if save:
+        changed = self.current_credential_hash() != self.credential_hash
+        if changed and save:
             self.save(run_on_reactor=False)
-        return self
+        return changed
 
     def sync_from_jasmin(self, *, save: bool = True):
         """Fetch this username from Jasmin and refresh local credential JSON."""
@@ -244,7 +265,8 @@ class JasminUser(SmartModel, BaseJasminModel):
         if jasmin_user is None:
             logger.warning("Jasmin user %s not found during sync", self.username)
             return None
-        return self.apply_jasmin_user(jasmin_user, save=save)
+        self.apply_jasmin_user(jasmin_user, save=save)
+        return self
 
     @classmethod
     def sync_many_from_jasmin(cls, users=None, *, connection=None, workspace=None):
@@ -253,7 +275,8 @@ class JasminUser(SmartModel, BaseJasminModel):
 
         ``users`` may be an iterable of JasminUser instances (preferred: updates
         those objects in-place so list/edit forms see fresh data) or omitted to
-        sync every local row. Failures are logged and do not raise.
+        sync every local row. Only rows whose credentials changed are written.
+        Failures are logged and do not raise.
 
         Pass ``connection`` (or ``workspace`` to resolve it) when targeting a
         specific Jasmin instance in multi mode.
@@ -279,23 +302,11 @@ class JasminUser(SmartModel, BaseJasminModel):
             logger.error("Failed to fetch Jasmin users for sync: %s", e)
             return []
 
-        by_uid = {
-            getattr(u, "uid", None) or getattr(u, "username", None): u
-            for u in remote_users
-        }
+        from quark.jasmin.user_sync import remote_users_by_uid, sync_users
 
-        if users is None:
-            locals_list = list(cls.objects.all())
-        else:
-            locals_list = list(users)
-
-        updated = []
-        for local in locals_list:
-            remote = by_uid.get(local.username)
-            if remote is None:
-                continue
-            local.apply_jasmin_user(remote, save=True)
-            updated.append(local)
+        locals_list = cls.objects.all() if users is None else users
+        updated, stats = sync_users(locals_list, remote_users_by_uid(remote_users))
+        logger.info("Jasmin user sync: %s", stats.as_dict())
         return updated
 
     def __str__(self):
@@ -305,6 +316,40 @@ class JasminUser(SmartModel, BaseJasminModel):
         db_table = 'jasmin_user'
 
 
+class JasminSMPPConnectorQuerySet(models.QuerySet):
+    """
+    ``with_live_status()`` marks the queryset so that, once evaluated, every
+    connector gets a ``live_status`` from one batched SMPP PB lookup per
+    endpoint (see quark.jasmin.connector_status). Slicing/pagination keeps the
+    flag, so only the rows actually rendered are looked up.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._live_status = False
+
+    def with_live_status(self):
+        clone = self._chain()
+        clone._live_status = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._live_status = self._live_status
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if (
+            fetched
+            and self._live_status
+            and self._result_cache
+            and isinstance(self._result_cache[0], JasminSMPPConnector)
+        ):
+            attach_live_status(self._result_cache)
+
+
 class JasminSMPPConnector(BaseJasminConnector, BaseJasminModel, SmartModel):
     """
     Represents a Jasmin SMPP client connector
@@ -626,15 +671,11 @@ class JasminSMPPConnector(BaseJasminConnector, BaseJasminModel, SmartModel):
         help_text="How to handle message IDs in receipts"
     )
 
+    objects = JasminSMPPConnectorQuerySet.as_manager()
+
     def __str__(self):
         return f"{str(self.cid)}:smpp"
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        if self.pk:
-            # grab the status
-            self.jasmin_connector_status()
-
     def save(self, *args, **kwargs):
         # manipulate the cid, to ensure we add workspace metadata
         run_on_reactor = kwargs.pop('run_on_reactor', True)
@@ -645,11 +686,13 @@ class JasminSMPPConnector(BaseJasminConnector, BaseJasminModel, SmartModel):
         super().save(*args, **kwargs)
         if run_on_reactor:
             self.jasmin_add_connector(is_new)
+            invalidate_connector_statuses(self.workspace)
 
     def delete(self, *args, **kwargs):
         run_on_reactor = kwargs.pop('run_on_reactor', True)
         if run_on_reactor:
             self.jasmin_remove_connector()
+            invalidate_connector_statuses(self.workspace)
         else:
             super().delete(*args, **kwargs)
 
@@ -658,6 +701,7 @@ class JasminSMPPConnector(BaseJasminConnector, BaseJasminModel, SmartModel):
         self.save(run_on_reactor=False)
         self.jasmin_start_connector()
         self.jasmin_connector_status()
+        invalidate_connector_statuses(self.workspace)
 
     def stop(self):
         self.is_active = False
@@ -665,6 +709,7 @@ class JasminSMPPConnector(BaseJasminConnector, BaseJasminModel, SmartModel):
 
         self.jasmin_stop_connector()
         self.jasmin_connector_status()
+        invalidate_connector_statuses(self.workspace)
 
     def restart(self):
         self.stop()
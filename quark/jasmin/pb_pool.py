@@ -0,0 +1,372 @@
+#  Copyright (c) 2026
+#
+#  This project is licensed under the GNU General Public License v3.0. You may
+#  redistribute it and/or modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+#  without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along with this project.
+#  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Reactor-side pool of authenticated Jasmin PB sessions.
+
+Opening a PB session costs a TCP connect plus a cred login round-trip. The
+Router PB / SMPP PB adapters used to pay that on every single operation; they
+now lease an already-authenticated session from this pool in ``pb_connect()``
+and hand it back in ``disconnect()``.
+
+Sessions are keyed by PB kind and ``JasminConnection.endpoint_key`` (see
+``quark.jasmin.connection``), so workspaces sharing a Jasmin share sessions.
+A digest of the PB password is part of the key too: changed or mistyped
+credentials never ride on a session someone else authenticated.
+Each endpoint holds at most ``JASMIN_PB_POOL_MAX_SESSIONS`` sessions; extra
+callers wait for a lease. Idle sessions are pinged every
+``JASMIN_PB_POOL_KEEPALIVE_SECS`` and dropped after
+``JASMIN_PB_POOL_IDLE_SECS``. A session whose broker went away is discarded
+and transparently replaced on the next lease. A lease not returned within
+``JASMIN_PB_POOL_LEASE_SECS`` is taken to be stuck on a hung broker (the
+caller gave up long ago) and is discarded too, so it cannot pin a slot.
+
+Everything in here runs in the reactor thread (the adapters are only ever
+driven through ``run_in_reactor()``), so no locking is needed except around
+the stats snapshot read from request threads.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from jasmin.tools.proxies import JasminPBProxy
+from twisted.internet import defer, reactor, task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 4
+DEFAULT_IDLE_SECS = 300
+DEFAULT_KEEPALIVE_SECS = 60
+DEFAULT_LEASE_SECS = 90
+
+
+class PBSession:
+    """One authenticated PB connection owned by the pool."""
+
+    def __init__(self, key, proxy: JasminPBProxy):
+        self.key = key
+        self.proxy = proxy
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.last_ping_at = self.created_at
+        self.leased_at = None
+        # set once the pool dropped this session while it was still leased
+        self.reclaimed = False
+
+    @property
+    def pb(self):
+        return self.proxy.pb
+
+    def is_alive(self) -> bool:
+        if not self.proxy.isConnected or self.proxy.pb is None:
+            return False
+        broker = getattr(self.proxy.pb, "broker", None)
+        return broker is not None and not broker.disconnected
+
+    def close(self):
+        try:
+            self.proxy.disconnect()
+        except Exception:  # already gone, nothing to clean up
+            pass
+
+
+class PBSessionPool:
+    """
+    Bounded, per-endpoint pool of PB sessions.
+
+    ``acquire()`` returns a Deferred firing with a ``PBSession`` leased
+    exclusively to the caller; ``release()`` returns it. Must be used from
+    the reactor thread.
+    """
+
+    def __init__(self, max_sessions=None, idle_secs=None, keepalive_secs=None, lease_secs=None):
+        self._max_sessions = max_sessions
+        self._idle_secs = idle_secs
+        self._keepalive_secs = keepalive_secs
+        self._lease_secs = lease_secs
+        self._idle = defaultdict(deque)
+        self._leased = set()
+        self._size = defaultdict(int)
+        self._waiters = defaultdict(deque)
+        self._reaper = None
+        self._stats_lock = threading.Lock()
+        self._stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats():
+        return {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "connects": 0,
+            "connect_failures": 0,
+            "connect_seconds_total": 0.0,
+            "connect_seconds_max": 0.0,
+            "evicted_idle": 0,
+            "evicted_dead": 0,
+            "evicted_stuck": 0,
+        }
+
+    @property
+    def max_sessions(self) -> int:
+        if self._max_sessions is not None:
+            return int(self._max_sessions)
+        return int(getattr(settings, "JASMIN_PB_POOL_MAX_SESSIONS", DEFAULT_MAX_SESSIONS))
+
+    @property
+    def idle_secs(self) -> float:
+        if self._idle_secs is not None:
+            return float(self._idle_secs)
+        return float(getattr(settings, "JASMIN_PB_POOL_IDLE_SECS", DEFAULT_IDLE_SECS))
+
+    @property
+    def keepalive_secs(self) -> float:
+        if self._keepalive_secs is not None:
+            return float(self._keepalive_secs)
+        return float(getattr(settings, "JASMIN_PB_POOL_KEEPALIVE_SECS", DEFAULT_KEEPALIVE_SECS))
+
+    @property
+    def lease_secs(self) -> float:
+        if self._lease_secs is not None:
+            return float(self._lease_secs)
+        return float(getattr(settings, "JASMIN_PB_POOL_LEASE_SECS", DEFAULT_LEASE_SECS))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        """Snapshot of counters plus current pool sizes; safe from any thread."""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        connects = snapshot["connects"]
+        snapshot["connect_seconds_avg"] = (
+            snapshot["connect_seconds_total"] / connects if connects else 0.0
+        )
+        leases = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = snapshot["hits"] / leases if leases else 0.0
+        snapshot["endpoints"] = {
+            f"{key[0]}@{key[1]}": {"open": size, "idle": len(self._idle.get(key, ()))}
+            for key, size in list(self._size.items())
+            if size
+        }
+        return snapshot
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = self._empty_stats()
+
+    def acquire(self, key, host, port, username, password):
+        """Lease a live session for ``key``, connecting a new one if allowed."""
+        self._ensure_reaper()
+
+        idle = self._idle[key]
+        while idle:
+            session = idle.pop()
+            if session.is_alive():
+                self._count("hits")
+                return defer.succeed(self._lease(session))
+            self._discard(session, "dead")
+
+        if self._size[key] < self.max_sessions:
+            self._count("misses")
+            return self._connect(key, host, port, username, password).addCallback(self._lease)
+
+        # Endpoint is saturated: wait for a release
+        self._count("waits")
+        waiter = defer.Deferred(canceller=lambda d: self._cancel_waiter(key, d))
+        self._waiters[key].append((waiter, (host, port, username, password)))
+        timeout = getattr(settings, "JASMIN_PB_TIMEOUT", 30)
+        waiter.addTimeout(timeout, reactor)
+        return waiter
+
+    def release(self, session: PBSession):
+        """Return a leased session; dead ones are dropped and a waiter is served."""
+        if session.reclaimed:
+            # maintain() already dropped it and freed its slot
+            return
+        self._leased.discard(session)
+        session.leased_at = None
+        key = session.key
+        session.last_used_at = time.monotonic()
+        if not session.is_alive():
+            self._discard(session, "dead")
+            self._serve_waiter(key)
+            return
+
+        waiters = self._waiters[key]
+        while waiters:
+            waiter, _ = waiters.popleft()
+            if not waiter.called:
+                self._count("hits")
+                waiter.callback(self._lease(session))
+                return
+        self._idle[key].append(session)
+
+    def _lease(self, session: PBSession) -> PBSession:
+        session.leased_at = time.monotonic()
+        self._leased.add(session)
+        return session
+
+    def _serve_waiter(self, key):
+        """A slot freed up: connect a fresh session for the oldest waiter."""
+        waiters = self._waiters[key]
+        while waiters:
+            waiter, credentials = waiters.popleft()
+            if waiter.called:
+                continue
+            self._count("misses")
+            self._connect(key, *credentials).addCallbacks(
+                lambda session, w=waiter: self._hand_over(w, session),
+                lambda failure, w=waiter: None if w.called else w.errback(failure),
+            )
+            return
+
+    def _hand_over(self, waiter, session: PBSession):
+        if waiter.called:
+            # the waiter timed out while we were connecting; keep the session
+            self.release(session)
+        else:
+            waiter.callback(self._lease(session))
+
+    def _cancel_waiter(self, key, deferred):
+        self._waiters[key] = deque(item for item in self._waiters[key] if item[0] is not deferred)
+
+    @defer.inlineCallbacks
+    def _connect(self, key, host, port, username, password):
+        self._size[key] += 1
+        proxy = JasminPBProxy()
+        started = time.monotonic()
+        try:
+            logger.debug("Opening pooled PB session to %s:%s (%s)", host, port, key[0])
+            yield proxy.connect(host, int(port), username, password)
+        except Exception:
+            self._size[key] -= 1
+            self._count("connect_failures")
+            proxy.disconnect()
+            # the slot we held is free again, let a waiter try its luck
+            self._serve_waiter(key)
+            raise
+        elapsed = time.monotonic() - started
+        with self._stats_lock:
+            self._stats["connects"] += 1
+            self._stats["connect_seconds_total"] += elapsed
+            self._stats["connect_seconds_max"] = max(self._stats["connect_seconds_max"], elapsed)
+        defer.returnValue(PBSession(key, proxy))
+
+    def _discard(self, session: PBSession, reason: str):
+        self._size[session.key] = max(0, self._size[session.key] - 1)
+        self._count(f"evicted_{reason}")
+        logger.debug("Dropping %s pooled PB session for %s", reason, session.key[0])
+        session.close()
+
+    def _ensure_reaper(self):
+        if self._reaper is not None and self._reaper.running:
+            return
+        interval = max(1.0, min(self.keepalive_secs, self.idle_secs, self.lease_secs) / 2)
+        self._reaper = task.LoopingCall(self.maintain)
+        self._reaper.start(interval, now=False).addErrback(
+            lambda f: logger.error("PB pool maintenance stopped: %s", f.getErrorMessage())
+        )
+
+    def maintain(self):
+        """Evict idle and stuck sessions and ping the rest to keep them warm."""
+        now = time.monotonic()
+        for session in [s for s in self._leased if now - s.leased_at >= self.lease_secs]:
+            # Its caller timed out long ago; a late release() is ignored
+            self._leased.discard(session)
+            session.reclaimed = True
+            logger.warning("Reclaiming PB session for %s leased %.0fs ago", session.key[0], now - session.leased_at)
+            self._discard(session, "stuck")
+            self._serve_waiter(session.key)
+        for key in list(self._idle.keys()):
+            keep = deque()
+            for session in self._idle[key]:
+                if not session.is_alive():
+                    self._discard(session, "dead")
+                elif now - session.last_used_at >= self.idle_secs:
+                    self._discard(session, "idle")
+                else:
+                    if now - session.last_ping_at >= self.keepalive_secs:
+                        self._ping(session)
+                    keep.append(session)
+            self._idle[key] = keep
+
+    def _ping(self, session: PBSession):
+        session.last_ping_at = time.monotonic()
+
+        def _failed(failure):
+            logger.debug("PB keep-alive failed for %s: %s", session.key[0], failure.getErrorMessage())
+            # the broker is (or will be) marked disconnected; closing makes sure
+            session.close()
+
+        session.pb.callRemote("version_release").addErrback(_failed)
+
+    def close_all(self):
+        """Drop every idle session (leased ones are dropped on release)."""
+        for key in list(self._idle.keys()):
+            while self._idle[key]:
+                self._discard(self._idle[key].pop(), "idle")
+
+
+pb_pool = PBSessionPool()
+
+
+def pb_pool_stats() -> dict:
+    """Pool hit/miss and connect-latency counters for the running process."""
+    return pb_pool.stats()
+
+
+class PooledPBMixin:
+    """
+    Makes a JasminPBProxy subclass borrow its connection from ``pb_pool``.
+
+    ``lease_session()`` (called from the adapter's ``pb_connect()``) points
+    ``self.pb`` at a pooled session; ``disconnect()`` hands it back instead of
+    closing the socket. The adapter methods keep their connect → call →
+    disconnect shape unchanged. Subclasses set ``pool_kind`` and
+    ``pool_endpoint_key``.
+    """
+
+    pool_kind = ""
+    pool_endpoint_key = ""
+    _session = None
+
+    @defer.inlineCallbacks
+    def lease_session(self):
+        password_tag = hashlib.sha256(str(self.password or "").encode("utf-8")).hexdigest()[:16]
+        self._session = yield pb_pool.acquire(
+            (self.pool_kind, self.pool_endpoint_key, password_tag),
+            self.host,
+            self.port,
+            self.username,
+            self.password,
+        )
+        self.pb = self._session.pb
+        self.isConnected = True
+
+    def disconnect(self):
+        session, self._session = self._session, None
+        if session is None:
+            return super().disconnect()
+        self.isConnected = False
+        self.pb = None
+        pb_pool.release(session)
@@ -81,7 +81,8 @@ def run_in_reactor(fn, *args, timeout=None, **kwargs):
 
     Returns the operation result, or raises:
       - whatever exception the operation failed with (re-raised in this thread)
-      - JasminPBTimeoutError if nothing came back within ``timeout`` seconds
+      - JasminPBTimeoutError if nothing came back within ``timeout`` seconds;
+        the operation's Deferred is then cancelled
     """
     ensure_reactor_running()
 
@@ -89,16 +90,24 @@ def run_in_reactor(fn, *args, timeout=None, **kwargs):
         timeout = getattr(settings, "JASMIN_PB_TIMEOUT", DEFAULT_TIMEOUT)
 
     result_queue = queue.Queue()
+    running = []
 
     def _run():
         d = defer.maybeDeferred(fn, *args, **kwargs)
+        running.append(d)
         d.addBoth(result_queue.put)
 
+    def _cancel():
+        # Nobody waits for the result any more; stop the operation where it is
+        for d in running:
+            d.cancel()
+
     reactor.callFromThread(_run)
 
     try:
         result = result_queue.get(timeout=timeout)
     except queue.Empty:
+        reactor.callFromThread(_cancel)
         raise JasminPBTimeoutError(
             f"Jasmin did not respond within {timeout}s, is the Jasmin PB service reachable?"
         )
@@ -24,19 +24,26 @@ from jasmin.managers.proxies import SMPPClientManagerPBProxy
 from jasmin.protocols.cli.smppccm import JCliSMPPClientConfig
 from twisted.internet import defer
 
+from quark.jasmin.pb_pool import PooledPBMixin, pb_pool
+
 logger = logging.getLogger(__name__)
 
 
-class SmppPBAdapter(SMPPClientManagerPBProxy):
+class SmppPBAdapter(PooledPBMixin, SMPPClientManagerPBProxy):
     """
-    Connection-per-operation wrapper around Jasmin's SMPPClientManagerPBProxy.
+    Operation-per-call wrapper around Jasmin's SMPPClientManagerPBProxy.
 
     Every method connects, runs the operation, optionally persists, and always
-    disconnects. Errors are re-raised (never swallowed) so callers can report
-    a truthful outcome. All methods return Deferreds and must be executed in
-    the reactor thread via quark.jasmin.reactor.run_in_reactor().
+    disconnects. "Connect" leases an authenticated session from
+    quark.jasmin.pb_pool and "disconnect" returns it, so the TCP + PB login
+    handshake is only paid when the pool has no idle session. Errors are
+    re-raised (never swallowed) so callers can report a truthful outcome. All
+    methods return Deferreds and must be executed in the reactor thread via
+    quark.jasmin.reactor.run_in_reactor().
     """
 
+    pool_kind = "smpp"
+
     def __init__(self, connection=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if connection is not None:
@@ -45,16 +52,23 @@ class SmppPBAdapter(SMPPClientManagerPBProxy):
             self.port = int(endpoint.port)
             self.username = endpoint.username
             self.password = endpoint.password
+            self.pool_endpoint_key = connection.smpp_endpoint_key
         else:
             self.host = settings.JASMIN_SMPP_PB_HOST
             self.port = settings.JASMIN_SMPP_PB_PORT
             self.username = settings.JASMIN_SMPP_PB_USERNAME
             self.password = settings.JASMIN_SMPP_PB_PASSWORD
+            self.pool_endpoint_key = (
+                f"{self.host}:{self.port}:{self.username}:{str(settings.JASMIN_HTTP_API_URL).rstrip('/')}"
+            )
 
     @defer.inlineCallbacks
     def pb_connect(self):
         logger.debug("Establishing a connection to jasmin SMPPClientManagerPB at %s:%s", self.host, self.port)
-        yield super().connect(self.host, self.port, self.username, self.password)
+        if pb_pool.enabled:
+            yield self.lease_session()
+        else:
+            yield super().connect(self.host, self.port, self.username, self.password)
 
     @defer.inlineCallbacks
     def add_connector(self, smpp_config: JCliSMPPClientConfig, persist: bool = True):
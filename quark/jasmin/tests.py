@@ -1,3 +1,4 @@
+import time
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
@@ -6,9 +7,12 @@ from django.test import SimpleTestCase, TestCase
 from jasmin.routing.Routes import DefaultRoute, StaticMORoute
 from jasmin.routing.jasminApi import Group, HttpConnector
 
-from .models import JasminGroup, JasminRoute
+from .connection import JasminNotConfigured, connection_cache_stats, resolve_jasmin_connection
+from .models import JasminGroup, JasminRoute, JasminSMPPConnector, JasminUser
+from .pb_pool import PBSession, PBSessionPool
 from .reactor import run_in_reactor
 from .router_pb import RouterPBInterface
+from .user_cache import get_sending_user
 
 User = get_user_model()
 
@@ -62,6 +66,303 @@ class MORouteTestCase(SimpleTestCase):
         self.assertIn("HTTP or SMPP", str(ctx.exception))
 
 
+class PBSessionPoolTestCase(SimpleTestCase):
+    KEY = ("router", "127.0.0.1:8988:radmin:http://127.0.0.1:1401", "tag")
+
+    def setUp(self):
+        from unittest.mock import MagicMock, patch
+        from twisted.internet import defer
+
+        self.pool = PBSessionPool(max_sessions=1, idle_secs=300, keepalive_secs=60)
+
+        def fake_connect(key, *args):
+            proxy = MagicMock(isConnected=True)
+            proxy.pb.broker.disconnected = False
+            self.pool._size[key] += 1
+            return defer.succeed(PBSession(key, proxy))
+
+        patcher = patch.object(self.pool, "_connect", side_effect=fake_connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: self.pool._reaper and self.pool._reaper.running and self.pool._reaper.stop())
+
+    def _lease(self):
+        results = []
+        self.pool.acquire(self.KEY, "127.0.0.1", 8988, "radmin", "rpwd").addBoth(results.append)
+        return results
+
+    def test_released_session_is_reused(self):
+        first = self._lease()[0]
+        self.pool.release(first)
+        second = self._lease()[0]
+
+        self.assertIs(first, second)
+        stats = self.pool.stats()
+        self.assertEqual((stats["misses"], stats["hits"]), (1, 1))
+
+    def test_saturated_endpoint_waits_for_release(self):
+        first = self._lease()[0]
+        waiting = self._lease()
+        self.assertEqual(waiting, [])
+
+        self.pool.release(first)
+        self.assertEqual(waiting, [first])
+        waiting[0].proxy.isConnected = False
+        self.pool.release(first)
+
+    def test_dead_session_is_replaced(self):
+        first = self._lease()[0]
+        self.pool.release(first)
+        first.proxy.pb.broker.disconnected = True
+
+        second = self._lease()[0]
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pool.stats()["evicted_dead"], 1)
+
+    def test_stuck_lease_is_reclaimed_for_waiters(self):
+        first = self._lease()[0]
+        waiting = self._lease()
+        self.pool._lease_secs = 0
+
+        # The caller gave up on a hung broker and never released
+        self.pool.maintain()
+        self.assertEqual(len(waiting), 1)
+        self.assertIsNot(waiting[0], first)
+        self.assertEqual(self.pool.stats()["evicted_stuck"], 1)
+        first.proxy.disconnect.assert_called_once()
+
+        # A late release does not free the slot a second time
+        self.pool.release(first)
+        self.assertEqual(self.pool._size[self.KEY], 1)
+        self.pool._lease_secs = 300
+        self.pool.release(waiting[0])
+        self.assertIs(self._lease()[0], waiting[0])
+
+
+class ConnectorLiveStatusTestCase(TestCase):
+    def setUp(self):
+        from quark.workspace.models import WorkSpace
+
+        self.user = User.objects.create_user(username="status-tester", password="12345678")
+        self.workspace = WorkSpace.objects.create(
+            name="Status", timezone="UTC", prefix="status", jasmin_link=WorkSpace.JASMIN_LINK_DEMO,
+            created_by=self.user, modified_by=self.user,
+        )
+        self.connector = JasminSMPPConnector(
+            workspace=self.workspace, cid="smppc_status", host="127.0.0.1", password="pwd",
+            created_by=self.user, modified_by=self.user,
+        )
+        self.connector.save(run_on_reactor=False)
+
+    def test_loading_connectors_does_no_pb_io(self):
+        from unittest.mock import patch
+
+        with patch("quark.utils.jasmin.extras.run_in_reactor") as pb_call:
+            list(JasminSMPPConnector.objects.all())
+            JasminSMPPConnector.objects.get(pk=self.connector.pk)
+        pb_call.assert_not_called()
+
+    def test_with_live_status_batches_and_persists(self):
+        from unittest.mock import patch
+
+        with patch(
+            "quark.jasmin.connector_status.get_connector_statuses",
+            return_value={"smppc_status": True},
+        ) as fetch:
+            connectors = list(JasminSMPPConnector.objects.filter(workspace=self.workspace).with_live_status()[:10])
+
+        fetch.assert_called_once()
+        self.assertTrue(connectors[0].live_status)
+        self.connector.refresh_from_db()
+        self.assertTrue(self.connector.is_active)
+
+
+class ConnectionCacheTestCase(TestCase):
+    def setUp(self):
+        from unittest.mock import patch
+
+        from quark.workspace.models import WorkSpace
+
+        user = User.objects.create_user(username="conn-tester", password="12345678")
+        self.workspace = WorkSpace.objects.create(
+            name="Custom Jasmin", timezone="UTC", prefix="customjasmin", jasmin_link=WorkSpace.JASMIN_LINK_CUSTOM,
+            jasmin_router_pb_host="jasmin.example.com", jasmin_router_pb_port=8988,
+            jasmin_router_pb_username="radmin", jasmin_router_pb_password="r-secret",
+            jasmin_smpp_pb_host="jasmin.example.com", jasmin_smpp_pb_port=8989,
+            jasmin_smpp_pb_username="sadmin", jasmin_smpp_pb_password="s-secret",
+            jasmin_http_api_url="http://jasmin.example.com:1401",
+            created_by=user, modified_by=user,
+        )
+        patcher = patch("quark.jasmin.connection.decrypt_secret", side_effect=lambda value: value)
+        self.decrypt = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connection_is_built_once_per_version(self):
+        from quark.workspace.models import WorkSpace
+
+        first = resolve_jasmin_connection(self.workspace)
+        # A freshly loaded row (e.g. in a Celery task) hits the same entry
+        again = resolve_jasmin_connection(WorkSpace.objects.get(pk=self.workspace.pk))
+        self.assertIs(first, again)
+        self.assertEqual(self.decrypt.call_count, 2)
+
+        self.workspace.jasmin_router_pb_host = "jasmin2.example.com"
+        self.workspace.save()
+        self.assertEqual(resolve_jasmin_connection(self.workspace).router_pb.host, "jasmin2.example.com")
+
+        stale = WorkSpace.objects.get(pk=self.workspace.pk)
+        self.workspace.clear_jasmin_custom_connection()
+        with self.assertRaises(JasminNotConfigured):
+            resolve_jasmin_connection(self.workspace)
+        # A copy loaded before the change still resolves, from its own stamp
+        self.assertEqual(resolve_jasmin_connection(stale).router_pb.host, "jasmin2.example.com")
+        self.assertGreater(connection_cache_stats()["hits"], 0)
+
+
+class SendingUserCacheTestCase(TestCase):
+    def setUp(self):
+        from quark.workspace.models import WorkSpace
+
+        user = User.objects.create_user(username="sender-owner", password="12345678")
+        self.workspace = WorkSpace.objects.create(
+            name="Sender Space", timezone="UTC", prefix="senderspace", jasmin_link=WorkSpace.JASMIN_LINK_DEMO,
+            created_by=user, modified_by=user,
+        )
+        group = JasminGroup(gid="senders", workspace=self.workspace, created_by=user, modified_by=user)
+        group.save(run_on_reactor=False)
+        self.sender = JasminUser(
+            username="api-sender", password="pw", group=group, created_by=user, modified_by=user
+        )
+        self.sender.save(run_on_reactor=False)
+
+    def test_warm_lookup_does_no_query_and_saves_invalidate(self):
+        first = get_sending_user(self.workspace, "api-sender")
+        self.assertEqual((first.pk, first.password), (self.sender.pk, "pw"))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_sending_user(self.workspace, "api-sender").pk, self.sender.pk)
+
+        self.sender.password = "rotated"
+        self.sender.save(run_on_reactor=False)
+        self.assertEqual(get_sending_user(self.workspace, "api-sender").password, "rotated")
+
+        self.sender.enabled = False
+        self.sender.save(run_on_reactor=False)
+        self.assertIsNone(get_sending_user(self.workspace, "api-sender"))
+
+    def test_entries_expire_without_an_invalidation(self):
+        from unittest.mock import patch
+
+        get_sending_user(self.workspace, "api-sender")
+        # A change made where this process's cache never sees the stamp bump
+        JasminUser.objects.filter(pk=self.sender.pk).update(password="rotated")
+        self.assertEqual(get_sending_user(self.workspace, "api-sender").password, "pw")
+
+        with patch("quark.jasmin.user_cache.time.monotonic", return_value=time.monotonic() + 3600):
+            self.assertEqual(get_sending_user(self.workspace, "api-sender").password, "rotated")
+
+
+class JasminUserSyncTestCase(TestCase):
+    def setUp(self):
+        from quark.workspace.models import WorkSpace
+
+        user = User.objects.create_user(username="sync-owner", password="12345678")
+        self.workspace = WorkSpace.objects.create(
+            name="Sync Space", timezone="UTC", prefix="syncspace", jasmin_link=WorkSpace.JASMIN_LINK_DEMO,
+            created_by=user, modified_by=user,
+        )
+        group = JasminGroup(gid="syncers", workspace=self.workspace, created_by=user, modified_by=user)
+        group.save(run_on_reactor=False)
+        for name in ("sync-a", "sync-b"):
+            JasminUser(username=name, password="pw", group=group, created_by=user, modified_by=user).save(
+                run_on_reactor=False
+            )
+        self.remote = {name: self._remote(name) for name in ("sync-a", "sync-b")}
+
+    @staticmethod
+    def _remote(uid):
+        from types import SimpleNamespace
+
+        from jasmin.routing.jasminApi import MtMessagingCredential, SmppsCredential
+
+        return SimpleNamespace(
+            uid=uid, enabled=True, mt_credential=MtMessagingCredential(), smpps_credential=SmppsCredential()
+        )
+
+    def test_only_changed_users_are_written(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .user_sync import sync_workspace_users
+
+        self.assertEqual(sync_workspace_users(self.workspace, self.remote).changed, 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            stats = sync_workspace_users(self.workspace, self.remote)
+        self.assertEqual((stats.checked, stats.changed, stats.unchanged), (2, 0, 2))
+        self.assertFalse([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")])
+
+        get_sending_user(self.workspace, "sync-a")
+        self.remote["sync-a"].mt_credential.setQuota("balance", 10.0)
+        stats = sync_workspace_users(self.workspace, self.remote)
+        self.assertEqual((stats.changed, stats.unchanged), (1, 1))
+        self.assertEqual(JasminUser.objects.get(username="sync-a").mt_credential["quotas"]["balance"], 10.0)
+        # The workspace's cached sending users were invalidated
+        self.assertEqual(get_sending_user(self.workspace, "sync-a").mt_credential["quotas"]["balance"], 10.0)
+
+    def test_cron_fetches_endpoints_concurrently_and_backs_off_dead_ones(self):
+        from types import SimpleNamespace
+        from unittest.mock import patch
+
+        from django.core.cache import cache
+        from twisted.internet import defer
+
+        from quark.crons import jasmin_user_sync
+        from quark.workspace.models import WorkSpace
+
+        dead = WorkSpace.objects.create(
+            name="Dead Space", timezone="UTC", prefix="deadspace", jasmin_link=WorkSpace.JASMIN_LINK_DEMO,
+            created_by=self.workspace.created_by, modified_by=self.workspace.created_by,
+        )
+        remote = list(self.remote.values())
+
+        class FakeRouterPB:
+            def __init__(self, connection):
+                self.connection = connection
+
+            def get_all_users(self):
+                # The dead endpoint never answers
+                return defer.succeed(remote) if self.connection.endpoint_key == "good" else defer.Deferred()
+
+        def resolve(workspace):
+            return SimpleNamespace(endpoint_key="good" if workspace.pk == self.workspace.pk else "dead")
+
+        cache.delete(jasmin_user_sync._backoff_key("dead"))
+        with (
+            self.settings(JOYCE_JASMIN_USER_SYNC_TIMEOUT=0.5),
+            patch.object(jasmin_user_sync, "_workspaces_due_for_sync", return_value=[self.workspace, dead]),
+            patch("quark.jasmin.connection.resolve_jasmin_connection", side_effect=resolve),
+            patch("quark.jasmin.router_pb.RouterPBInterface", FakeRouterPB),
+        ):
+            started = time.monotonic()
+            result = jasmin_user_sync.sync_jasmin_users()
+            self.assertLess(time.monotonic() - started, 5)
+            self.assertEqual((result["synced_workspaces"], result["changed"]), (1, 2))
+            self.assertEqual(result["failed_endpoints"], ["dead"])
+            self.assertTrue(jasmin_user_sync.backed_off_until("dead"))
+
+            # The dead endpoint is skipped while backed off; its workspace stays due
+            result = jasmin_user_sync.sync_jasmin_users()
+            self.assertEqual(result["backed_off_endpoints"], ["dead"])
+            self.assertEqual(result["unchanged"], 2)
+            dead.refresh_from_db()
+            self.assertIsNone(dead.jasmin_user_last_synced_at)
+
+            cache.add(jasmin_user_sync.LOCK_KEY, 1)
+            self.assertTrue(jasmin_user_sync.sync_jasmin_users()["locked"])
+        cache.delete(jasmin_user_sync.LOCK_KEY)
+        cache.delete(jasmin_user_sync._backoff_key("dead"))
+
+
 class GroupTestCase(TestCase):
     """
     Integration tests, these require a reachable Jasmin RouterPB
@@ -0,0 +1,136 @@
+#  Copyright (c) 2026
+#
+#  This project is licensed under the GNU General Public License v3.0. You may
+#  redistribute it and/or modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+#  without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along with this project.
+#  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Sending-user lookups for the messaging API.
+
+``get_sending_user(workspace, username)`` returns the enabled JasminUser used
+to submit, from a per-process LRU keyed by (workspace id, username). Entries
+hold only what submitting needs and are checked against a per-workspace
+version stamp in the Django cache, so a warm send does no database query and
+the clear-text password never leaves the process.
+
+``invalidate_workspace_jasmin_users`` bumps the stamp; JasminUser and
+JasminGroup save/delete call it, and every process sees the bump on its next
+lookup, provided the Django cache is shared (``JOYCE_CACHE_URL``; the shipped
+compose files point it at Redis). Entries also expire after
+``JOYCE_JASMIN_USER_CACHE_TTL`` seconds, which bounds how long a process with
+a private cache, or one that missed a bump, keeps using a stale user.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_SIZE = 2048
+DEFAULT_TTL = 60
+
+# Fields copied into the cached row; enough for submit_send and quotas
+CACHED_FIELDS = ("id", "username", "password", "group_id", "enabled", "mt_credential")
+
+
+def _ttl() -> int:
+    return max(1, int(getattr(settings, "JOYCE_JASMIN_USER_CACHE_TTL", DEFAULT_TTL)))
+
+
+def _version_key(workspace_id) -> str:
+    return f"joyce:jasmin-users:{workspace_id}:version"
+
+
+def _version(workspace_id) -> str:
+    key = _version_key(workspace_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+class SendingUserCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, workspace, username: str):
+        from quark.jasmin.models import JasminUser
+
+        key = (workspace.pk, username)
+        # Read before the row: a save racing the query leaves a stale stamp
+        version = _version(workspace.pk)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == version and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._instance(entry[0])
+            self.misses += 1
+
+        row = (
+            JasminUser.objects.filter(username=username, group__workspace=workspace, enabled=True)
+            .values(*CACHED_FIELDS)
+            .first()
+        )
+        with self._lock:
+            if row is None:
+                self._entries.pop(key, None)
+                return None
+            self._entries[key] = (row, version, time.monotonic() + _ttl())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return self._instance(row)
+
+    @staticmethod
+    def _instance(values: dict):
+        from quark.jasmin.models import JasminUser
+
+        user = JasminUser(**dict(values, mt_credential=dict(values["mt_credential"] or {})))
+        user._state.adding = False
+        user._state.db = "default"
+        return user
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+_users = SendingUserCache(int(getattr(settings, "JOYCE_JASMIN_USER_CACHE_SIZE", DEFAULT_SIZE)))
+
+
+def get_sending_user(workspace, username: str):
+    """Enabled JasminUser ``username`` of ``workspace``, or None."""
+    return _users.get(workspace, username)
+
+
+def invalidate_workspace_jasmin_users(workspace_id):
+    if workspace_id is not None:
+        cache.set(_version_key(workspace_id), uuid.uuid4().hex, timeout=None)
+
+
+def jasmin_user_cache_stats() -> dict:
+    return _users.stats()
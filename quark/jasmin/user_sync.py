@@ -0,0 +1,103 @@
+#  Copyright (c) 2026
+#
+#  This project is licensed under the GNU General Public License v3.0. You may
+#  redistribute it and/or modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This project is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+#  without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License along with this project.
+#  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Writing Jasmin user credentials fetched with ``user_get_all`` into Django.
+
+Each local JasminUser stores ``credential_hash``, the hash of its credential
+JSON and enabled flag. A sync converts the remote credentials, hashes them
+and only touches rows whose hash differs: those are written with one
+``bulk_update`` per workspace, followed by one sending-user cache
+invalidation for that workspace. Unchanged users cost no write at all.
+"""
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Iterable
+
+from django.utils import timezone
+
+from quark.jasmin.models import JasminGroup, JasminUser
+from quark.jasmin.user_cache import invalidate_workspace_jasmin_users
+
+SYNC_UPDATE_FIELDS = ["mt_credential", "smpps_credential", "enabled", "credential_hash", "modified_on"]
+
+
+@dataclass
+class UserSyncStats:
+    checked: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    missing: int = 0
+    duration_ms: int = 0
+
+    def merge(self, other: "UserSyncStats"):
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def remote_users_by_uid(remote_users) -> dict:
+    return {getattr(u, "uid", None) or getattr(u, "username", None): u for u in remote_users or []}
+
+
+def sync_users(locals_list: Iterable[JasminUser], by_uid: dict) -> tuple[list[JasminUser], UserSyncStats]:
+    """
+    Refresh ``locals_list`` in place from ``by_uid`` (see remote_users_by_uid) and
+    write the changed ones; returns (users found on Jasmin, stats).
+    """
+    started = time.monotonic()
+    stats = UserSyncStats()
+    matched, changed = [], []
+    for local in locals_list:
+        stats.checked += 1
+        remote = by_uid.get(local.username)
+        if remote is None:
+            stats.missing += 1
+            continue
+        matched.append(local)
+        if local.apply_jasmin_user(remote, save=False):
+            changed.append(local)
+            stats.changed += 1
+        else:
+            stats.unchanged += 1
+
+    if changed:
+        workspaces = dict(
+            JasminGroup.objects.filter(pk__in={local.group_id for local in changed}).values_list("pk", "workspace_id")
+        )
+        by_workspace = defaultdict(list)
+        now = timezone.now()
+        for local in changed:
+            # JasminUser.save() is bypassed: stamp the row here
+            local.credential_hash = local.current_credential_hash()
+            local.modified_on = now
+            by_workspace[workspaces.get(local.group_id)].append(local)
+        for workspace_id, users in by_workspace.items():
+            JasminUser.objects.bulk_update(users, SYNC_UPDATE_FIELDS)
+            invalidate_workspace_jasmin_users(workspace_id)
+
+    stats.duration_ms = int((time.monotonic() - started) * 1000)
+    return matched, stats
+
+
+def sync_workspace_users(workspace, by_uid: dict) -> UserSyncStats:
+    """Sync every local user of ``workspace`` against one ``user_get_all`` result."""
+    locals_qs = JasminUser.objects.filter(group__workspace=workspace)
+    _, stats = sync_users(locals_qs, by_uid)
+    return stats
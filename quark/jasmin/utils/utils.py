@@ -16,6 +16,9 @@
 #  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
+import json
+
 from django.core.exceptions import ValidationError
 from django.db import models
 from jasmin.routing.jasminApi import MtMessagingCredential, SmppsCredential
@@ -141,6 +144,17 @@ def from_jasmin_smpp_creds(smpp_cred: SmppsCredential) -> dict:
     }
 
 
+def credential_hash(mt_credential: dict, smpps_credential: dict, enabled: bool) -> str:
+    """Stable SHA-256 of a user's credential JSON and enabled flag (key order does not matter)."""
+    canonical = json.dumps(
+        {"mt": mt_credential or {}, "smpps": smpps_credential or {}, "enabled": bool(enabled)},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 TON_VALUES = {
     "0": AddrTon.UNKNOWN,
     "1": AddrTon.INTERNATIONAL,
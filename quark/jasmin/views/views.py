@@ -312,8 +312,15 @@ class JasminSMPPConnectorCRUDL(SmartCRUDL):
         update_form = JasminSPPConnectorForm
         actions = ['status', 'edit', 'delete']
 
+        def derive_queryset(self, **kwargs):
+            return super().derive_queryset(**kwargs).with_live_status()
+
         def get_status(self, obj):
-            if obj.is_active:
+            # live_status is attached by with_live_status(); None means Jasmin did not report it
+            running = getattr(obj, "live_status", None)
+            if running is None:
+                running = obj.is_active
+            if running:
                 return mark_safe(
                     '<span class="inline-flex items-center gap-1.5 rounded-full bg-neutral-950 px-2.5 py-0.5 '
                     'font-mono text-[10px] uppercase tracking-wider text-white">'
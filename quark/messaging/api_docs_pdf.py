@@ -449,8 +449,9 @@ def build_messaging_api_pdf(*, send_url: str, workspace_name: str = "") -> bytes
             [
                 ["How many destinations", "REST URL on the workspace?", "What happens"],
                 ["1", "Does not matter", "Synchronous classic HTTP /send"],
-                ["2 or more", "Yes", "Chunked Jasmin REST sendbatch"],
-                ["2 or more", "No", "Celery queue: classic /send, one by one"],
+                ["2 or more", "Yes", "Chunked Jasmin REST sendbatch, chunks in parallel"],
+                ["2 or more, \"async\": true", "Yes", "Celery queue: chunked REST sendbatch"],
+                ["2 or more", "No", "Celery queue: classic /send, pipelined"],
             ],
             styles,
             col_widths=[42 * mm, 52 * mm, 76 * mm],
@@ -461,13 +462,20 @@ def build_messaging_api_pdf(*, send_url: str, workspace_name: str = "") -> bytes
     s.append(
         Paragraph(
             "<b>200</b> means Joyce submitted (or queued via REST) in this request. "
-            "<b>202</b> means <font face='%s'>bulk_async</font>: accepted, workers "
+            "<b>202</b> means <font face='%s'>single_async</font>, "
+            "<font face='%s'>bulk_async</font> or "
+            "<font face='%s'>bulk_rest_async</font>: accepted, workers "
             "will hit Jasmin in the background. <font face='%s'>mode</font> is "
-            "<font face='%s'>single</font>, <font face='%s'>bulk_rest</font>, or "
+            "<font face='%s'>single</font>, <font face='%s'>single_async</font>, "
+            "<font face='%s'>bulk_rest</font>, "
+            "<font face='%s'>bulk_rest_async</font> or "
             "<font face='%s'>bulk_async</font>. The <font face='%s'>messages</font> "
             "array is capped at 100 rows; look up the rest in Operate with "
-            "<font face='%s'>batch_id</font>."
-            % ((FONT_MONO,) * 7),
+            "<font face='%s'>batch_id</font>. Sends are paced to the Jasmin "
+            "user's throughput quota; <font face='%s'>throttle</font> shows its "
+            "rate, backlog and current delay, and a send that would wait too "
+            "long is queued (<font face='%s'>single_async</font>)."
+            % ((FONT_MONO,) * 13),
             styles["body"],
         )
     )
@@ -0,0 +1,95 @@
+#
+#  Copyright (c) 2026
+#  Pooled async client for Jasmin HTTP /send (ASGI messaging endpoint).
+#
+"""
+Async counterpart of quark.messaging.http_pool for the ASGI send endpoint.
+
+One ``httpx.AsyncClient`` per event loop and Jasmin origin, allowing up to
+``JOYCE_ASYNC_HTTP_MAX_CONNECTIONS`` concurrent connections of which
+``JOYCE_ASYNC_HTTP_KEEPALIVE`` are kept open between requests. As with the
+sync pool, only connect errors are retried (``JOYCE_HTTP_CONNECT_RETRIES``),
+so a /send that may have reached Jasmin is never submitted twice.
+
+httpx is optional: without it ``AsyncJasminHttpClient.send`` runs the
+blocking JasminHttpClient in a worker thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import weakref
+from typing import Optional
+from urllib.parse import urljoin
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from quark.messaging.clients import JasminHttpClient, JasminHttpResult, parse_post_response, send_payload
+from quark.messaging.http_pool import DEFAULT_CONNECT_RETRIES, _origin
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 1000
+DEFAULT_KEEPALIVE = 200
+
+# event loop -> origin -> AsyncClient; a client is bound to the loop that opened it
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _build_client():
+    limits = httpx.Limits(
+        max_connections=int(getattr(settings, "JOYCE_ASYNC_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(getattr(settings, "JOYCE_ASYNC_HTTP_KEEPALIVE", DEFAULT_KEEPALIVE)),
+    )
+    transport = httpx.AsyncHTTPTransport(
+        limits=limits,
+        retries=int(getattr(settings, "JOYCE_HTTP_CONNECT_RETRIES", DEFAULT_CONNECT_RETRIES)),
+    )
+    return httpx.AsyncClient(transport=transport)
+
+
+def get_async_client(base_url: str):
+    """Shared AsyncClient for the origin of ``base_url`` on the running loop."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    key = _origin(base_url)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = _build_client()
+    return client
+
+
+async def aclose_clients():
+    """Close the clients of the running loop (pooled sockets included)."""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+class AsyncJasminHttpClient:
+    """Jasmin HTTP API ``POST /send`` without blocking the event loop."""
+
+    def __init__(self, base_url: Optional[str] = None, timeout: Optional[float] = None):
+        self.base_url = (base_url or settings.JASMIN_HTTP_API_URL).rstrip("/") + "/"
+        self.timeout = timeout if timeout is not None else getattr(settings, "JASMIN_HTTP_API_TIMEOUT", 15)
+
+    async def send(self, **kwargs) -> JasminHttpResult:
+        """Same keyword arguments and result as ``JasminHttpClient.send``."""
+        if httpx is None:
+            client = JasminHttpClient(base_url=self.base_url, timeout=self.timeout)
+            return await sync_to_async(client.send, thread_sensitive=False)(**kwargs)
+
+        try:
+            response = await get_async_client(self.base_url).post(
+                urljoin(self.base_url, "send"), data=send_payload(**kwargs), timeout=self.timeout
+            )
+        except httpx.HTTPError as exc:
+            logger.exception("Jasmin HTTP /send failed")
+            return JasminHttpResult(ok=False, text="", error=str(exc), status_code=0)
+        return parse_post_response(response.status_code, response.text, parse_msg_id=True)
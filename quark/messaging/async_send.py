@@ -0,0 +1,265 @@
+#
+#  Copyright (c) 2026
+#  Async submit path behind the ASGI messaging send endpoint.
+#
+"""
+``asubmit_send`` is ``submit_send`` for coroutines.
+
+A single destination is handled without holding a thread for the Jasmin
+round-trip: the queued row is written, the Jasmin user's throughput slot is
+awaited (quark.messaging.throttle), /send is awaited on the pooled async
+client (quark.messaging.async_http) and the result is written back.
+Everything that may reach the ORM, the cache or Redis (the Jasmin connection,
+the throttle buckets and reservations, row writes) runs in a thread through
+``sync_to_async``, never on the event loop; ``send_context`` lets a caller
+resolve the first two in a hop it already makes.
+
+Row writes from concurrent requests go through one ``WriteBatcher`` per event
+loop, which coalesces them into a ``bulk_create`` / ``bulk_update`` every
+``JOYCE_ASYNC_WRITE_BATCH`` rows or ``JOYCE_ASYNC_WRITE_DELAY_MS``
+milliseconds, whichever comes first. Each request still waits for its own
+rows to be committed before it answers. A failing batch is retried row by
+row so one bad message only fails its own request.
+
+Bulk payloads keep the synchronous ``submit_send``, run in a thread: they
+only create rows and hand dispatch to Jasmin REST or Celery.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+import weakref
+from typing import Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from quark.jasmin.connection import resolve_jasmin_connection
+from quark.jasmin.models import JasminUser
+from quark.messaging.async_http import AsyncJasminHttpClient
+from quark.messaging.bulk_http import UPDATE_FIELDS
+from quark.messaging.models import OutboundMessage, dlr_callback_url
+from quark.messaging.payloads import store_payloads
+from quark.messaging.rollup import record_created, record_transitions
+from quark.messaging.services import (
+    SendItem,
+    SubmitResult,
+    apply_send_result,
+    defer_single_send,
+    new_outbound_message,
+    submit_send,
+)
+from quark.messaging.throttle import Admission, admit, buckets_for, estimate, max_wait as throttle_max_wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WRITE_BATCH = 200
+DEFAULT_WRITE_DELAY_MS = 5
+
+ASYNC_UPDATE_FIELDS = UPDATE_FIELDS + ["modified_by"]
+
+
+class WriteBatcher:
+    """Coalesces OutboundMessage inserts and updates of concurrent coroutines."""
+
+    def __init__(self, max_batch: int = DEFAULT_WRITE_BATCH, delay: float = DEFAULT_WRITE_DELAY_MS / 1000):
+        self.max_batch = max(1, max_batch)
+        self.delay = max(0.0, delay)
+        self._creates: list = []
+        self._updates: list = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.flushes = 0
+
+    async def create(self, message: OutboundMessage):
+        await self._enqueue(self._creates, message)
+
+    async def update(self, message: OutboundMessage):
+        await self._enqueue(self._updates, message)
+
+    def _enqueue(self, queue: list, message: OutboundMessage) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue.append((message, future))
+        if len(self._creates) + len(self._updates) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.delay, self._flush_now)
+        return future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        creates, self._creates = self._creates, []
+        updates, self._updates = self._updates, []
+        if creates or updates:
+            asyncio.get_running_loop().create_task(self._flush(creates, updates))
+
+    async def _flush(self, creates: list, updates: list):
+        self.flushes += 1
+        try:
+            errors = await sync_to_async(self._write)(
+                [m for m, _ in creates], [m for m, _ in updates]
+            )
+        except Exception as exc:
+            errors = {id(m): exc for m, _ in creates + updates}
+        for message, future in creates + updates:
+            if future.done():
+                continue
+            error = errors.get(id(message))
+            if error is None:
+                future.set_result(message)
+            else:
+                future.set_exception(error)
+
+    @staticmethod
+    def _write(creates: list[OutboundMessage], updates: list[OutboundMessage]) -> dict:
+        """Write both lists; returns ``id(message) -> exception`` for rows that failed."""
+        errors = {}
+        store_payloads(creates + updates)
+        if creates:
+            try:
+                with transaction.atomic():
+                    OutboundMessage.objects.bulk_create(creates)
+            except Exception:
+                logger.exception("Batched message insert failed; retrying row by row")
+                for message in creates:
+                    message.pk = None
+                    try:
+                        message.save()
+                    except Exception as exc:
+                        errors[id(message)] = exc
+            else:
+                record_created(creates)
+        if updates:
+            try:
+                with transaction.atomic():
+                    OutboundMessage.objects.bulk_update(updates, ASYNC_UPDATE_FIELDS)
+            except Exception:
+                logger.exception("Batched message update failed; retrying row by row")
+                for message in updates:
+                    try:
+                        message.save(update_fields=ASYNC_UPDATE_FIELDS)
+                    except Exception as exc:
+                        errors[id(message)] = exc
+            else:
+                record_transitions(updates)
+        return errors
+
+
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, WriteBatcher]" = weakref.WeakKeyDictionary()
+
+
+def send_context(workspace, jasmin_user: JasminUser) -> tuple:
+    """
+    ``(Jasmin connection, throttle buckets)`` of a single send. Sync: both are
+    cached, but a cold entry reads the ORM or the cache.
+    """
+    connection = resolve_jasmin_connection(workspace)
+    return connection, buckets_for(jasmin_user, connection)
+
+
+def get_write_batcher() -> WriteBatcher:
+    """The WriteBatcher of the running event loop."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = WriteBatcher(
+            max_batch=int(getattr(settings, "JOYCE_ASYNC_WRITE_BATCH", DEFAULT_WRITE_BATCH)),
+            delay=int(getattr(settings, "JOYCE_ASYNC_WRITE_DELAY_MS", DEFAULT_WRITE_DELAY_MS)) / 1000,
+        )
+    return batcher
+
+
+async def asubmit_send(
+    *,
+    workspace,
+    jasmin_user: JasminUser,
+    items: Iterable[SendItem],
+    from_addr: str = "",
+    dlr_level: int = 3,
+    priority: int = 0,
+    client_batch_id: str = "",
+    created_by=None,
+    defer_rest: Optional[bool] = None,
+    context: Optional[tuple] = None,
+) -> SubmitResult:
+    """
+    Async ``submit_send``: same arguments, result and exceptions. ``context``
+    is ``send_context(workspace, jasmin_user)`` when the caller has it.
+    """
+    total = len(items)
+    if total != 1:
+        return await sync_to_async(submit_send)(
+            workspace=workspace,
+            jasmin_user=jasmin_user,
+            items=items,
+            from_addr=from_addr,
+            dlr_level=dlr_level,
+            priority=priority,
+            client_batch_id=client_batch_id,
+            created_by=created_by,
+            defer_rest=defer_rest,
+        )
+
+    # Raises JasminNotConfigured before any row is written
+    connection, buckets = context or await sync_to_async(send_context)(workspace, jasmin_user)
+    item = next(iter(items))
+    client_batch_id = (client_batch_id or "").strip()
+    message = new_outbound_message(
+        workspace=workspace,
+        jasmin_user=jasmin_user,
+        to_addr=item.to_addr,
+        content=item.content,
+        from_addr=from_addr,
+        dlr_level=dlr_level,
+        priority=priority,
+        batch_id=uuid.uuid4().hex[:16],
+        batch_kind=OutboundMessage.BATCH_SINGLE,
+        client_batch_id=client_batch_id,
+        client_message_id=item.client_message_id,
+        created_by=created_by,
+    )
+    batcher = get_write_batcher()
+    await batcher.create(message)
+
+    if buckets:
+        # Same quota pacing as submit_outbound_message; the bucket may live in Redis
+        admission = await sync_to_async(admit, thread_sensitive=False)(buckets, max_wait=throttle_max_wait())
+        if not admission.granted:
+            await sync_to_async(defer_single_send)(message, admission.wait)
+            return await _single_result(message, client_batch_id, buckets, mode="single_async")
+        await asyncio.sleep(admission.wait)
+
+    result = await AsyncJasminHttpClient(base_url=connection.http_api_url).send(
+        username=jasmin_user.username,
+        password=jasmin_user.password,
+        to=message.to_addr,
+        content=message.content,
+        from_addr=message.from_addr,
+        dlr_level=message.dlr_level,
+        priority=message.priority,
+        dlr_url=dlr_callback_url(),
+    )
+    apply_send_result(message, result, modified_by=created_by)
+    message.modified_on = timezone.now()
+    await batcher.update(message)
+
+    return await _single_result(message, client_batch_id, buckets, mode="single")
+
+
+async def _single_result(message: OutboundMessage, client_batch_id: str, buckets: list, mode: str) -> SubmitResult:
+    throttle = await sync_to_async(estimate, thread_sensitive=False)(buckets, 0) if buckets else Admission()
+    return SubmitResult(
+        batch_id=message.batch_id,
+        mode=mode,
+        message_count=1,
+        messages=[message],
+        jasmin_batch_ids=[],
+        client_batch_id=client_batch_id,
+        counts={message.status: 1},
+        throttle=throttle.as_dict(),
+    )
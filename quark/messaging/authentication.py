@@ -7,7 +7,8 @@ from __future__ import annotations
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
-from quark.workspace.models import WorkSpace, User
+from quark.messaging.token_cache import resolve_token
+from quark.workspace.models import User
 
 
 class MessagingAPITokenAuthentication(BaseAuthentication):
@@ -17,7 +18,8 @@ class MessagingAPITokenAuthentication(BaseAuthentication):
     or
       X-Joyce-Token: <token>
 
-    Resolves the workspace that owns the token. Sets request.workspace.
+    Resolves the workspace that owns the token (cached, see
+    quark.messaging.token_cache). Sets request.workspace.
     """
 
     keyword = "Bearer"
@@ -27,20 +29,13 @@ class MessagingAPITokenAuthentication(BaseAuthentication):
         if not token:
             return None
 
-        workspace = (
-            WorkSpace.objects.filter(
-                messaging_api_enabled=True,
-                messaging_api_token=token,
-            )
-            .exclude(messaging_api_token="")
-            .first()
-        )
-        if not workspace:
+        resolved = resolve_token(token)
+        workspace, user = resolved or (None, None)
+        if not workspace or not workspace.messaging_api_enabled:
             raise AuthenticationFailed("Invalid or disabled Joyce messaging API token")
 
         request.workspace = workspace
         # Synthetic user: workspace owner if available, else Anonymous-like staff proxy
-        user = workspace.created_by if workspace.created_by_id else None
         if user is None:
             raise AuthenticationFailed("Workspace has no owner for API attribution")
         # Ensure we use the User proxy when possible
@@ -0,0 +1,238 @@
+#
+#  Copyright (c) 2026
+#  Concurrent submit engine for queued bulk messages over Jasmin HTTP /send.
+#
+"""
+Pipelined bulk submit for workspaces without Jasmin REST.
+
+The connection, DLR callback URL and Jasmin credentials are resolved once per
+batch. Up to ``JOYCE_BULK_HTTP_INFLIGHT`` /send requests per Jasmin endpoint
+are in flight at a time (shared by every batch running in the process) over
+the shared keep-alive sessions (quark.messaging.http_pool), each paced by the
+Jasmin user's throughput quota (quark.messaging.throttle), and results are
+written back with ``bulk_update`` every ``JOYCE_BULK_HTTP_FLUSH_EVERY``
+messages instead of one UPDATE per row.
+
+Worker threads only do HTTP; every ORM call stays on the calling thread.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils import timezone
+
+from quark.jasmin.connection import JasminNotConfigured, resolve_jasmin_connection
+from quark.messaging.clients import JasminHttpClient
+from quark.messaging.models import OutboundMessage, dlr_callback_url
+from quark.messaging.payloads import store_payloads
+from quark.messaging.rollup import record_transitions
+from quark.messaging.throttle import buckets_for, pace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INFLIGHT = 16
+DEFAULT_FLUSH_EVERY = 200
+
+UPDATE_FIELDS = [
+    "submit_payload",
+    "submitted_at",
+    "status",
+    "jasmin_msg_id",
+    "error_message",
+    "modified_on",
+]
+
+_endpoint_windows: dict[str, threading.BoundedSemaphore] = {}
+_endpoint_windows_lock = threading.Lock()
+
+
+def inflight_window() -> int:
+    return max(1, int(getattr(settings, "JOYCE_BULK_HTTP_INFLIGHT", DEFAULT_INFLIGHT)))
+
+
+def endpoint_window(endpoint_key: str) -> threading.BoundedSemaphore:
+    """Process-wide in-flight limiter for one Jasmin HTTP endpoint."""
+    with _endpoint_windows_lock:
+        window = _endpoint_windows.get(endpoint_key)
+        if window is None:
+            window = threading.BoundedSemaphore(inflight_window())
+            _endpoint_windows[endpoint_key] = window
+        return window
+
+
+@dataclass
+class BulkSendStats:
+    batch_id: str
+    submitted: int = 0
+    failed: int = 0
+    flushes: int = 0
+    remaining: bool = False  # stopped at the slice limit with rows still queued
+
+    def as_dict(self) -> dict:
+        return {
+            "batch_id": self.batch_id,
+            "submitted": self.submitted,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "remaining": self.remaining,
+        }
+
+
+class BulkHttpSubmitter:
+    """Submits every queued message of one batch through Jasmin HTTP /send."""
+
+    def __init__(self, batch_id: str, *, inflight: int = None, flush_every: int = None, limit: int = None):
+        self.batch_id = batch_id
+        self.limit = limit
+        self.inflight = inflight or inflight_window()
+        self.flush_every = max(
+            1, int(flush_every or getattr(settings, "JOYCE_BULK_HTTP_FLUSH_EVERY", DEFAULT_FLUSH_EVERY))
+        )
+        self.stats = BulkSendStats(batch_id=batch_id)
+        self._pending: list[OutboundMessage] = []
+
+    def queued(self):
+        return (
+            OutboundMessage.objects.filter(
+                batch_id=self.batch_id,
+                status=OutboundMessage.STATUS_QUEUED,
+            )
+            .select_related("jasmin_user", "workspace")
+            .order_by("id")
+        )
+
+    def run(self) -> BulkSendStats:
+        iterator = self._pages()
+        first = next(iterator, None)
+        if first is None:
+            return self.stats
+
+        try:
+            connection = resolve_jasmin_connection(first.workspace)
+        except JasminNotConfigured as exc:
+            # Nothing in this batch can be sent: fail it rather than leave it queued
+            logger.warning("Bulk HTTP batch %s cannot be sent: %s", self.batch_id, exc)
+            try:
+                for message in self._chain(first, iterator):
+                    self._record_failure(message, str(exc))
+            finally:
+                self._flush()
+            return self.stats
+
+        client = JasminHttpClient(base_url=connection.http_api_url)
+        window = endpoint_window(connection.endpoint_key)
+        callback = dlr_callback_url()
+
+        buckets = {}
+
+        def send(message: OutboundMessage):
+            # Wait for the user's throughput slot before taking an in-flight one
+            pace(buckets[message.jasmin_user_id])
+            with window:
+                return client.send(
+                    username=message.jasmin_user.username,
+                    password=message.jasmin_user.password,
+                    to=message.to_addr,
+                    content=message.content,
+                    from_addr=message.from_addr or "",
+                    dlr_level=int(message.dlr_level),
+                    priority=int(message.priority or 0),
+                    dlr_url=callback,
+                )
+
+        in_flight = {}
+        taken = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.inflight, thread_name_prefix="bulk-http") as pool:
+                for message in self._chain(first, iterator):
+                    if self.limit and taken >= self.limit:
+                        self.stats.remaining = True
+                        break
+                    taken += 1
+                    if not message.jasmin_user_id:
+                        self._record_failure(message, "Missing Jasmin user")
+                        continue
+                    if message.jasmin_user_id not in buckets:
+                        buckets[message.jasmin_user_id] = buckets_for(message.jasmin_user, connection)
+                    in_flight[pool.submit(send, message)] = message
+                    # keep the backlog shallow so memory stays bounded by the window
+                    if len(in_flight) >= self.inflight * 2:
+                        self._collect(in_flight)
+                while in_flight:
+                    self._collect(in_flight)
+        finally:
+            self._flush()
+        return self.stats
+
+    def _pages(self):
+        """Queued rows in id order, fetched a page at a time (keyset, not a long-lived cursor)."""
+        last_id = 0
+        while True:
+            page = list(self.queued().filter(id__gt=last_id)[: self.flush_every])
+            if not page:
+                return
+            yield from page
+            last_id = page[-1].id
+
+    @staticmethod
+    def _chain(first, iterator):
+        yield first
+        yield from iterator
+
+    def _collect(self, in_flight: dict):
+        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in done:
+            message = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as exc:
+                logger.exception("Async bulk send failed for message %s", message.pk)
+                self._record_failure(message, str(exc))
+                continue
+            self._record_result(message, result)
+
+    def _record_result(self, message: OutboundMessage, result):
+        now = timezone.now()
+        message.submit_response = result.text
+        message.submitted_at = now
+        message.modified_on = now
+        if result.ok:
+            message.status = OutboundMessage.STATUS_SUBMITTED
+            message.jasmin_msg_id = result.message_id
+            message.error_message = ""
+            self.stats.submitted += 1
+        else:
+            message.status = OutboundMessage.STATUS_FAILED
+            message.error_message = result.error or result.text or "Submit failed"
+            self.stats.failed += 1
+        self._stage(message)
+
+    def _record_failure(self, message: OutboundMessage, error: str):
+        message.status = OutboundMessage.STATUS_FAILED
+        message.error_message = (error or "Submit failed")[:2000]
+        message.modified_on = timezone.now()
+        self.stats.failed += 1
+        self._stage(message)
+
+    def _stage(self, message: OutboundMessage):
+        self._pending.append(message)
+        if len(self._pending) >= self.flush_every:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        store_payloads(self._pending)
+        OutboundMessage.objects.bulk_update(self._pending, UPDATE_FIELDS, batch_size=self.flush_every)
+        record_transitions(self._pending)
+        self.stats.flushes += 1
+        self._pending = []
+
+
+def submit_queued_batch(batch_id: str, limit: int = None) -> BulkSendStats:
+    """Submit the queued messages of ``batch_id`` (at most ``limit``); returns per-run counters."""
+    return BulkHttpSubmitter(batch_id, limit=limit).run()
@@ -0,0 +1,179 @@
+#
+#  Copyright (c) 2026
+#  Buffered Jasmin sendbatch callback ingestion: ACK fast, apply in batches.
+#
+"""
+Jasmin calls ``/batch-callback`` once per recipient of a REST sendbatch.
+
+In ``sync`` mode each callback is applied inside its request: one lookup on
+the ``(jasmin_batch_id, to_addr)`` index and one UPDATE. In ``buffered`` mode
+(``JOYCE_BATCH_CALLBACK_INGEST_MODE``, which follows ``JOYCE_DLR_INGEST_MODE``
+when empty) the view only queues the payload and ACKs; ``apply_batch_callbacks``
+then takes ``JOYCE_DLR_BATCH_SIZE`` callbacks at a time, groups them by Jasmin
+batch id, resolves each group's recipients with one ``to_addr IN (...)``
+query and writes every row with one ``bulk_update``.
+
+The buffer is the same kind as the DLR one (quark.messaging.dlr_ingest): a
+Redis list at ``JOYCE_DLR_BUFFER_URL`` under its own key, or an in-process
+queue. The ``drain_dlr_buffer`` beat task drains it before the DLR buffer,
+under the same drain lock (``dlr_ingest.drain_locked``), since a DLR only
+matches a sendbatch row once the row's callback has set its
+``jasmin_msg_id``; DLRs that still match nothing are retried for a while
+(``JOYCE_DLR_UNMATCHED_RETRY_SECS``). Buffering callbacks therefore needs
+buffered DLRs: with ``JOYCE_DLR_INGEST_MODE=sync`` callbacks stay synchronous.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from quark.messaging.clients import SUCCESS_MSG_ID_RE
+from quark.messaging.dlr_ingest import MODE_BUFFERED, MODE_SYNC, LocalDLRBuffer, RedisDLRBuffer, batch_size
+from quark.messaging.dlr_ingest import ingest_mode as dlr_ingest_mode
+from quark.messaging.models import OutboundMessage
+from quark.messaging.rollup import record_transitions
+from quark.messaging.services import _normalize_msisdn
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "joyce:batch_callback:buffer"
+
+# Fields a callback changes
+CALLBACK_UPDATE_FIELDS = ["jasmin_msg_id", "status", "error_message", "submitted_at", "modified_on"]
+# What is read to apply one: the above, the lookup key and the rollup key
+CALLBACK_LOAD_FIELDS = CALLBACK_UPDATE_FIELDS + [
+    "jasmin_batch_id",
+    "to_addr",
+    "workspace_id",
+    "jasmin_user_id",
+    "batch_kind",
+    "created_on",
+]
+
+
+def ingest_mode() -> str:
+    mode = str(getattr(settings, "JOYCE_BATCH_CALLBACK_INGEST_MODE", "") or "").strip().lower()
+    mode = mode if mode in (MODE_SYNC, MODE_BUFFERED) else dlr_ingest_mode()
+    # A DLR applied inline cannot wait for its row's callback still in the buffer
+    if mode == MODE_BUFFERED and dlr_ingest_mode() != MODE_BUFFERED:
+        return MODE_SYNC
+    return mode
+
+
+def callback_key(payload: dict) -> tuple[str, str]:
+    """``(Jasmin batch id, recipient)`` of a callback; either may be empty."""
+    return str(payload.get("batchId") or "").strip(), _normalize_msisdn(payload.get("to"))
+
+
+def resolve(jasmin_batch_id: str, to_addrs: Iterable[str]) -> dict[str, OutboundMessage]:
+    """Rows of one Jasmin batch by recipient, newest first when a number repeats."""
+    messages = {}
+    for message in (
+        OutboundMessage.objects.filter(jasmin_batch_id=jasmin_batch_id, to_addr__in=set(to_addrs))
+        .only(*CALLBACK_LOAD_FIELDS)
+        .order_by("-created_on")
+    ):
+        messages.setdefault(message.to_addr, message)
+    return messages
+
+
+def apply_callback(message: OutboundMessage, payload: dict, received_at: Optional[datetime] = None):
+    """Copy one callback (status, statusText) onto ``message``; not saved."""
+    status_flag = str(payload.get("status") or "").strip()
+    status_text = str(payload.get("statusText") or "")
+
+    match = SUCCESS_MSG_ID_RE.search(status_text)
+    if match:
+        message.jasmin_msg_id = match.group(1)
+
+    if status_flag == "1" or status_flag.lower() in ("success", "true"):
+        message.status = OutboundMessage.STATUS_SUBMITTED
+        message.error_message = ""
+    else:
+        message.status = OutboundMessage.STATUS_FAILED
+        message.error_message = status_text[:2000] or "Batch send failed"
+
+    # The row keeps its chunk's sendbatch response; a failure's text is in error_message
+    now = timezone.now()
+    if not message.submitted_at:
+        message.submitted_at = received_at or now
+    message.modified_on = now
+
+
+def apply_batch_callbacks(
+    entries: Iterable[tuple[dict, Optional[datetime]]], unmatched: Optional[list] = None
+) -> dict:
+    """
+    Apply many callbacks at once: ``entries`` is ``(payload, received_at)`` pairs.
+
+    One lookup per Jasmin batch id among them and one ``bulk_update`` for all;
+    callbacks for the same row are applied in arrival order. Entries with no
+    matching row (the chunk's sendbatch response may not be recorded yet) are
+    appended to ``unmatched`` when given.
+    """
+    groups: dict[str, list] = {}
+    received = 0
+    for payload, received_at in entries:
+        jbid, to_addr = callback_key(payload)
+        if jbid and to_addr:
+            groups.setdefault(jbid, []).append((to_addr, payload, received_at))
+            received += 1
+    stats = {"received": received, "applied": 0, "unmatched": 0}
+
+    touched: dict[int, OutboundMessage] = {}
+    for jbid, items in groups.items():
+        messages = resolve(jbid, (to_addr for to_addr, _, _ in items))
+        for to_addr, payload, received_at in items:
+            message = messages.get(to_addr)
+            if message is None:
+                stats["unmatched"] += 1
+                if unmatched is not None:
+                    unmatched.append((payload, received_at))
+                continue
+            apply_callback(message, payload, received_at)
+            touched[message.pk] = message
+            stats["applied"] += 1
+
+    if touched:
+        OutboundMessage.objects.bulk_update(list(touched.values()), CALLBACK_UPDATE_FIELDS, batch_size=batch_size())
+        record_transitions(touched.values())
+    return stats
+
+
+class RedisCallbackBuffer(RedisDLRBuffer):
+    key = REDIS_KEY
+    apply = staticmethod(apply_batch_callbacks)
+
+
+class LocalCallbackBuffer(LocalDLRBuffer):
+    apply = staticmethod(apply_batch_callbacks)
+    thread_name = "batch-callback-drain"
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                url = (getattr(settings, "JOYCE_DLR_BUFFER_URL", "") or "").strip()
+                _buffer = RedisCallbackBuffer(url) if url else LocalCallbackBuffer()
+    return _buffer
+
+
+def buffer_callback(payload: dict) -> bool:
+    """Queue one callback; False when the buffer is unavailable (caller applies inline)."""
+    try:
+        get_buffer().push(payload)
+        return True
+    except Exception as e:
+        logger.warning("Batch callback buffer unavailable, applying inline: %s", e)
+        return False
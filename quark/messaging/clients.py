@@ -13,6 +13,8 @@ from urllib.parse import urljoin
 import requests
 from django.conf import settings
 
+from quark.messaging.http_pool import get_session
+
 logger = logging.getLogger(__name__)
 
 SUCCESS_MSG_ID_RE = re.compile(r'Success\s+"?([^"\s]+)"?', re.IGNORECASE)
@@ -28,17 +30,77 @@ class JasminHttpResult:
     data: Optional[dict] = None
 
 
+def send_payload(
+    *,
+    username: str,
+    password: str,
+    to: str,
+    content: str,
+    from_addr: str = "",
+    coding: int = 0,
+    priority: int = 0,
+    dlr: str = "yes",
+    dlr_level: int = 3,
+    dlr_url: str = "",
+    dlr_method: str = "POST",
+) -> dict:
+    """Form fields of an HTTP API /send call."""
+    payload = {
+        "username": username,
+        "password": password,
+        "to": to,
+        "content": content,
+        "coding": coding,
+        "priority": priority,
+        "dlr": dlr,
+        "dlr-level": dlr_level,
+        "dlr-method": dlr_method,
+    }
+    if from_addr:
+        payload["from"] = from_addr
+    if dlr_url:
+        payload["dlr-url"] = dlr_url
+    return payload
+
+
+def parse_post_response(status_code: int, text: str, parse_msg_id: bool = False) -> JasminHttpResult:
+    """Result of an HTTP API POST: ``Success "<msg id>"`` with a 200 is the only success."""
+    text = (text or "").strip()
+    msg_id = ""
+    if parse_msg_id:
+        match = SUCCESS_MSG_ID_RE.search(text)
+        if match:
+            msg_id = match.group(1)
+    ok = status_code == 200 and text.lower().startswith("success")
+    return JasminHttpResult(
+        ok=ok,
+        text=text,
+        message_id=msg_id,
+        status_code=status_code,
+        error="" if ok else text or f"HTTP {status_code}",
+    )
+
+
 class JasminHttpClient:
     """
     Client for Jasmin HTTP API endpoints:
       POST /send
       GET  /balance
       GET  /rate
+
+    Calls go over the shared keep-alive session for ``base_url`` (see
+    quark.messaging.http_pool) unless a ``session`` is passed in.
     """
 
-    def __init__(self, base_url: Optional[str] = None, timeout: Optional[float] = None):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+    ):
         self.base_url = (base_url or settings.JASMIN_HTTP_API_URL).rstrip("/") + "/"
         self.timeout = timeout if timeout is not None else getattr(settings, "JASMIN_HTTP_API_TIMEOUT", 15)
+        self.http = session or get_session(self.base_url)
 
     def _url(self, path: str) -> str:
         return urljoin(self.base_url, path.lstrip("/"))
@@ -58,22 +120,19 @@ class JasminHttpClient:
         dlr_url: str = "",
         dlr_method: str = "POST",
     ) -> JasminHttpResult:
-        payload = {
-            "username": username,
-            "password": password,
-            "to": to,
-            "content": content,
-            "coding": coding,
-            "priority": priority,
-            "dlr": dlr,
-            "dlr-level": dlr_level,
-            "dlr-method": dlr_method,
-        }
-        if from_addr:
-            payload["from"] = from_addr
-        if dlr_url:
-            payload["dlr-url"] = dlr_url
-
+        payload = send_payload(
+            username=username,
+            password=password,
+            to=to,
+            content=content,
+            from_addr=from_addr,
+            coding=coding,
+            priority=priority,
+            dlr=dlr,
+            dlr_level=dlr_level,
+            dlr_url=dlr_url,
+            dlr_method=dlr_method,
+        )
         return self._post("send", payload, parse_msg_id=True)
 
     def balance(self, *, username: str, password: str) -> JasminHttpResult:
@@ -88,21 +147,8 @@ class JasminHttpClient:
     def _post(self, path: str, data: dict, parse_msg_id: bool = False) -> JasminHttpResult:
         url = self._url(path)
         try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            text = (response.text or "").strip()
-            msg_id = ""
-            if parse_msg_id:
-                match = SUCCESS_MSG_ID_RE.search(text)
-                if match:
-                    msg_id = match.group(1)
-            ok = response.status_code == 200 and text.lower().startswith("success")
-            return JasminHttpResult(
-                ok=ok,
-                text=text,
-                message_id=msg_id,
-                status_code=response.status_code,
-                error="" if ok else text or f"HTTP {response.status_code}",
-            )
+            response = self.http.post(url, data=data, timeout=self.timeout)
+            return parse_post_response(response.status_code, response.text, parse_msg_id=parse_msg_id)
         except requests.RequestException as exc:
             logger.exception("Jasmin HTTP /%s failed", path)
             return JasminHttpResult(ok=False, text="", error=str(exc), status_code=0)
@@ -110,7 +156,7 @@ class JasminHttpClient:
     def _get(self, path: str, params: dict) -> JasminHttpResult:
         url = self._url(path)
         try:
-            response = requests.get(url, params=params, timeout=self.timeout)
+            response = self.http.get(url, params=params, timeout=self.timeout)
             text = (response.text or "").strip()
             ok = response.status_code == 200
             return JasminHttpResult(
@@ -129,11 +175,19 @@ class JasminRestClient:
     Client for Jasmin RESTful API (Basic Auth):
       POST /secure/send
       POST /secure/sendbatch
+
+    Shares the keep-alive session pool with JasminHttpClient.
     """
 
-    def __init__(self, base_url: str, timeout: Optional[float] = None):
+    def __init__(
+        self,
+        base_url: str,
+        timeout: Optional[float] = None,
+        session: Optional[requests.Session] = None,
+    ):
         self.base_url = (base_url or "").rstrip("/") + "/"
         self.timeout = timeout if timeout is not None else getattr(settings, "JASMIN_HTTP_API_TIMEOUT", 30)
+        self.http = session or get_session(self.base_url)
 
     def _url(self, path: str) -> str:
         return urljoin(self.base_url, path.lstrip("/"))
@@ -184,7 +238,7 @@ class JasminRestClient:
     def ping(self) -> JasminHttpResult:
         url = self._url("ping")
         try:
-            response = requests.get(url, timeout=self.timeout)
+            response = self.http.get(url, timeout=self.timeout)
             text = (response.text or "").strip()
             ok = response.status_code == 200
             return JasminHttpResult(ok=ok, text=text, status_code=response.status_code)
@@ -201,7 +255,7 @@ class JasminRestClient:
     ) -> JasminHttpResult:
         url = self._url(path)
         try:
-            response = requests.post(
+            response = self.http.post(
                 url,
                 json=body,
                 auth=(username, password),
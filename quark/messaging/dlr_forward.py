@@ -0,0 +1,244 @@
+#
+#  Copyright (c) 2026
+#  Batched forwarding of DLRs to workspace external channel URLs.
+#
+"""
+External DLR forwarder.
+
+Applying a DLR marks the row ``external_dlr_pending`` when its workspace has an
+external DLR URL (``OutboundMessage.queue_external_dlr_forward``). The
+``forward_pending_dlrs`` beat task queues one ``forward_workspace_dlrs`` task
+per workspace with due rows, so a slow receiver only delays its own
+workspace. Each run sends over one keep-alive session per receiver
+(quark.messaging.http_pool):
+
+* one request per DLR (POST JSON body or GET query string, as before), or
+* with ``WorkSpace.external_dlr_batch`` (POST only), one JSON array per
+  ``JOYCE_EXTERNAL_DLR_BATCH_SIZE`` DLRs.
+
+Forwarded rows are marked with one UPDATE per batch. Failed rows are retried
+every ``external_dlr_retry_delay_secs`` until ``external_dlr_max_retries``
+attempts were made, then given up on, exactly like the old one-task-per-DLR
+forwarder.
+
+A run handles at most ``JOYCE_EXTERNAL_DLR_MAX_ROWS_PER_RUN`` rows and starts
+no request after ``JOYCE_EXTERNAL_DLR_RUN_SECS``; what is left stays due for
+the next run. A per-workspace cache lock, outliving the longest possible run
+and released only by its owner, keeps two runs from sending the same rows.
+Like every Joyce lock it needs a cache shared by all workers (JOYCE_CACHE_URL).
+"""
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from quark.messaging.http_pool import get_session
+from quark.messaging.models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_ROWS_PER_RUN = 1000
+DEFAULT_RUN_SECS = 120
+FORWARD_TIMEOUT = 15
+
+
+def batch_size() -> int:
+    return max(1, int(getattr(settings, "JOYCE_EXTERNAL_DLR_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+
+
+def max_rows_per_run() -> int:
+    return max(1, int(getattr(settings, "JOYCE_EXTERNAL_DLR_MAX_ROWS_PER_RUN", DEFAULT_MAX_ROWS_PER_RUN)))
+
+
+def run_secs() -> float:
+    return max(1.0, float(getattr(settings, "JOYCE_EXTERNAL_DLR_RUN_SECS", DEFAULT_RUN_SECS)))
+
+
+def lock_ttl() -> int:
+    # The last request may start just before the deadline and take a connect plus a read timeout
+    return int(run_secs() + 2 * FORWARD_TIMEOUT + 30)
+
+
+def _lock_key(workspace_id) -> str:
+    return f"joyce:external-dlr-forward:lock:{workspace_id}"
+
+
+def pending_forwards(*, now=None):
+    now = now or timezone.now()
+    return OutboundMessage.objects.filter(
+        external_dlr_pending=True,
+        external_dlr_next_attempt_at__lte=now,
+    )
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise requests.HTTPError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+class WorkspaceForwarder:
+    """Sends one workspace's pending DLRs; all row updates are bulk."""
+
+    def __init__(self, workspace, *, now=None):
+        self.workspace = workspace
+        self.now = now or timezone.now()
+        self.url = (workspace.external_dlr_url or "").strip()
+        self.method = (workspace.external_dlr_method or "POST").upper()
+        self.as_array = bool(workspace.external_dlr_batch) and self.method == "POST"
+        self.max_retries = int(workspace.external_dlr_max_retries or 5)
+        self.delay = int(workspace.external_dlr_retry_delay_secs or 60)
+        self.stats = {"forwarded": 0, "retrying": 0, "gave_up": 0}
+
+    def run(self, *, max_rows: Optional[int] = None, deadline: Optional[float] = None) -> dict:
+        """
+        Forward due rows batch by batch; stop after ``max_rows`` rows or once
+        ``time.monotonic()`` passes ``deadline``, leaving the rest due.
+        """
+        queryset = pending_forwards(now=self.now).filter(workspace=self.workspace)
+        if not self.url:
+            # The URL was removed since these were queued: nothing to deliver to
+            queryset.update(external_dlr_pending=False, modified_on=self.now)
+            return self.stats
+
+        # Handled rows drop out of the queryset: forwarded ones are no longer
+        # pending, failed ones are rescheduled after self.now
+        handled = 0
+        while max_rows is None or handled < max_rows:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            size = batch_size() if max_rows is None else min(batch_size(), max_rows - handled)
+            rows = list(
+                queryset.select_related("dlr_payload").order_by("external_dlr_next_attempt_at", "id")[:size]
+            )
+            if not rows:
+                break
+            sent = self.forward(rows, deadline=deadline)
+            if not sent:
+                break
+            handled += sent
+        return self.stats
+
+    def forward(self, rows: list[OutboundMessage], *, deadline: Optional[float] = None) -> int:
+        """Send ``rows``; returns how many were attempted before ``deadline``."""
+        session = get_session(self.url)
+        if self.as_array:
+            payload = [row.external_dlr_payload() for row in rows]
+            try:
+                _check(session.post(self.url, json=payload, timeout=FORWARD_TIMEOUT))
+            except Exception as exc:
+                self._failed(rows, exc)
+            else:
+                self._forwarded(rows)
+            return len(rows)
+
+        forwarded, failed, last_error = [], [], None
+        for row in rows:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            payload = row.external_dlr_payload()
+            try:
+                if self.method == "GET":
+                    response = session.get(self.url, params=payload, timeout=FORWARD_TIMEOUT)
+                else:
+                    # Prefer JSON so nested/mapping fields stay clear for external apps
+                    response = session.post(self.url, json=payload, timeout=FORWARD_TIMEOUT)
+                _check(response)
+            except Exception as exc:
+                failed.append(row)
+                last_error = exc
+            else:
+                forwarded.append(row)
+        self._forwarded(forwarded)
+        if failed:
+            self._failed(failed, last_error)
+        return len(forwarded) + len(failed)
+
+    def _batch(self, rows):
+        # A DLR applied meanwhile re-queues its row with a later attempt time;
+        # leave that one pending so the newer status is forwarded too
+        return OutboundMessage.objects.filter(
+            pk__in=[row.pk for row in rows],
+            external_dlr_pending=True,
+            external_dlr_next_attempt_at__lte=self.now,
+        )
+
+    def _forwarded(self, rows):
+        if not rows:
+            return
+        self._batch(rows).update(
+            external_dlr_pending=False,
+            external_dlr_forwarded_at=timezone.now(),
+            modified_on=timezone.now(),
+        )
+        self.stats["forwarded"] += len(rows)
+
+    def _failed(self, rows, exc):
+        # Attempts count from 1, so a row gives up after max_retries sends
+        give_up = {row.pk for row in rows if row.external_dlr_attempts + 1 >= self.max_retries}
+        retry = {row.pk for row in rows if row.external_dlr_attempts + 1 < self.max_retries}
+        logger.warning(
+            "External DLR forward to %s failed for %s message(s): %s",
+            self.url,
+            len(rows),
+            exc,
+        )
+        if retry:
+            self._batch([row for row in rows if row.pk in retry]).update(
+                external_dlr_attempts=F("external_dlr_attempts") + 1,
+                external_dlr_next_attempt_at=self.now + timedelta(seconds=self.delay),
+            )
+            self.stats["retrying"] += len(retry)
+        if give_up:
+            self._batch([row for row in rows if row.pk in give_up]).update(
+                external_dlr_attempts=F("external_dlr_attempts") + 1,
+                external_dlr_pending=False,
+            )
+            self.stats["gave_up"] += len(give_up)
+            logger.error(
+                "External DLR forward gave up for %s message(s) of workspace %s after %s attempts",
+                len(give_up),
+                self.workspace.pk,
+                self.max_retries,
+            )
+
+
+def due_workspace_ids(*, now=None) -> list[int]:
+    """Workspaces with at least one DLR due for forwarding."""
+    return list(pending_forwards(now=now).order_by().values_list("workspace_id", flat=True).distinct())
+
+
+def is_forwarding(workspace_id) -> bool:
+    return cache.get(_lock_key(workspace_id)) is not None
+
+
+def forward_workspace(workspace_id, *, now=None) -> Optional[dict]:
+    """
+    Forward one workspace's due DLRs, bounded by the per-run row cap and time
+    budget; None when another run holds the workspace's lock.
+    """
+    from quark.workspace.models import WorkSpace
+
+    key, token = _lock_key(workspace_id), uuid.uuid4().hex
+    # Overlapping runs would send the same rows twice
+    if not cache.add(key, token, lock_ttl()):
+        return None
+    try:
+        workspace = WorkSpace.objects.filter(pk=workspace_id).first()
+        if workspace is None:
+            return {"forwarded": 0, "retrying": 0, "gave_up": 0}
+        forwarder = WorkspaceForwarder(workspace, now=now)
+        return forwarder.run(max_rows=max_rows_per_run(), deadline=time.monotonic() + run_secs())
+    finally:
+        # An expired lock may belong to a newer run by now: only release our own
+        if cache.get(key) == token:
+            cache.delete(key)
@@ -0,0 +1,314 @@
+#
+#  Copyright (c) 2026
+#  Buffered Jasmin DLR ingestion: ACK fast, apply in batches.
+#
+"""
+DLR ingestion modes (``JOYCE_DLR_INGEST_MODE``):
+
+``sync``
+    The /dlr view looks the message up and applies the DLR inline (default).
+``buffered``
+    The view only extracts the message id, appends the payload to a buffer
+    and ACKs. Buffered DLRs are applied ``JOYCE_DLR_BATCH_SIZE`` at a time by
+    ``apply_dlr_batch``: one ``jasmin_msg_id IN (...)`` lookup and one
+    ``bulk_update`` per batch.
+
+The buffer is a Redis list at ``JOYCE_DLR_BUFFER_URL`` (drained by the
+``drain_dlr_buffer`` Celery beat task), or, when that is empty, a queue in
+the web process drained by a background thread. If the buffer cannot be
+reached the DLR is applied inline so nothing is dropped.
+
+Beat ticks every ``JOYCE_DLR_DRAIN_INTERVAL_SECS``, more often than a busy
+drain lasts, so ``drain_locked`` holds a cache lock for the whole run and a
+tick that finds it taken is skipped: two overlapping drains would each apply
+their DLRs in memory and ``bulk_update`` the same rows, the later commit
+winning whatever the DLR order (a DELIVRD overwritten by an older ENROUTE),
+and count the same transition twice in the rollup. Workers only share the
+lock through a shared cache (``JOYCE_CACHE_URL``).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from quark.messaging.models import OutboundMessage
+from quark.messaging.payloads import store_payloads
+from quark.messaging.rollup import record_transitions
+
+logger = logging.getLogger(__name__)
+
+MODE_SYNC = "sync"
+MODE_BUFFERED = "buffered"
+
+REDIS_KEY = "joyce:dlr:buffer"
+DRAIN_LOCK_KEY = "joyce:dlr:drain:lock"
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_UNMATCHED_RETRY_SECS = 600
+DEFAULT_DRAIN_LOCK_SECS = 300
+
+
+def ingest_mode() -> str:
+    mode = str(getattr(settings, "JOYCE_DLR_INGEST_MODE", MODE_SYNC) or MODE_SYNC).strip().lower()
+    return mode if mode in (MODE_SYNC, MODE_BUFFERED) else MODE_SYNC
+
+
+def batch_size() -> int:
+    return max(1, int(getattr(settings, "JOYCE_DLR_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+
+
+def unmatched_retry_secs() -> float:
+    return float(getattr(settings, "JOYCE_DLR_UNMATCHED_RETRY_SECS", DEFAULT_UNMATCHED_RETRY_SECS))
+
+
+def drain_lock_secs() -> int:
+    return max(10, int(getattr(settings, "JOYCE_DLR_DRAIN_LOCK_SECS", DEFAULT_DRAIN_LOCK_SECS)))
+
+
+def dlr_message_id(payload: dict) -> str:
+    msg_id = payload.get("id") or payload.get("message_id") or payload.get("msgid") or ""
+    return str(msg_id).strip()
+
+
+def apply_dlr_batch(entries: Iterable[tuple[dict, Optional[datetime]]], unmatched: Optional[list] = None) -> dict:
+    """
+    Apply many DLRs at once: ``entries`` is ``(payload, received_at)`` pairs.
+
+    Several DLRs for one message are applied in arrival order, so the row ends
+    up exactly as if they had been applied one by one. Entries with no
+    matching row are appended to ``unmatched`` when given.
+    """
+    entries = [(payload, received_at) for payload, received_at in entries if dlr_message_id(payload)]
+    stats = {"received": len(entries), "applied": 0, "unmatched": 0}
+    if not entries:
+        return stats
+
+    ids = {dlr_message_id(payload) for payload, _ in entries}
+    by_msg_id: dict[str, OutboundMessage] = {}
+    # Newest row wins when a Jasmin id was ever reused, as in the inline path
+    for message in (
+        OutboundMessage.objects.filter(jasmin_msg_id__in=ids)
+        .select_related("workspace")
+        .order_by("-created_on")
+    ):
+        by_msg_id.setdefault(message.jasmin_msg_id, message)
+
+    touched: dict[int, OutboundMessage] = {}
+    for payload, received_at in entries:
+        message = by_msg_id.get(dlr_message_id(payload))
+        if message is None:
+            stats["unmatched"] += 1
+            if unmatched is not None:
+                unmatched.append((payload, received_at))
+            continue
+        message.apply_dlr(payload, received_at=received_at, save=False)
+        touched[message.pk] = message
+        stats["applied"] += 1
+
+    if touched:
+        store_payloads(touched.values())
+        OutboundMessage.objects.bulk_update(
+            list(touched.values()), OutboundMessage.DLR_UPDATE_FIELDS, batch_size=batch_size()
+        )
+        record_transitions(touched.values())
+    return stats
+
+
+def _encode(payload: dict, received_at: float) -> str:
+    return json.dumps({"p": payload, "t": received_at}, default=str)
+
+
+def _timestamp(received_at: Optional[datetime]) -> float:
+    return received_at.timestamp() if received_at else time.time()
+
+
+def _decode(raw) -> tuple[dict, Optional[datetime]]:
+    item = json.loads(raw)
+    received = item.get("t")
+    return item.get("p") or {}, datetime.fromtimestamp(received, tz=dt_timezone.utc) if received else None
+
+
+class RedisDLRBuffer:
+    """Redis list shared by every web worker; drained by the Celery beat task."""
+
+    key = REDIS_KEY
+    apply = staticmethod(apply_dlr_batch)
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        # One client per process: never reuse sockets inherited across fork
+        if self._client is None or self._pid != os.getpid():
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+            self._pid = os.getpid()
+        return self._client
+
+    def push(self, payload: dict):
+        self.client.rpush(self.key, _encode(payload, time.time()))
+
+    def pop_batch(self, size: int) -> list:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(self.key, 0, size - 1)
+        pipe.ltrim(self.key, size, -1)
+        items, _ = pipe.execute()
+        return [_decode(raw) for raw in items]
+
+    def requeue(self, batch: list):
+        if batch:
+            encoded = [_encode(payload, _timestamp(received_at)) for payload, received_at in reversed(batch)]
+            self.client.lpush(self.key, *encoded)
+
+    def depth(self) -> int:
+        return int(self.client.llen(self.key))
+
+
+class LocalDLRBuffer:
+    """In-process queue drained by a daemon thread (single-node setups)."""
+
+    apply = staticmethod(apply_dlr_batch)
+    thread_name = "dlr-drain"
+
+    def __init__(self):
+        self._items: deque = deque()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def push(self, payload: dict):
+        self._items.append(_encode(payload, time.time()))
+        self._ensure_drainer()
+        if len(self._items) >= batch_size():
+            self._wakeup.set()
+
+    def pop_batch(self, size: int) -> list:
+        batch = []
+        while self._items and len(batch) < size:
+            batch.append(_decode(self._items.popleft()))
+        return batch
+
+    def requeue(self, batch: list):
+        for payload, received_at in reversed(batch):
+            self._items.appendleft(_encode(payload, _timestamp(received_at)))
+
+    def depth(self) -> int:
+        return len(self._items)
+
+    def _ensure_drainer(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        interval = float(getattr(settings, "JOYCE_DLR_DRAIN_INTERVAL_SECS", 1.0))
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                # Shares the drain lock with the other buffer's thread
+                drain_locked([(self.thread_name, self)])
+            except Exception:
+                logger.exception("Local %s failed", self.thread_name)
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                url = (getattr(settings, "JOYCE_DLR_BUFFER_URL", "") or "").strip()
+                _buffer = RedisDLRBuffer(url) if url else LocalDLRBuffer()
+    return _buffer
+
+
+def buffer_dlr(payload: dict) -> bool:
+    """Queue one DLR; False when the buffer is unavailable (caller applies inline)."""
+    try:
+        get_buffer().push(payload)
+        return True
+    except Exception as e:
+        logger.warning("DLR buffer unavailable, applying inline: %s", e)
+        return False
+
+
+def drain(buffer=None, *, max_batches: Optional[int] = None, deadline: Optional[float] = None) -> dict:
+    """
+    Apply buffered entries (DLRs unless the buffer says otherwise) batch by batch until it is empty.
+
+    Entries that match no row yet, such as a DLR for a sendbatch row whose
+    callback has not been applied, are put back for the next run until they
+    are ``JOYCE_DLR_UNMATCHED_RETRY_SECS`` old; only then are they dropped.
+    Stops early once ``time.monotonic()`` passes ``deadline``.
+    """
+    buffer = buffer or get_buffer()
+    size = batch_size()
+    totals = {"received": 0, "applied": 0, "unmatched": 0, "requeued": 0, "batches": 0}
+    oldest = time.time() - unmatched_retry_secs()
+    retry = []
+    try:
+        while max_batches is None or totals["batches"] < max_batches:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            batch = buffer.pop_batch(size)
+            if not batch:
+                break
+            unmatched = []
+            try:
+                stats = buffer.apply(batch, unmatched=unmatched)
+            except Exception:
+                # Put the batch back so a database hiccup does not lose receipts
+                buffer.requeue(batch)
+                raise
+            totals["batches"] += 1
+            for key in ("received", "applied", "unmatched"):
+                totals[key] += stats[key]
+            retry.extend(entry for entry in unmatched if _timestamp(entry[1]) >= oldest)
+    finally:
+        # After the loop, so this run does not pick them up again
+        buffer.requeue(retry)
+        totals["requeued"] = len(retry)
+    return totals
+
+
+def drain_locked(buffers: Iterable[tuple[str, object]]) -> Optional[dict]:
+    """
+    Drain each ``(kind, buffer)`` pair in order under the drain lock; returns
+    ``kind -> drain() totals``, or None when another drain holds the lock.
+
+    A run stops after half the lock's lifetime so it never outlives the lock;
+    whatever is left waits for the next tick.
+    """
+    ttl = drain_lock_secs()
+    token = uuid.uuid4().hex
+    if not cache.add(DRAIN_LOCK_KEY, token, ttl):
+        return None
+    try:
+        deadline = time.monotonic() + ttl / 2
+        return {kind: drain(buffer, deadline=deadline) for kind, buffer in buffers}
+    finally:
+        # An expired lock may belong to a newer run by now: only release our own
+        if cache.get(DRAIN_LOCK_KEY) == token:
+            cache.delete(DRAIN_LOCK_KEY)
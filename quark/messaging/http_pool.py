@@ -0,0 +1,135 @@
+#
+#  Copyright (c) 2026
+#  Process-wide keep-alive requests.Session per Jasmin HTTP / REST base URL.
+#
+"""
+Shared HTTP sessions for the Jasmin HTTP API (/send, /balance, /rate) and
+RESTful API (/secure/send, /secure/sendbatch).
+
+One ``requests.Session`` per scheme+host+port, each with an ``HTTPAdapter``
+holding up to ``JOYCE_HTTP_POOL_MAXSIZE`` keep-alive connections (never less
+than ``JOYCE_BULK_HTTP_INFLIGHT`` so pipelined bulk sends do not overflow it).
+Connect errors are retried ``JOYCE_HTTP_CONNECT_RETRIES`` times with
+``JOYCE_HTTP_RETRY_BACKOFF`` exponential backoff; nothing that may have
+reached Jasmin is retried, so a /send is never submitted twice.
+
+Sessions are dropped in a forked child (gunicorn / celery prefork), so workers
+never share sockets inherited from the parent.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_CONNECT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.2
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def _origin(base_url: str) -> str:
+    parts = urlsplit(base_url or "")
+    return f"{parts.scheme or 'http'}://{parts.netloc}".lower()
+
+
+def pool_maxsize() -> int:
+    size = int(getattr(settings, "JOYCE_HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE))
+    inflight = int(getattr(settings, "JOYCE_BULK_HTTP_INFLIGHT", 0))
+    return max(1, size, inflight)
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=None,
+        connect=int(getattr(settings, "JOYCE_HTTP_CONNECT_RETRIES", DEFAULT_CONNECT_RETRIES)),
+        read=0,
+        status=0,
+        other=0,
+        redirect=0,
+        backoff_factor=float(getattr(settings, "JOYCE_HTTP_RETRY_BACKOFF", DEFAULT_RETRY_BACKOFF)),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize(), max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _reset_after_fork():
+    global _sessions, _sessions_pid, _lock
+    # The parent's sockets are not ours: forget them without closing
+    _sessions = {}
+    _sessions_pid = os.getpid()
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_session(base_url: str) -> requests.Session:
+    """Shared keep-alive session for the origin of ``base_url``."""
+    if _sessions_pid != os.getpid():
+        _reset_after_fork()
+    key = _origin(base_url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session()
+            _sessions[key] = session
+        return session
+
+
+def close_sessions():
+    """Close every shared session (pooled sockets included)."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def http_pool_stats() -> dict:
+    """
+    Per-origin request and connection counts for the running process.
+
+    ``reuse_ratio`` is the share of requests served on an already-open
+    connection (1 - connections opened / requests sent).
+    """
+    origins = {}
+    total_requests = total_connections = 0
+    for origin, session in list(_sessions.items()):
+        requests_sent = connections = 0
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                connections += pool.num_connections
+        origins[origin] = {"requests": requests_sent, "connections": connections}
+        total_requests += requests_sent
+        total_connections += connections
+    return {
+        "requests": total_requests,
+        "connections": total_connections,
+        "reuse_ratio": 1 - total_connections / total_requests if total_requests else 0.0,
+        "origins": origins,
+    }
@@ -0,0 +1,128 @@
+#
+#  Copyright (c) 2026
+#  Priority lanes for Celery submit work.
+#
+"""
+Priority-lane dispatch of queued sends.
+
+Each message priority (0-3, as passed to Jasmin) has its own Celery queue,
+``joyce.p3`` (most urgent) down to ``joyce.p0``. Workers consume every lane
+after the default queue (see quark/celery.py), and with the Redis broker they
+always take from the most urgent non-empty lane first.
+
+A batch is submitted ``JOYCE_DISPATCH_SLICE_SIZE`` messages per task run;
+when rows are left the task re-queues itself at the back of its lane, so a
+100k broadcast on p0 yields the worker to an OTP burst on p3 between slices
+instead of holding it until the last message.
+
+Every task run records how long it waited in its lane (Django cache, shared
+when JOYCE_CACHE_URL is set); ``lane_metrics`` adds the queued message depth
+and oldest queued message per lane (``manage.py lane_stats``).
+"""
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from quark.messaging.models import OutboundMessage
+
+LANE_PRIORITIES = (3, 2, 1, 0)
+DEFAULT_SLICE_SIZE = 2000
+
+
+def lane_queue(priority) -> str:
+    """Celery queue of a message priority (out-of-range values are clamped)."""
+    try:
+        priority = int(priority or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    return f"joyce.p{min(max(priority, 0), 3)}"
+
+
+def lane_queues() -> list[str]:
+    """Every lane queue, most urgent first."""
+    return [lane_queue(priority) for priority in LANE_PRIORITIES]
+
+
+def slice_size() -> int:
+    return max(1, int(getattr(settings, "JOYCE_DISPATCH_SLICE_SIZE", DEFAULT_SLICE_SIZE)))
+
+
+def dispatch(task, batch_id: str, priority, countdown: Optional[float] = None):
+    """Queue ``task(batch_id)`` on the lane of ``priority``."""
+    # enqueued_at is when the task became runnable, so a countdown is not counted as lane wait
+    task.apply_async(
+        (batch_id,),
+        {"priority": priority, "enqueued_at": time.time() + (countdown or 0)},
+        queue=lane_queue(priority),
+        countdown=countdown,
+    )
+
+
+def has_queued(batch_id: str) -> bool:
+    return OutboundMessage.objects.filter(batch_id=batch_id, status=OutboundMessage.STATUS_QUEUED).exists()
+
+
+def _metric_key(queue: str, name: str) -> str:
+    return f"joyce:lane:{queue}:{name}"
+
+
+def record_wait(priority, enqueued_at: Optional[float]):
+    """Count a task run of ``priority``'s lane and the time it sat in the queue."""
+    if enqueued_at is None:
+        return
+    queue = lane_queue(priority)
+    wait_ms = max(0, int((time.time() - enqueued_at) * 1000))
+    for name, value in (("runs", 1), ("wait_ms", wait_ms)):
+        key = _metric_key(queue, name)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(key, value, timeout=None)
+    max_key = _metric_key(queue, "max_wait_ms")
+    if wait_ms > (cache.get(max_key) or 0):
+        cache.set(max_key, wait_ms, timeout=None)
+
+
+def reset_metrics():
+    cache.delete_many([_metric_key(q, n) for q in lane_queues() for n in ("runs", "wait_ms", "max_wait_ms")])
+
+
+def lane_metrics() -> list[dict]:
+    """Per lane: queued messages, age of the oldest one, task runs and their queue wait."""
+    queued = {
+        row["priority"]: row
+        for row in OutboundMessage.objects.filter(status=OutboundMessage.STATUS_QUEUED)
+        .values("priority")
+        .annotate(depth=Count("id"), oldest=Min("created_on"))
+        .order_by()
+    }
+    now = timezone.now()
+    lanes = []
+    for priority in LANE_PRIORITIES:
+        queue = lane_queue(priority)
+        # Out-of-range priorities share the nearest lane
+        rows = [row for p, row in queued.items() if lane_queue(p) == queue]
+        oldest = min((row["oldest"] for row in rows), default=None)
+        found = cache.get_many([_metric_key(queue, n) for n in ("runs", "wait_ms", "max_wait_ms")])
+        runs = found.get(_metric_key(queue, "runs")) or 0
+        total_wait = found.get(_metric_key(queue, "wait_ms")) or 0
+        lanes.append(
+            {
+                "queue": queue,
+                "priority": priority,
+                "queued_messages": sum(row["depth"] for row in rows),
+                "oldest_queued_secs": round((now - oldest).total_seconds(), 1) if oldest else None,
+                "task_runs": runs,
+                "avg_wait_secs": round(total_wait / runs / 1000, 3) if runs else None,
+                "max_wait_secs": round((found.get(_metric_key(queue, "max_wait_ms")) or 0) / 1000, 3),
+            }
+        )
+    return lanes
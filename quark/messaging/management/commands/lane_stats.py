@@ -0,0 +1,38 @@
+#
+#  Copyright (c) 2026
+#  Priority lane depth and wait times for queued sends.
+#
+import json
+
+from django.core.management.base import BaseCommand
+
+from quark.messaging.lanes import lane_metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Show per priority lane: queued messages, age of the oldest one, and how long "
+        "submit tasks waited in the lane before a worker took them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print the metrics as JSON")
+        parser.add_argument("--reset", action="store_true", help="Reset the task wait counters afterwards")
+
+    def handle(self, *args, **options):
+        lanes = lane_metrics()
+        if options["json"]:
+            self.stdout.write(json.dumps(lanes, indent=2))
+        else:
+            for lane in lanes:
+                self.stdout.write(
+                    "{queue}: {queued_messages} queued (oldest {oldest}), {task_runs} run(s), "
+                    "wait avg {avg} / max {max_wait_secs}s".format(
+                        oldest=f"{lane['oldest_queued_secs']}s" if lane["oldest_queued_secs"] is not None else "-",
+                        avg=f"{lane['avg_wait_secs']}s" if lane["avg_wait_secs"] is not None else "-",
+                        **lane,
+                    )
+                )
+        if options["reset"]:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Lane wait counters reset"))
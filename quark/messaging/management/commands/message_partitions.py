@@ -0,0 +1,63 @@
+#
+#  Copyright (c) 2026
+#  Monthly partitions of the message table and retention archival.
+#
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quark.messaging.partitions import (
+    PartitioningUnavailable,
+    archive_expired,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    partition_message_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage the monthly partitions of the outbound message table (PostgreSQL) and archive "
+        "messages past each workspace's retention. Without options, list the partitions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Partition the message table by month (once; locks the table while it runs)",
+        )
+        parser.add_argument("--ensure", action="store_true", help="Create partitions for the coming months")
+        parser.add_argument("--months-ahead", type=int, default=None, help="Months to create ahead (--ensure)")
+        parser.add_argument("--archive", action="store_true", help="Archive and remove expired messages")
+        parser.add_argument("--dry-run", action="store_true", help="With --archive, only report what would go")
+
+    def handle(self, *args, **options):
+        if options["convert"]:
+            try:
+                converted = partition_message_table()
+            except PartitioningUnavailable as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(
+                self.style.SUCCESS("Message table partitioned by month")
+                if converted
+                else "Message table is already partitioned"
+            )
+        if options["ensure"]:
+            for name in ensure_partitions(months_ahead=options["months_ahead"]):
+                self.stdout.write(f"Created {name}")
+        if options["archive"]:
+            report = archive_expired(dry_run=options["dry_run"])
+            self.stdout.write(json.dumps(report, indent=2) if report else "Nothing to archive")
+        if not (options["convert"] or options["ensure"] or options["archive"]):
+            if not is_partitioned():
+                self.stdout.write("Message table is not partitioned (run with --convert on PostgreSQL)")
+                return
+            for partition in list_partitions():
+                bounds = (
+                    "DEFAULT"
+                    if partition.is_default
+                    else f"{partition.start or 'MINVALUE'} .. {partition.end or 'MAXVALUE'}"
+                )
+                self.stdout.write(f"{partition.name}: {bounds}")
@@ -0,0 +1,37 @@
+#
+#  Copyright (c) 2026
+#  Backfill / repair of the Operate dashboard message rollup.
+#
+from django.core.management.base import BaseCommand, CommandError
+
+from quark.messaging.rollup import rebuild
+from quark.workspace.models import WorkSpace
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute MessageStatRollup from the outbound message log. Run once after "
+        "deploying the rollup, and after changing a workspace timezone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workspace",
+            action="append",
+            type=int,
+            dest="workspaces",
+            help="Workspace id to rebuild (repeatable); all workspaces by default",
+        )
+
+    def handle(self, *args, **options):
+        workspaces = WorkSpace.objects.order_by("id")
+        if options["workspaces"]:
+            workspaces = workspaces.filter(pk__in=options["workspaces"])
+            missing = set(options["workspaces"]) - set(workspaces.values_list("id", flat=True))
+            if missing:
+                raise CommandError(f"Unknown workspace id(s): {', '.join(map(str, sorted(missing)))}")
+
+        for workspace in workspaces:
+            rows = rebuild(workspace)
+            self.stdout.write(f"{workspace.name} (#{workspace.pk}): {rows} rollup row(s)")
+        self.stdout.write(self.style.SUCCESS("Message rollup rebuilt"))
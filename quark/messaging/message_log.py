@@ -0,0 +1,305 @@
+#
+#  Copyright (c) 2026
+#  Filters, cursor pagination and cheap counts for the outbound message log.
+#
+"""
+Message log filtering and paging without OFFSET or COUNT(*).
+
+The destination filter never needs a ``%…%`` scan for the usual searches:
+``to_addr_lookup`` turns the term into an index prefix lookup on ``to_addr``
+(starts with) or on ``to_addr_reversed`` (ends with). A bare number that ends
+no destination, typically the start of one typed the way searches used to
+work, falls back to "contains" (``filter_to_addr``).
+
+Pages are keyset ranges on ``(created_on, id)``: the cursor is the last row
+of the page, and the next page starts strictly after it. With the workspace
+filter that is a range scan of the ``(workspace, -created_on)`` index however
+deep the page is.
+
+Counts are cheap by default (``count_messages``):
+
+* ``rollup``   - filters the dashboard rollup can answer (Jasmin user,
+  status, day range) are summed from ``MessageStatRollup``;
+* ``estimate`` - other filters on PostgreSQL use the planner's row estimate;
+* ``at_least`` - elsewhere, rows are counted up to ``JOYCE_LOG_COUNT_CAP``;
+* ``exact``    - ``COUNT(*)``, only when the caller opts in.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from quark.messaging.models import MessageStatRollup
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+DEFAULT_COUNT_CAP = 10000
+
+# Filters answered by the rollup; anything else needs the message table
+ROLLUP_PARAMS = ("jasmin_user", "status", "date_from", "date_to")
+FILTER_PARAMS = ROLLUP_PARAMS + ("to", "search")
+
+
+TO_PREFIX = "prefix"
+TO_SUFFIX = "suffix"
+TO_SUBSTRING = "substring"
+
+
+def _clean_term(term: str) -> str:
+    return "".join((term or "").split()).replace("-", "")
+
+
+def to_addr_lookup(term: str) -> tuple[Optional[Q], str]:
+    """
+    The cheapest lookup for a destination search, and its kind.
+
+    * ``1234`` / ``*1234`` - ends with: prefix scan of the ``to_addr_reversed``
+      index (a full number is its own suffix, so it is found too);
+    * ``+2567…`` / ``2567*`` - starts with: prefix scan of the ``to_addr`` index;
+    * ``*700*`` - contains: the trigram index on PostgreSQL, a scan elsewhere.
+    """
+    term = _clean_term(term)
+    digits = term.strip("*+")
+    if not digits:
+        return None, ""
+    if term.startswith("*") and term.endswith("*") and len(term) > 1:
+        # contains (not icontains): UPPER(to_addr) could not use the trigram index
+        return Q(to_addr__contains=digits), TO_SUBSTRING
+    if term.startswith("+") or term.endswith("*"):
+        return Q(to_addr__startswith=digits), TO_PREFIX
+    return Q(to_addr_reversed__startswith=digits[::-1]), TO_SUFFIX
+
+
+def filter_to_addr(qs, term: str) -> tuple:
+    """
+    ``qs`` filtered by a destination search, and the kind of match used.
+
+    A bare term (no ``*`` or ``+``) means "ends with"; when that matches
+    nothing in ``qs`` it is searched as "contains" instead, so a partial
+    number such as ``256700`` still finds its messages.
+    """
+    lookup, kind = to_addr_lookup(term)
+    if lookup is None:
+        return qs, kind
+    filtered = qs.filter(lookup)
+    term = _clean_term(term)
+    if kind == TO_SUFFIX and term.isdigit() and not filtered.exists():
+        return qs.filter(to_addr__contains=term), TO_SUBSTRING
+    return filtered, kind
+
+
+def _aware_day_start(day):
+    dt = datetime.combine(day, time.min)
+    if timezone.is_naive(dt):
+        return timezone.make_aware(dt, timezone.get_current_timezone())
+    return dt
+
+
+def outbound_message_filters(qs, params) -> tuple:
+    """Apply message-log filters from GET/POST query params; returns (queryset, destination match kind)."""
+    jasmin_user = (params.get("jasmin_user") or "").strip()
+    if jasmin_user.isdigit():
+        qs = qs.filter(jasmin_user_id=int(jasmin_user))
+
+    status_value = (params.get("status") or "").strip()
+    if status_value:
+        qs = qs.filter(status=status_value)
+
+    date_from = parse_date((params.get("date_from") or "").strip())
+    if date_from:
+        qs = qs.filter(created_on__gte=_aware_day_start(date_from))
+
+    date_to = parse_date((params.get("date_to") or "").strip())
+    if date_to:
+        qs = qs.filter(created_on__lt=_aware_day_start(date_to) + timedelta(days=1))
+
+    # Last, so a suffix search falls back on what the other filters leave
+    return filter_to_addr(qs, params.get("to") or "")
+
+
+def apply_outbound_message_filters(qs, params):
+    """Apply message-log filters from GET/POST query params."""
+    return outbound_message_filters(qs, params)[0]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message) -> str:
+    raw = f"{message.created_on.isoformat()}|{message.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        stamp, pk = raw.rsplit("|", 1)
+        created_on = parse_datetime(stamp)
+        if created_on is None:
+            raise ValueError(stamp)
+        return created_on, int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+
+@dataclass
+class CursorPage:
+    object_list: list
+    next_cursor: str = ""  # further along the ordering (older rows by default)
+    previous_cursor: str = ""  # back towards the start
+    page_size: int = DEFAULT_PAGE_SIZE
+
+    @property
+    def has_next(self) -> bool:
+        return bool(self.next_cursor)
+
+    @property
+    def has_previous(self) -> bool:
+        return bool(self.previous_cursor)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        size = int(value or default)
+    except (TypeError, ValueError):
+        size = default
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def keyset_page(qs, *, after: str = "", before: str = "", size: int = DEFAULT_PAGE_SIZE, descending: bool = True):
+    """
+    One page of ``qs`` ordered by ``(created_on, id)``.
+
+    ``after`` is the ``next_cursor`` of the previous page, ``before`` the
+    ``previous_cursor`` of the following one. Raises InvalidCursor.
+    """
+    order = ("-created_on", "-id") if descending else ("created_on", "id")
+    reverse = ("created_on", "id") if descending else ("-created_on", "-id")
+
+    def beyond(token, forward):
+        created_on, pk = decode_cursor(token)
+        # forward: rows that come after the cursor in page order
+        op = "lt" if descending == forward else "gt"
+        return Q(**{f"created_on__{op}": created_on}) | Q(created_on=created_on, **{f"id__{op}": pk})
+
+    if before:
+        rows = list(qs.filter(beyond(before, forward=False)).order_by(*reverse)[: size + 1])
+        more_before = len(rows) > size
+        rows = rows[:size][::-1]
+        return CursorPage(
+            object_list=rows,
+            next_cursor=encode_cursor(rows[-1]) if rows else before,
+            previous_cursor=encode_cursor(rows[0]) if rows and more_before else "",
+            page_size=size,
+        )
+
+    if after:
+        qs = qs.filter(beyond(after, forward=True))
+    rows = list(qs.order_by(*order)[: size + 1])
+    more_after = len(rows) > size
+    rows = rows[:size]
+    return CursorPage(
+        object_list=rows,
+        next_cursor=encode_cursor(rows[-1]) if rows and more_after else "",
+        previous_cursor=encode_cursor(rows[0]) if rows and after else "",
+        page_size=size,
+    )
+
+
+@dataclass
+class MessageCount:
+    value: int
+    kind: str  # "exact" | "rollup" | "estimate" | "at_least"
+    status_counts: dict = field(default_factory=dict)
+
+    @property
+    def is_exact(self) -> bool:
+        return self.kind in ("exact", "rollup")
+
+    def as_dict(self) -> dict:
+        return {"value": self.value, "kind": self.kind}
+
+
+def _active(params, name) -> str:
+    return (params.get(name) or "").strip()
+
+
+def _rollup_rows(workspace, params):
+    """Rollup rows matching ``params``, or None when a filter needs the message table."""
+    if any(_active(params, name) for name in FILTER_PARAMS if name not in ROLLUP_PARAMS):
+        return None
+    # Rollup days are in the workspace timezone; log date filters use the active one
+    if str(workspace.timezone) != timezone.get_current_timezone_name() and (
+        _active(params, "date_from") or _active(params, "date_to")
+    ):
+        return None
+
+    rows = MessageStatRollup.objects.filter(workspace=workspace)
+    jasmin_user = _active(params, "jasmin_user")
+    if jasmin_user.isdigit():
+        rows = rows.filter(jasmin_user_key=int(jasmin_user))
+    status = _active(params, "status")
+    if status:
+        rows = rows.filter(status=status)
+    date_from = parse_date(_active(params, "date_from"))
+    if date_from:
+        rows = rows.filter(day__gte=date_from)
+    date_to = parse_date(_active(params, "date_to"))
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+    return rows
+
+
+def _planner_estimate(qs) -> Optional[int]:
+    connection = connections[qs.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = qs.order_by().values("id").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_messages(qs, workspace, params, *, exact: bool = False) -> MessageCount:
+    """How many rows of the filtered log ``qs`` there are (see module docstring)."""
+    if exact:
+        status_counts = {
+            row["status"]: row["c"] for row in qs.order_by().values("status").annotate(c=Count("id"))
+        }
+        return MessageCount(sum(status_counts.values()), "exact", status_counts)
+
+    rollup = _rollup_rows(workspace, params)
+    if rollup is not None:
+        status_counts = {
+            row["status"]: row["c"]
+            for row in rollup.values("status").annotate(c=Sum("count")).order_by("status")
+            if row["c"]
+        }
+        return MessageCount(sum(status_counts.values()), "rollup", status_counts)
+
+    estimate = _planner_estimate(qs)
+    if estimate is not None:
+        return MessageCount(estimate, "estimate")
+
+    cap = int(getattr(settings, "JOYCE_LOG_COUNT_CAP", DEFAULT_COUNT_CAP))
+    value = qs.order_by()[: cap + 1].count()
+    return MessageCount(value, "exact" if value <= cap else "at_least")
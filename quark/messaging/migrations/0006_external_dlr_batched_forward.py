@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jasmin', '0006_route_order_unique_and_config_import'),
+        ('messaging', '0005_rename_msg_ws_client_msgid_idx_messaging_o_workspa_8c7ca6_idx_and_more'),
+        ('workspace', '0008_external_dlr_batched_forward'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='external_dlr_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='external_dlr_next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='external_dlr_pending',
+            field=models.BooleanField(default=False, help_text='A DLR is waiting to be forwarded to the workspace external DLR URL'),
+        ),
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(condition=models.Q(('external_dlr_pending', True)), fields=['workspace', 'external_dlr_next_attempt_at'], name='msg_ext_dlr_pending_idx'),
+        ),
+    ]
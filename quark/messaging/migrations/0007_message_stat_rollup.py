@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_external_dlr_batched_forward'),
+        ('workspace', '0008_external_dlr_batched_forward'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageStatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jasmin_user_key', models.PositiveIntegerField(default=0, help_text='JasminUser id, 0 when unassigned')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('submitted', 'Submitted'), ('acked', 'Acknowledged'), ('delivered', 'Delivered'), ('failed', 'Failed'), ('expired', 'Expired'), ('rejected', 'Rejected'), ('unknown', 'Unknown')], max_length=16)),
+                ('batch_kind', models.CharField(choices=[('single', 'Single'), ('bulk', 'Bulk')], max_length=16)),
+                ('count', models.IntegerField(default=0)),
+                ('workspace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_rollups', to='workspace.workspace')),
+            ],
+            options={
+                'db_table': 'messaging_message_stat_rollup',
+                'indexes': [models.Index(fields=['workspace', 'day'], name='messaging_m_workspa_cccdcc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('workspace', 'jasmin_user_key', 'day', 'status', 'batch_kind'), name='msg_rollup_key_uniq')],
+            },
+        ),
+    ]
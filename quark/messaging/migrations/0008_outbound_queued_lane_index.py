@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jasmin', '0006_route_order_unique_and_config_import'),
+        ('messaging', '0007_message_stat_rollup'),
+        ('workspace', '0009_messaging_api_token_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(condition=models.Q(('status', 'queued')), fields=['priority', 'created_on'], name='msg_queued_lane_idx'),
+        ),
+    ]
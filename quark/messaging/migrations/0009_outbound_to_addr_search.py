@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:45
+
+import quark.messaging.models
+from django.db import migrations
+
+# Not atomic: every backfill batch commits on its own and the PostgreSQL
+# indexes are built CONCURRENTLY, so the message table stays writable
+# throughout. Rows written while this runs get their reversed number from
+# the model; the backfill catches up rows up to the last id it sees.
+BACKFILL_BATCH = 5000
+TABLE = "messaging_outbound_message"
+COLUMN = "to_addr_reversed"
+
+
+def _is_partitioned(schema_editor):
+    # CONCURRENTLY is not supported on a partitioned table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def backfill_reversed(apps, schema_editor):
+    OutboundMessage = apps.get_model("messaging", "OutboundMessage")
+    if schema_editor.connection.vendor == "postgresql":
+        # One short UPDATE per id range, each in its own transaction
+        start = OutboundMessage.objects.order_by("id").values_list("id", flat=True).first()
+        while start is not None:
+            last = OutboundMessage.objects.order_by("-id").values_list("id", flat=True).first()
+            if start > last:
+                break
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {TABLE} SET {COLUMN} = reverse(to_addr) "
+                    f"WHERE id >= %s AND id < %s AND {COLUMN} = '' AND to_addr <> ''",
+                    [start, start + BACKFILL_BATCH],
+                )
+            start += BACKFILL_BATCH
+        return
+    pending = OutboundMessage.objects.filter(to_addr_reversed="").exclude(to_addr="").only("id", "to_addr")
+    while True:
+        rows = list(pending[:BACKFILL_BATCH])
+        if not rows:
+            break
+        for row in rows:
+            row.to_addr_reversed = row.to_addr[::-1]
+        OutboundMessage.objects.bulk_update(rows, ["to_addr_reversed"])
+
+
+def create_reversed_indexes(apps, schema_editor):
+    OutboundMessage = apps.get_model("messaging", "OutboundMessage")
+    field = OutboundMessage._meta.get_field(COLUMN)
+    if schema_editor.connection.vendor != "postgresql":
+        for statement in schema_editor._field_indexes_sql(OutboundMessage, field):
+            schema_editor.execute(statement)
+        return
+    # The same two indexes Django makes for db_index on a CharField, by the same names
+    concurrently = "" if _is_partitioned(schema_editor) else "CONCURRENTLY "
+    quote = schema_editor.quote_name
+    for suffix, opclass in (("", ""), ("_like", " varchar_pattern_ops")):
+        name = schema_editor._create_index_name(TABLE, [COLUMN], suffix=suffix)
+        schema_editor.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {quote(name)} ON {quote(TABLE)} ({quote(COLUMN)}{opclass})"
+        )
+
+
+def create_trigram_index(apps, schema_editor):
+    # Arbitrary substrings of to_addr (LIKE '%…%'); PostgreSQL only
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    concurrently = "" if _is_partitioned(schema_editor) else "CONCURRENTLY "
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS msg_to_addr_trgm_idx "
+        f"ON {TABLE} USING gin (to_addr gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS msg_to_addr_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('messaging', '0008_outbound_queued_lane_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='outboundmessage',
+                    name='to_addr_reversed',
+                    field=quark.messaging.models.ReversedCharField(blank=True, db_index=True, default='', editable=False, max_length=32, source='to_addr'),
+                ),
+            ],
+            # The column first (no table rewrite), its indexes once it is filled
+            database_operations=[
+                migrations.AddField(
+                    model_name='outboundmessage',
+                    name='to_addr_reversed',
+                    field=quark.messaging.models.ReversedCharField(blank=True, default='', editable=False, max_length=32, source='to_addr'),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_reversed, migrations.RunPython.noop),
+        migrations.RunPython(create_reversed_indexes, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:55
+
+import hashlib
+import json
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BATCH = 5000
+TABLE = "messaging_outbound_message"
+PAYLOAD_TABLE = "messaging_message_payload"
+# A successful /send body only repeats jasmin_msg_id; the model rebuilds it
+REBUILT = "jasmin_batch_id = '' AND jasmin_msg_id <> '' AND submit_response = 'Success \"' || jasmin_msg_id || '\"'"
+
+
+def _digest(body):
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _move_postgresql(schema_editor):
+    sha = "encode(sha256(convert_to({}, 'UTF8')), 'hex')"
+    for column, body, pending in (
+        ("submit_payload_id", "submit_response", f"submit_response <> '' AND NOT ({REBUILT})"),
+        ("dlr_payload_id", "dlr_raw::text", "dlr_raw <> '{}'::jsonb"),
+    ):
+        schema_editor.execute(
+            f"INSERT INTO {PAYLOAD_TABLE} (digest, body, created_on) "
+            f"SELECT {sha.format('body')}, body, now() FROM (SELECT DISTINCT {body} AS body FROM {TABLE} "
+            f"WHERE {pending}) AS bodies ON CONFLICT (digest) DO NOTHING"
+        )
+        schema_editor.execute(
+            f"UPDATE {TABLE} SET {column} = p.id FROM {PAYLOAD_TABLE} p "
+            f"WHERE {pending} AND p.digest = {sha.format(body)}"
+        )
+
+
+def move_payloads(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _move_postgresql(schema_editor)
+        return
+    OutboundMessage = apps.get_model("messaging", "OutboundMessage")
+    MessagePayload = apps.get_model("messaging", "MessagePayload")
+    rows = OutboundMessage.objects.only("id", "jasmin_msg_id", "jasmin_batch_id", "submit_response", "dlr_raw")
+    last = 0
+    while True:
+        batch = list(rows.filter(id__gt=last).order_by("id")[:BATCH])
+        if not batch:
+            break
+        last = batch[-1].id
+        bodies = {}
+        for row in batch:
+            rebuilt = f'Success "{row.jasmin_msg_id}"' if row.jasmin_msg_id and not row.jasmin_batch_id else ""
+            submit = row.submit_response if row.submit_response != rebuilt else ""
+            dlr = json.dumps(row.dlr_raw, sort_keys=True, ensure_ascii=False, default=str) if row.dlr_raw else ""
+            bodies[row.id] = (submit, dlr)
+        unique = {_digest(body): body for pair in bodies.values() for body in pair if body}
+        MessagePayload.objects.bulk_create(
+            [MessagePayload(digest=key, body=body) for key, body in unique.items()], ignore_conflicts=True
+        )
+        ids = dict(MessagePayload.objects.filter(digest__in=list(unique)).values_list("digest", "id"))
+        for row in batch:
+            submit, dlr = bodies[row.id]
+            row.submit_payload_id = ids[_digest(submit)] if submit else None
+            row.dlr_payload_id = ids[_digest(dlr)] if dlr else None
+        OutboundMessage.objects.bulk_update(batch, ["submit_payload_id", "dlr_payload_id"])
+
+
+def restore_payloads(apps, schema_editor):
+    OutboundMessage = apps.get_model("messaging", "OutboundMessage")
+    rows = OutboundMessage.objects.select_related("submit_payload", "dlr_payload").filter(
+        models.Q(submit_payload__isnull=False)
+        | models.Q(dlr_payload__isnull=False)
+        | (models.Q(jasmin_batch_id="") & ~models.Q(jasmin_msg_id=""))
+    )
+    last = 0
+    while True:
+        batch = list(rows.filter(id__gt=last).order_by("id")[:BATCH])
+        if not batch:
+            break
+        last = batch[-1].id
+        for row in batch:
+            if row.submit_payload_id:
+                row.submit_response = row.submit_payload.body
+            elif row.jasmin_msg_id and not row.jasmin_batch_id:
+                row.submit_response = f'Success "{row.jasmin_msg_id}"'
+            row.dlr_raw = json.loads(row.dlr_payload.body) if row.dlr_payload_id else {}
+        OutboundMessage.objects.bulk_update(batch, ["submit_response", "dlr_raw"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0009_outbound_to_addr_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessagePayload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('body', models.TextField()),
+                ('created_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'messaging_message_payload',
+            },
+        ),
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='dlr_payload',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Last DLR received from Jasmin', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='messaging.messagepayload'),
+        ),
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='submit_payload',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Jasmin submit response, shared by every row it applies to', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='messaging.messagepayload'),
+        ),
+        migrations.RunPython(move_payloads, restore_payloads),
+        migrations.RemoveField(
+            model_name='outboundmessage',
+            name='dlr_raw',
+        ),
+        migrations.RemoveField(
+            model_name='outboundmessage',
+            name='submit_response',
+        ),
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(condition=models.Q(('submit_payload__isnull', False)), fields=['submit_payload'], name='msg_submit_payload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(condition=models.Q(('dlr_payload__isnull', False)), fields=['dlr_payload'], name='msg_dlr_payload_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0010_message_payloads'),
+    ]
+
+    operations = [
+        # The composite index first: it takes over lookups by jasmin_batch_id alone
+        migrations.AddIndex(
+            model_name='outboundmessage',
+            index=models.Index(fields=['jasmin_batch_id', 'to_addr'], name='msg_batch_to_idx'),
+        ),
+        migrations.AlterField(
+            model_name='outboundmessage',
+            name='jasmin_batch_id',
+            field=models.CharField(blank=True, default='', help_text='Jasmin REST sendbatch id for the chunk that included this message', max_length=64),
+        ),
+    ]
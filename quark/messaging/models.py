@@ -2,12 +2,57 @@
 #  Copyright (c) 2026
 #  Outbound SMS message log and DLR state for Joyce.
 #
+import json
+
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from smartmin.models import SmartModel
 
 
+class ReversedCharField(models.CharField):
+    """
+    ``source`` stored back to front, kept in step on every insert and save
+    (``bulk_create`` included), so a suffix search is an index prefix scan.
+    """
+
+    def __init__(self, *args, source: str = "", **kwargs):
+        self.source = source
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = (getattr(model_instance, self.source) or "")[::-1]
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class MessagePayload(models.Model):
+    """
+    A raw Jasmin submit response or DLR body, stored once and referenced.
+
+    Kept off the message table so status updates and log scans read and write
+    narrow rows. Identical bodies (one sendbatch response for a whole chunk,
+    repeated error texts) share a row, found by the SHA-256 ``digest`` of
+    ``body``; see quark.messaging.payloads.
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    body = models.TextField()
+    created_on = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "messaging_message_payload"
+
+    def __str__(self):
+        return self.digest[:12]
+
+
 class OutboundMessage(SmartModel):
     """
     One outbound SMS submitted through Joyce to Jasmin's HTTP API.
@@ -44,6 +89,19 @@ class OutboundMessage(SmartModel):
         (BATCH_BULK, "Bulk"),
     )
 
+    # Fields touched by apply_dlr()
+    DLR_UPDATE_FIELDS = [
+        "dlr_status",
+        "dlr_payload",
+        "last_dlr_at",
+        "status",
+        "delivered_at",
+        "external_dlr_pending",
+        "external_dlr_attempts",
+        "external_dlr_next_attempt_at",
+        "modified_on",
+    ]
+
     workspace = models.ForeignKey(
         "workspace.WorkSpace",
         on_delete=models.CASCADE,
@@ -85,6 +143,8 @@ class OutboundMessage(SmartModel):
     )
 
     to_addr = models.CharField(max_length=32, db_index=True)
+    # Suffix search ("ends with 1234") as a prefix lookup; see message_log.to_addr_lookup
+    to_addr_reversed = ReversedCharField(max_length=32, blank=True, default="", db_index=True, source="to_addr")
     from_addr = models.CharField(max_length=32, blank=True, default="")
     content = models.TextField()
     coding = models.PositiveSmallIntegerField(default=0)
@@ -108,19 +168,42 @@ class OutboundMessage(SmartModel):
         db_index=True,
         help_text="Message id returned by Jasmin /send",
     )
+    # Indexed with to_addr (msg_batch_to_idx), which also serves lookups by batch alone
     jasmin_batch_id = models.CharField(
         max_length=64,
         blank=True,
         default="",
-        db_index=True,
         help_text="Jasmin REST sendbatch id for the chunk that included this message",
     )
-    submit_response = models.TextField(blank=True, default="")
+    # Raw bodies live in MessagePayload; read them through submit_response / dlr_raw
+    submit_payload = models.ForeignKey(
+        MessagePayload,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name="+",
+        help_text="Jasmin submit response, shared by every row it applies to",
+    )
     error_message = models.TextField(blank=True, default="")
 
     dlr_status = models.CharField(max_length=64, blank=True, default="")
-    dlr_raw = models.JSONField(default=dict, blank=True)
+    dlr_payload = models.ForeignKey(
+        MessagePayload,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name="+",
+        help_text="Last DLR received from Jasmin",
+    )
     external_dlr_forwarded_at = models.DateTimeField(null=True, blank=True)
+    external_dlr_pending = models.BooleanField(
+        default=False,
+        help_text="A DLR is waiting to be forwarded to the workspace external DLR URL",
+    )
+    external_dlr_attempts = models.PositiveSmallIntegerField(default=0)
+    external_dlr_next_attempt_at = models.DateTimeField(null=True, blank=True)
     submitted_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
     last_dlr_at = models.DateTimeField(null=True, blank=True)
@@ -133,11 +216,89 @@ class OutboundMessage(SmartModel):
             models.Index(fields=["workspace", "-created_on"]),
             models.Index(fields=["workspace", "client_message_id"]),
             models.Index(fields=["workspace", "client_batch_id"]),
+            models.Index(
+                fields=["workspace", "external_dlr_next_attempt_at"],
+                condition=models.Q(external_dlr_pending=True),
+                name="msg_ext_dlr_pending_idx",
+            ),
+            # Small: only rows waiting for a worker (priority lane depth / age)
+            models.Index(
+                fields=["priority", "created_on"],
+                condition=models.Q(status="queued"),
+                name="msg_queued_lane_idx",
+            ),
+            # Sendbatch callbacks: one recipient, or all of a buffered group, of one Jasmin batch
+            models.Index(fields=["jasmin_batch_id", "to_addr"], name="msg_batch_to_idx"),
+            # Payload references, for the orphan sweep after retention (payloads.purge_orphans)
+            models.Index(
+                fields=["submit_payload"],
+                condition=models.Q(submit_payload__isnull=False),
+                name="msg_submit_payload_idx",
+            ),
+            models.Index(
+                fields=["dlr_payload"],
+                condition=models.Q(dlr_payload__isnull=False),
+                name="msg_dlr_payload_idx",
+            ),
         ]
 
     def __str__(self):
         return f"{self.to_addr} [{self.status}] {self.jasmin_msg_id or '—'}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as stored, so the dashboard rollup can count transitions
+        instance._rollup_status = instance.__dict__.get("status")
+        return instance
+
+    @property
+    def submit_response(self) -> str:
+        """Jasmin's response to the submit (loads the payload row unless select_related)."""
+        if "_submit_response" in self.__dict__:
+            return self._submit_response
+        if self.submit_payload_id:
+            return self.submit_payload.body
+        return self.rebuilt_submit_response()
+
+    @submit_response.setter
+    def submit_response(self, text: str):
+        # Written to MessagePayload on save / payloads.store_payloads
+        self._submit_response = text or ""
+
+    def rebuilt_submit_response(self) -> str:
+        """
+        The body of a successful /send, which is not stored: it only repeats
+        ``jasmin_msg_id``.
+        """
+        if self.jasmin_msg_id and not self.jasmin_batch_id:
+            return f'Success "{self.jasmin_msg_id}"'
+        return ""
+
+    @property
+    def dlr_raw(self) -> dict:
+        """Last DLR payload (loads the payload row unless select_related)."""
+        if "_dlr_raw" in self.__dict__:
+            return self._dlr_raw
+        if self.dlr_payload_id:
+            return json.loads(self.dlr_payload.body)
+        return {}
+
+    @dlr_raw.setter
+    def dlr_raw(self, raw: dict):
+        self._dlr_raw = dict(raw or {})
+
+    def save(self, *args, **kwargs):
+        from quark.messaging.payloads import store_payloads
+        from quark.messaging.rollup import record_saved
+
+        store_payloads([self])
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if adding or update_fields is None or "status" in update_fields:
+            record_saved(self, created=adding)
+
     @classmethod
     def status_from_dlr(cls, dlr_status: str) -> str:
         """Map Jasmin / SMPP DLR status strings to our status enum."""
@@ -162,8 +323,13 @@ class OutboundMessage(SmartModel):
         }
         return mapping.get(key, cls.STATUS_UNKNOWN)
 
-    def apply_dlr(self, payload: dict):
-        """Update this message from a Jasmin DLR callback payload."""
+    def apply_dlr(self, payload: dict, *, received_at=None, save: bool = True):
+        """
+        Update this message from a Jasmin DLR callback payload.
+
+        With ``save=False`` only the fields in DLR_UPDATE_FIELDS are changed in
+        memory, for callers that write many rows with ``bulk_update``.
+        """
         raw = {str(k): (v if not hasattr(v, "urlencode") else str(v)) for k, v in dict(payload).items()}
         dlr_status = (
             raw.get("message_status")
@@ -173,22 +339,24 @@ class OutboundMessage(SmartModel):
         )
         self.dlr_status = str(dlr_status)[:64]
         self.dlr_raw = raw
-        self.last_dlr_at = timezone.now()
+        self.last_dlr_at = received_at or timezone.now()
         mapped = self.status_from_dlr(self.dlr_status)
         if mapped != self.STATUS_UNKNOWN:
             self.status = mapped
         if mapped == self.STATUS_DELIVERED and not self.delivered_at:
             self.delivered_at = self.last_dlr_at
-        self.save(
-            update_fields=[
-                "dlr_status",
-                "dlr_raw",
-                "last_dlr_at",
-                "status",
-                "delivered_at",
-                "modified_on",
-            ]
-        )
+        if (self.workspace.external_dlr_url or "").strip():
+            self.queue_external_dlr_forward()
+        if save:
+            self.save(update_fields=self.DLR_UPDATE_FIELDS)
+        else:
+            self.modified_on = timezone.now()
+
+    def queue_external_dlr_forward(self):
+        """Mark the current DLR for forwarding (see quark.messaging.dlr_forward)."""
+        self.external_dlr_pending = True
+        self.external_dlr_attempts = 0
+        self.external_dlr_next_attempt_at = self.last_dlr_at or timezone.now()
 
     def external_dlr_payload(self) -> dict:
         """
@@ -217,6 +385,43 @@ class OutboundMessage(SmartModel):
         return payload
 
 
+class MessageStatRollup(models.Model):
+    """
+    Pre-aggregated outbound message counts for the Operate dashboard.
+
+    One row per workspace × Jasmin user × day × status × batch kind, kept
+    current by quark.messaging.rollup as messages are created and change
+    status. Days are in the workspace timezone. Rebuild with
+    ``manage.py rebuild_message_rollup``.
+    """
+
+    workspace = models.ForeignKey(
+        "workspace.WorkSpace",
+        on_delete=models.CASCADE,
+        related_name="message_rollups",
+    )
+    # Plain id rather than a FK: rows of deleted users keep their counts and
+    # are shown as "Unassigned", like their messages
+    jasmin_user_key = models.PositiveIntegerField(default=0, help_text="JasminUser id, 0 when unassigned")
+    day = models.DateField()
+    status = models.CharField(max_length=16, choices=OutboundMessage.STATUS_CHOICES)
+    batch_kind = models.CharField(max_length=16, choices=OutboundMessage.BATCH_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "messaging_message_stat_rollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workspace", "jasmin_user_key", "day", "status", "batch_kind"],
+                name="msg_rollup_key_uniq",
+            ),
+        ]
+        indexes = [models.Index(fields=["workspace", "day"])]
+
+    def __str__(self):
+        return f"{self.workspace_id} {self.day} {self.status}/{self.batch_kind}: {self.count}"
+
+
 def dlr_callback_url() -> str:
     """Public URL Jasmin should call for delivery receipts."""
     configured = getattr(settings, "JOYCE_DLR_CALLBACK_URL", "") or ""
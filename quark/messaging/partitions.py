@@ -0,0 +1,453 @@
+#
+#  Copyright (c) 2026
+#  Monthly partitions of the outbound message table and retention archival.
+#
+"""
+Time-partitioned message storage (PostgreSQL) and per-workspace retention.
+
+``partition_message_table`` turns ``messaging_outbound_message`` into a table
+partitioned by month of ``created_on``, once (``manage.py message_partitions
+--convert``). The existing rows become one partition holding everything up
+to the next month; new months each get their own partition, created
+``JOYCE_MESSAGE_PARTITIONS_AHEAD`` months in advance by ``ensure_partitions``.
+A default partition catches rows outside every range. Django keeps using
+the table by its name, so the log, exports and the dashboard read every
+partition transparently.
+
+``archive_expired`` applies ``WorkSpace.message_retention_months``: each
+workspace's messages from months past its retention are written to
+``MEDIA_ROOT/JOYCE_MESSAGE_ARCHIVE_DIR/<workspace id>/<YYYY-MM>-<stamp>.jsonl.gz``
+and uncounted from the dashboard rollup. A month partition whose workspaces
+are all past retention is then detached and dropped; otherwise the archived
+rows are deleted.
+
+Deleting reads, uncounts and removes each workspace-month in one transaction
+that keeps its rows locked, so an archive is never stale. Dropping archives
+the month first, without locks, then in a short transaction locks the parent
+table (before the partition, as every writer does; DETACH needs it
+exclusively anyway), checks that the month did not change meanwhile and
+detaches and drops it. That lock waits at most ``DROP_LOCK_TIMEOUT``, so a
+long reader never queues the whole table behind it; a month that changed or
+could not be locked is left for the next run. Archives are written as
+``.part`` files and only renamed into place once the rows are gone, so a
+rolled-back run leaves no archive behind.
+Without partitioning (or off PostgreSQL) rows are always deleted, so
+retention works the same everywhere. Archive records carry the raw
+submit/DLR bodies; the payload rows left unreferenced are purged later
+(``payloads.purge_stale``).
+
+Both run from the ``maintain_message_partitions`` Celery beat task.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import re
+from dataclasses import dataclass
+from functools import partial
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from quark.messaging.models import OutboundMessage
+from quark.messaging.rollup import apply_deltas, removal_deltas
+
+logger = logging.getLogger(__name__)
+
+TABLE = OutboundMessage._meta.db_table
+LEGACY_SUFFIX = "_legacy"
+DEFAULT_PARTITION = f"{TABLE}_default"
+ID_SEQUENCE = f"{TABLE}_part_id_seq"
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_ARCHIVE_DIR = "message_archive"
+PAYLOAD_FIELDS = ("submit_payload", "dlr_payload")
+PAYLOAD_REFS = {"submit_payload_id", "dlr_payload_id"}
+DELETE_BATCH = 5000
+DROP_LOCK_TIMEOUT = "5s"
+PART_SUFFIX = ".part"
+
+
+class PartitioningUnavailable(Exception):
+    pass
+
+
+class _MonthChanged(Exception):
+    """Rows of a month changed between being archived and its partition being locked."""
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: Optional[datetime]  # None: MINVALUE
+    end: Optional[datetime]  # None: MAXVALUE
+    is_default: bool = False
+
+    def is_month(self, start: datetime) -> bool:
+        return self.start == start and self.end == month_bound(add_months(start.date(), 1))
+
+
+def month_start(value) -> date:
+    if isinstance(value, datetime):
+        value = value.astimezone(dt_timezone.utc).date()
+    return value.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(day: date) -> datetime:
+    # Partition bounds are UTC month starts
+    return datetime(day.year, day.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month:%Y_%m}"
+
+
+def is_postgresql() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def is_partitioned() -> bool:
+    if not is_postgresql():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+_BOUND = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def _bound(text: str) -> Optional[datetime]:
+    text = text.strip()
+    if text in ("MINVALUE", "MAXVALUE"):
+        return None
+    return parse_datetime(text.strip("'"))
+
+
+def list_partitions() -> list[Partition]:
+    """Partitions of the message table, oldest first (empty when it is not partitioned)."""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            partitions.append(Partition(name, None, None, is_default=True))
+            continue
+        match = _BOUND.search(bound)
+        if match:
+            partitions.append(Partition(name, _bound(match.group(1)), _bound(match.group(2))))
+    epoch = datetime.min.replace(tzinfo=dt_timezone.utc)
+    return sorted(partitions, key=lambda p: (p.is_default, p.start or epoch))
+
+
+def _overlaps(partition: Partition, start: datetime, end: datetime) -> bool:
+    if partition.is_default:
+        return False
+    return (partition.start is None or partition.start < end) and (partition.end is None or start < partition.end)
+
+
+def ensure_partitions(months_ahead: Optional[int] = None, now=None) -> list[str]:
+    """Create the partitions of this month and the next ``months_ahead``; returns the new ones."""
+    if not is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = int(getattr(settings, "JOYCE_MESSAGE_PARTITIONS_AHEAD", DEFAULT_MONTHS_AHEAD))
+    existing = list_partitions()
+    first = month_start(now or timezone.now())
+    quote = connection.ops.quote_name
+    created = []
+    for offset in range(max(0, months_ahead) + 1):
+        month = add_months(first, offset)
+        start, end = month_bound(month), month_bound(add_months(month, 1))
+        if any(_overlaps(p, start, end) for p in existing):
+            continue
+        name = partition_name(month)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TABLE {quote(name)} PARTITION OF {quote(TABLE)} FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+        except Exception:
+            # Typically rows of that month already sit in the default partition
+            logger.exception("Could not create message partition %s", name)
+            continue
+        existing.append(Partition(name, start, end))
+        created.append(name)
+    return created
+
+
+def partition_message_table(now=None) -> bool:
+    """
+    Convert the message table to monthly range partitions; False when it already is.
+
+    Takes an exclusive lock on the table and builds a (id, created_on) unique
+    index over the existing rows: run it in a maintenance window.
+    """
+    if not is_postgresql():
+        raise PartitioningUnavailable("Message table partitioning needs PostgreSQL")
+    if is_partitioned():
+        return False
+
+    legacy = TABLE + LEGACY_SUFFIX
+    boundary = month_bound(add_months(month_start(now or timezone.now()), 1))
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT indexname, indexdef, indisunique FROM pg_indexes "
+            "JOIN pg_class ON pg_class.relname = pg_indexes.indexname "
+            "JOIN pg_index ON pg_index.indexrelid = pg_class.oid "
+            "WHERE pg_indexes.tablename = %s",
+            [TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        # The old table keeps its rows and becomes the partition of everything before `boundary`
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(legacy)}")
+        for name, _definition, _unique in indexes:
+            cursor.execute(f"ALTER INDEX {quote(name)} RENAME TO {quote((name + LEGACY_SUFFIX)[-63:])}")
+        cursor.execute(
+            f"CREATE TABLE {quote(TABLE)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+            f"INCLUDING STORAGE) PARTITION BY RANGE (created_on)"
+        )
+        # Ids continue from a sequence of the parent; the old identity/serial default is dropped
+        cursor.execute(f"CREATE SEQUENCE {quote(ID_SEQUENCE)} OWNED BY {quote(TABLE)}.id")
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {quote(legacy)}), 0) + 1, false)", [ID_SEQUENCE]
+        )
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)", [ID_SEQUENCE])
+        cursor.execute(f"ALTER TABLE {quote(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {quote(legacy)} ALTER COLUMN id DROP DEFAULT")
+
+        # Unique keys of a partitioned table must include the partition column
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, created_on)")
+        cursor.execute(f"CREATE UNIQUE INDEX ON {quote(legacy)} (id, created_on)")
+        for name, definition, unique in indexes:
+            if unique:
+                continue
+            # Same name and definition on the parent, so later Django migrations find them
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+
+        cursor.execute(
+            f"ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(legacy)} FOR VALUES FROM (MINVALUE) TO (%s)",
+            [boundary],
+        )
+        cursor.execute(f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT")
+    ensure_partitions(now=now)
+    return True
+
+
+def archive_dir() -> Path:
+    return Path(settings.MEDIA_ROOT) / getattr(settings, "JOYCE_MESSAGE_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+
+
+def retention_cutoff(workspace, now=None) -> Optional[date]:
+    """First month the workspace keeps, or None when it keeps everything."""
+    months = int(workspace.message_retention_months or 0)
+    if months <= 0:
+        return None
+    return add_months(month_start(now or timezone.now()), -months)
+
+
+def _month_rows(start: date, workspace_ids=None):
+    qs = OutboundMessage.objects.filter(
+        created_on__gte=month_bound(start), created_on__lt=month_bound(add_months(start, 1))
+    )
+    if workspace_ids is not None:
+        qs = qs.filter(workspace_id__in=workspace_ids)
+    return qs
+
+
+def _part(path: str) -> Path:
+    return Path(path + PART_SUFFIX)
+
+
+def _publish(paths: list[str]):
+    for path in paths:
+        _part(path).replace(path)
+
+
+def _discard(paths: list[str]):
+    for path in paths:
+        _part(path).unlink(missing_ok=True)
+
+
+def _write_archive(workspace, month: date, stamp: str, *, lock: bool = False) -> tuple[str, list[int], object, object]:
+    """
+    Write one workspace-month to the ``.part`` file of its archive; returns
+    (path, ids written, rollup deltas, latest ``modified_on``). The caller
+    renames it into place with ``_publish`` once the rows are gone. With
+    ``lock`` the rows stay locked until the caller's transaction ends, so
+    none can change between being archived and deleted.
+    """
+    directory = archive_dir() / str(workspace.pk)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = str(directory / f"{month:%Y-%m}-{stamp}.jsonl.gz")
+    fields = [f.attname for f in OutboundMessage._meta.concrete_fields if f.attname not in PAYLOAD_REFS]
+    ids = []
+    latest = None
+
+    def archived(handle):
+        nonlocal latest
+        rows = _month_rows(month, [workspace.pk]).select_related(*PAYLOAD_FIELDS).order_by("created_on", "id")
+        if lock:
+            rows = rows.select_for_update(of=("self",))
+        for message in rows.iterator(chunk_size=2000):
+            record = {name: getattr(message, name) for name in fields}
+            # The bodies themselves: their payload rows may be purged after this
+            record["submit_response"] = message.submit_response
+            record["dlr_raw"] = message.dlr_raw
+            handle.write(json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+            ids.append(message.pk)
+            if latest is None or message.modified_on > latest:
+                latest = message.modified_on
+            yield message
+
+    try:
+        with gzip.open(_part(path), "wt", encoding="utf-8") as handle:
+            deltas = removal_deltas(archived(handle), {workspace.pk: workspace.timezone})
+    except BaseException:
+        _discard([path])
+        raise
+    return path, ids, deltas, latest
+
+
+def archive_expired(now=None, dry_run: bool = False) -> list[dict]:
+    """
+    Archive and remove every workspace's messages past its retention.
+
+    Returns one entry per month touched: the month, the workspaces archived,
+    their archive files, and whether the month's partition was dropped.
+    """
+    from quark.workspace.models import WorkSpace
+
+    now = now or timezone.now()
+    cutoffs = {}
+    for workspace in WorkSpace.objects.filter(message_retention_months__gt=0):
+        cutoffs[workspace.pk] = (workspace, retention_cutoff(workspace, now))
+    if not cutoffs:
+        return []
+
+    # Oldest expired month of any workspace, through its (workspace, -created_on) index
+    oldest = None
+    for workspace, cutoff in cutoffs.values():
+        first = (
+            OutboundMessage.objects.filter(workspace=workspace, created_on__lt=month_bound(cutoff))
+            .order_by("created_on")
+            .values_list("created_on", flat=True)
+            .first()
+        )
+        if first is not None:
+            oldest = min(oldest, month_start(first)) if oldest else month_start(first)
+    if oldest is None:
+        return []
+
+    partitions = list_partitions()
+    last = max(cutoff for _, cutoff in cutoffs.values())
+    stamp = now.strftime("%Y%m%d%H%M%S")
+    quote = connection.ops.quote_name
+    report = []
+    month = oldest
+    while month < last:
+        present = set(_month_rows(month).order_by().values_list("workspace_id", flat=True).distinct())
+        expired = {pk for pk in present if pk in cutoffs and month < cutoffs[pk][1]}
+        if not expired:
+            month = add_months(month, 1)
+            continue
+        partition = next((p for p in partitions if p.is_month(month_bound(month))), None)
+        drop = partition is not None and expired == present
+        entry = {"month": f"{month:%Y-%m}", "workspaces": sorted(expired), "files": [], "rows": 0, "dropped": drop}
+        if dry_run:
+            entry["rows"] = _month_rows(month, expired).count()
+            report.append(entry)
+            month = add_months(month, 1)
+            continue
+
+        if drop:
+            archives = []
+            try:
+                # Read without locks; nothing in the month is expected to change
+                for pk in sorted(expired):
+                    archives.append(_write_archive(cutoffs[pk][0], month, stamp))
+                paths = [path for path, _, _, _ in archives]
+                archived = {
+                    "rows": sum(len(ids) for _, ids, _, _ in archives),
+                    "latest": max(latest for _, _, _, latest in archives),
+                }
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL lock_timeout = '{DROP_LOCK_TIMEOUT}'")
+                    cursor.execute(f"LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE")
+                    if _month_rows(month).aggregate(rows=Count("id"), latest=Max("modified_on")) != archived:
+                        raise _MonthChanged()
+                    for _, _, deltas, _ in archives:
+                        apply_deltas(deltas)
+                    cursor.execute(f"ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(partition.name)}")
+                    cursor.execute(f"DROP TABLE {quote(partition.name)}")
+                    transaction.on_commit(partial(_publish, paths))
+            except (_MonthChanged, OperationalError) as exc:
+                _discard([path for path, _, _, _ in archives])
+                logger.warning(
+                    "Message partition %s not dropped (%s); retrying on the next run",
+                    partition.name, "rows changed" if isinstance(exc, _MonthChanged) else exc,
+                )
+                month = add_months(month, 1)
+                continue
+            except BaseException:
+                _discard([path for path, _, _, _ in archives])
+                raise
+            entry["files"] = paths
+            entry["rows"] = archived["rows"]
+        else:
+            for pk in sorted(expired):
+                path = None
+                try:
+                    with transaction.atomic():
+                        path, ids, deltas, _ = _write_archive(cutoffs[pk][0], month, stamp, lock=True)
+                        apply_deltas(deltas)
+                        # Exactly what was archived: a row added meanwhile waits for the next run
+                        for start in range(0, len(ids), DELETE_BATCH):
+                            _month_rows(month, [pk]).filter(pk__in=ids[start:start + DELETE_BATCH]).delete()
+                        transaction.on_commit(partial(_publish, [path]))
+                except BaseException:
+                    if path:
+                        _discard([path])
+                    raise
+                entry["files"].append(path)
+                entry["rows"] += len(ids)
+        logger.info(
+            "Archived %s message(s) of %s from %s%s",
+            entry["rows"], len(expired), entry["month"], " (partition dropped)" if drop else "",
+        )
+        report.append(entry)
+        month = add_months(month, 1)
+    return report
@@ -0,0 +1,133 @@
+#
+#  Copyright (c) 2026
+#  Side table for raw Jasmin submit responses and DLR bodies.
+#
+"""
+Raw payloads are kept out of ``messaging_outbound_message``.
+
+A message points at a ``MessagePayload`` row (``submit_payload`` /
+``dlr_payload``) instead of carrying the text itself, so the rows that status
+updates, the log and the dashboard touch stay narrow. Bodies are stored once
+per distinct text, keyed by SHA-256: every row of a REST sendbatch chunk
+references the chunk's single response, and repeated error texts share a row.
+The body of a successful /send (``Success "<id>"``) is not stored at all; the
+model rebuilds it from ``jasmin_msg_id``.
+
+Setting ``message.submit_response`` or ``message.dlr_raw`` only stages the
+body. ``OutboundMessage.save`` stores it; bulk writers call
+``store_payloads`` on their rows before ``bulk_update``, which costs three
+queries however many rows there are.
+
+A DLR body carries its message id, so each DLR stores a new body and the
+one it replaces becomes an orphan, as do the bodies of messages removed by
+retention. ``purge_stale`` deletes orphans past ``ORPHAN_GRACE`` from the
+``maintain_message_partitions`` beat task, whether or not any workspace has
+retention enabled.
+
+``purge_orphans`` only deletes old payloads, so a writer reusing an old body
+stamps it as new first and the purge leaves it alone; a body the purge
+removed between the insert and the lookup is inserted again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from quark.messaging.models import MessagePayload, OutboundMessage
+
+PURGE_BATCH = 5000
+# Reused bodies older than this are stamped as new again
+RESTAMP_AFTER = timedelta(hours=1)
+LOOKUP_ATTEMPTS = 3
+# Well past RESTAMP_AFTER: a writer may still be about to point a row at a younger body
+ORPHAN_GRACE = 2 * RESTAMP_AFTER
+
+
+def digest(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def dlr_body(raw: dict) -> str:
+    return json.dumps(raw, sort_keys=True, ensure_ascii=False, default=str) if raw else ""
+
+
+def payload_ids(bodies: Iterable[str]) -> dict[str, int]:
+    """``digest -> MessagePayload id`` for every non-empty body, inserting the new ones."""
+    missing = {digest(body): body for body in bodies if body}
+    ids: dict[str, int] = {}
+    for _ in range(LOOKUP_ATTEMPTS):
+        if not missing:
+            return ids
+        MessagePayload.objects.bulk_create(
+            [MessagePayload(digest=key, body=body) for key, body in missing.items()],
+            ignore_conflicts=True,
+        )
+        # Out of purge_orphans' reach from here on: it only deletes old rows
+        now = timezone.now()
+        MessagePayload.objects.filter(digest__in=list(missing), created_on__lt=now - RESTAMP_AFTER).update(
+            created_on=now
+        )
+        ids.update(MessagePayload.objects.filter(digest__in=list(missing)).values_list("digest", "id"))
+        # Any still missing were purged between the insert and the restamp
+        missing = {key: body for key, body in missing.items() if key not in ids}
+    if missing:
+        raise IntegrityError(f"{len(missing)} message payload(s) were purged as fast as they were stored")
+    return ids
+
+
+def payload_id(body: str) -> Optional[int]:
+    """Id of the payload row for one body (None when empty)."""
+    return payload_ids([body]).get(digest(body)) if body else None
+
+
+def store_payloads(messages: Iterable[OutboundMessage]):
+    """Store the staged submit responses / DLR bodies of ``messages`` and point the rows at them."""
+    staged = []
+    for message in messages:
+        if "_submit_response" in message.__dict__:
+            text = message.__dict__.pop("_submit_response")
+            if text == message.rebuilt_submit_response():
+                text = ""
+            staged.append((message, "submit_payload_id", text))
+        if "_dlr_raw" in message.__dict__:
+            staged.append((message, "dlr_payload_id", dlr_body(message.__dict__.pop("_dlr_raw"))))
+    if not staged:
+        return
+    ids = payload_ids(body for _, _, body in staged)
+    for message, attname, body in staged:
+        setattr(message, attname, ids[digest(body)] if body else None)
+
+
+def purge_orphans(created_before: datetime) -> int:
+    """
+    Delete payloads created before ``created_before`` that no message references
+    any more (after retention deleted or dropped their rows); returns the count.
+    """
+    orphans = (
+        MessagePayload.objects.filter(created_on__lt=created_before)
+        .exclude(Exists(OutboundMessage.objects.filter(submit_payload=OuterRef("pk"))))
+        .exclude(Exists(OutboundMessage.objects.filter(dlr_payload=OuterRef("pk"))))
+    )
+    deleted = 0
+    while True:
+        ids = list(orphans.values_list("id", flat=True)[:PURGE_BATCH])
+        if not ids:
+            return deleted
+        try:
+            with transaction.atomic():
+                # Checked again as rows are deleted: one restamped or referenced meanwhile stays
+                deleted += orphans.filter(id__in=ids).delete()[0]
+        except IntegrityError:
+            # A new message took up one of these bodies meanwhile; the next run retries
+            return deleted
+
+
+def purge_stale(now=None) -> int:
+    """Delete every orphaned payload older than ``ORPHAN_GRACE``; returns the count."""
+    return purge_orphans(created_before=(now or timezone.now()) - ORPHAN_GRACE)
@@ -0,0 +1,165 @@
+#
+#  Copyright (c) 2026
+#  Incremental message counts behind the Operate dashboard.
+#
+"""
+Maintenance of ``MessageStatRollup``.
+
+Every write path that creates outbound messages or changes their status
+reports it here, and the matching rollup rows are bumped by the difference:
+
+* ``OutboundMessage.save()`` reports itself (single sends, batch callbacks,
+  inline DLRs);
+* bulk paths call ``record_created`` after ``bulk_create`` and
+  ``record_transitions`` after ``bulk_update`` / ``QuerySet.update``;
+* archival uncounts the rows it removes (``removal_deltas``).
+
+A message is counted under the day it was created (workspace timezone) and
+its current status. The old status is the one loaded from the database
+(``OutboundMessage.from_db``) or last recorded here, so a row is never
+counted twice for the same transition. ``rebuild`` recomputes a workspace
+from ``OutboundMessage`` (``manage.py rebuild_message_rollup``).
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from typing import Iterable
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+
+from quark.messaging.models import MessageStatRollup, OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+
+
+def _workspace_timezones(messages) -> dict:
+    from quark.workspace.models import WorkSpace
+
+    zones, missing = {}, set()
+    for message in messages:
+        if message.workspace_id in zones:
+            continue
+        if OutboundMessage.workspace.is_cached(message):
+            zones[message.workspace_id] = message.workspace.timezone
+        else:
+            missing.add(message.workspace_id)
+    if missing:
+        zones.update(WorkSpace.objects.filter(pk__in=missing).values_list("id", "timezone"))
+    return zones
+
+
+def _key(message: OutboundMessage, status: str, zones: dict) -> tuple:
+    day = message.created_on.astimezone(zones[message.workspace_id]).date()
+    return message.workspace_id, message.jasmin_user_id or 0, day, status, message.batch_kind
+
+
+def apply_deltas(deltas: Counter):
+    """Add ``deltas`` (rollup key → count change) to the rollup table."""
+    # Sorted so concurrent writers lock rows in the same order
+    for key in sorted(k for k, v in deltas.items() if v):
+        workspace_id, user_key, day, status, batch_kind = key
+        lookup = {
+            "workspace_id": workspace_id,
+            "jasmin_user_key": user_key,
+            "day": day,
+            "status": status,
+            "batch_kind": batch_kind,
+        }
+        rows = MessageStatRollup.objects.filter(**lookup)
+        if rows.update(count=F("count") + deltas[key]):
+            continue
+        try:
+            with transaction.atomic():
+                MessageStatRollup.objects.create(count=deltas[key], **lookup)
+        except IntegrityError:
+            # Created by a concurrent writer since our UPDATE
+            rows.update(count=F("count") + deltas[key])
+
+
+def record_created(messages: Iterable[OutboundMessage]):
+    """Count freshly inserted messages (e.g. after ``bulk_create``)."""
+    messages = list(messages)
+    if not messages:
+        return
+    zones = _workspace_timezones(messages)
+    deltas = Counter()
+    for message in messages:
+        deltas[_key(message, message.status, zones)] += 1
+        message._rollup_status = message.status
+    _apply(deltas)
+
+
+def record_transitions(messages: Iterable[OutboundMessage]):
+    """Move messages whose in-memory status differs from the last recorded one."""
+    changed = [
+        m for m in messages if getattr(m, "_rollup_status", _UNSET) not in (_UNSET, None, m.status)
+    ]
+    if not changed:
+        return
+    zones = _workspace_timezones(changed)
+    deltas = Counter()
+    for message in changed:
+        deltas[_key(message, message._rollup_status, zones)] -= 1
+        deltas[_key(message, message.status, zones)] += 1
+        message._rollup_status = message.status
+    _apply(deltas)
+
+
+def removal_deltas(messages: Iterable[OutboundMessage], zones: dict) -> Counter:
+    """
+    Deltas that uncount ``messages`` (streamed; ``zones``: workspace id → timezone).
+
+    For rows about to be deleted: apply them with ``apply_deltas`` in the
+    deleting transaction so the rollup and the table change together.
+    """
+    deltas = Counter()
+    for message in messages:
+        deltas[_key(message, message.status, zones)] -= 1
+    return deltas
+
+
+def record_saved(message: OutboundMessage, *, created: bool):
+    if created:
+        record_created([message])
+    else:
+        record_transitions([message])
+
+
+def _apply(deltas: Counter):
+    # Counting must never fail the send / DLR path; a rebuild repairs drift
+    try:
+        with transaction.atomic():
+            apply_deltas(deltas)
+    except Exception:
+        logger.exception("Message rollup update failed")
+
+
+def rebuild(workspace) -> int:
+    """Recompute every rollup row of ``workspace``; returns the rows written."""
+    grouped = (
+        OutboundMessage.objects.filter(workspace=workspace)
+        .annotate(day=TruncDate("created_on", tzinfo=workspace.timezone))
+        .values("jasmin_user_id", "day", "status", "batch_kind")
+        .annotate(c=Count("id"))
+        .order_by()
+    )
+    rows = [
+        MessageStatRollup(
+            workspace=workspace,
+            jasmin_user_key=row["jasmin_user_id"] or 0,
+            day=row["day"],
+            status=row["status"],
+            batch_kind=row["batch_kind"],
+            count=row["c"],
+        )
+        for row in grouped
+    ]
+    with transaction.atomic():
+        MessageStatRollup.objects.filter(workspace=workspace).delete()
+        MessageStatRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,100 @@
+#
+#  Copyright (c) 2026
+#  Packs a bulk batch into as few Jasmin REST sendbatch requests as possible.
+#
+"""
+Chunk planner for /secure/sendbatch.
+
+Recipients are grouped by content across the whole batch (not just runs of
+consecutive rows), so an interleaved A,B,A,B... payload still collapses into
+one ``{"to": [...], "content": ...}`` entry per distinct text. Groups larger
+than ``same_chunk`` are split.
+
+The resulting entries are then bin-packed (first-fit decreasing) into
+requests, each holding at most ``personal_chunk`` entries, ``same_chunk``
+recipients and ``max_bytes`` of serialized ``messages``.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Iterable, Sequence
+
+DEFAULT_MAX_BYTES = 512 * 1024
+
+
+@dataclass
+class SendbatchChunk:
+    entries: list[dict] = field(default_factory=list)
+    rows: list = field(default_factory=list)
+    recipients: int = 0
+    size: int = 2  # "[]"
+
+    def fits(self, entry_size: int, recipients: int, *, max_entries: int, max_recipients: int, max_bytes: int) -> bool:
+        if not self.entries:
+            return True
+        return (
+            len(self.entries) < max_entries
+            and self.recipients + recipients <= max_recipients
+            and self.size + entry_size + 1 <= max_bytes
+        )
+
+    def add(self, entry: dict, rows: Sequence, entry_size: int):
+        self.size += entry_size + (1 if self.entries else 0)
+        self.entries.append(entry)
+        self.rows.extend(rows)
+        self.recipients += len(rows)
+
+
+def _entry_size(entry: dict) -> int:
+    return len(json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def plan_sendbatch_chunks(
+    messages: Iterable,
+    *,
+    same_chunk: int,
+    personal_chunk: int,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> list[tuple[list[dict], list]]:
+    """
+    Plan sendbatch requests for ``messages`` (objects with ``to_addr`` and
+    ``content``). Returns ``(messages[] payload, rows covered)`` per request.
+    """
+    same_chunk = max(1, int(same_chunk))
+    personal_chunk = max(1, int(personal_chunk))
+
+    groups: dict[str, list] = {}
+    for msg in messages:
+        groups.setdefault(msg.content, []).append(msg)
+
+    sized: list[tuple[int, dict, list]] = []
+    for content, rows in groups.items():
+        for i in range(0, len(rows), same_chunk):
+            part = rows[i:i + same_chunk]
+            if len(part) == 1:
+                entry = {"to": part[0].to_addr, "content": content}
+            else:
+                entry = {"to": [m.to_addr for m in part], "content": content}
+            sized.append((_entry_size(entry), entry, part))
+
+    # First-fit decreasing: big multi-recipient entries first, small ones fill gaps
+    sized.sort(key=lambda item: (len(item[2]), item[0]), reverse=True)
+    limits = {"max_entries": personal_chunk, "max_recipients": same_chunk, "max_bytes": max_bytes}
+    chunks: list[SendbatchChunk] = []
+    open_chunks: list[SendbatchChunk] = []
+    for size, entry, rows in sized:
+        target = None
+        for chunk in open_chunks:
+            if chunk.fits(size, len(rows), **limits):
+                target = chunk
+                break
+        if target is None:
+            target = SendbatchChunk()
+            chunks.append(target)
+            open_chunks.append(target)
+        target.add(entry, rows, size)
+        if len(target.entries) >= personal_chunk or target.recipients >= same_chunk:
+            open_chunks.remove(target)
+
+    return [(chunk.entries, chunk.rows) for chunk in chunks]
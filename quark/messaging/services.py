@@ -4,18 +4,29 @@
 #
 from __future__ import annotations
 
+import itertools
 import logging
+import math
+import time
 import uuid
-from dataclasses import dataclass
-from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional
 
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 
 from quark.jasmin.connection import resolve_jasmin_connection
 from quark.jasmin.models import JasminUser
-from quark.messaging.clients import JasminHttpClient, JasminRestClient
+from quark.messaging.clients import JasminHttpClient, JasminHttpResult, JasminRestClient
+from quark.messaging.lanes import dispatch
 from quark.messaging.models import OutboundMessage, dlr_callback_url
+from quark.messaging.payloads import payload_id
+from quark.messaging.rollup import record_created, record_transitions
+from quark.messaging.sendbatch_planner import DEFAULT_MAX_BYTES, plan_sendbatch_chunks
+from quark.messaging.throttle import admit, buckets_for, estimate, max_wait as throttle_max_wait, pace
 
 logger = logging.getLogger(__name__)
 
@@ -27,14 +38,20 @@ class SendItem:
     client_message_id: str = ""
 
 
+# Rows returned with a bulk SubmitResult; the rest are looked up by batch_id
+SUBMIT_PREVIEW_LIMIT = 100
+
+
 @dataclass
 class SubmitResult:
     batch_id: str
-    mode: str  # "single" | "bulk_rest" | "bulk_async"
+    mode: str  # "single" | "single_async" | "bulk_rest" | "bulk_rest_async" | "bulk_async"
     message_count: int
-    messages: list[OutboundMessage]
+    messages: list[OutboundMessage]  # at most SUBMIT_PREVIEW_LIMIT rows for bulk
     jasmin_batch_ids: list[str]
     client_batch_id: str = ""
+    counts: dict[str, int] = field(default_factory=dict)  # status -> rows
+    throttle: dict = field(default_factory=dict)  # Admission.as_dict() of the Jasmin user's quota
 
 
 def _normalize_msisdn(raw: Any) -> str:
@@ -53,18 +70,17 @@ def _clean_client_id(raw: Any, *, field: str = "client_message_id") -> str:
     return value
 
 
-def _destinations_with_client_ids(to_raw, client_message_id, client_message_ids, content: str) -> list[SendItem]:
+def _destinations_with_client_ids(to_raw, client_message_id, client_message_ids, content: str) -> Iterator[SendItem]:
     destinations = to_raw if isinstance(to_raw, list) else [to_raw]
     if not destinations:
         raise ValueError("'to' must not be empty")
 
-    ids: list[str] = []
     if client_message_ids is not None:
         if not isinstance(client_message_ids, list):
             raise ValueError("'client_message_ids' must be a list")
         if len(client_message_ids) != len(destinations):
             raise ValueError("'client_message_ids' length must match 'to'")
-        ids = [_clean_client_id(x) for x in client_message_ids]
+        ids = (_clean_client_id(x) for x in client_message_ids)
     elif client_message_id:
         cid = _clean_client_id(client_message_id)
         if len(destinations) > 1:
@@ -72,38 +88,18 @@ def _destinations_with_client_ids(to_raw, client_message_id, client_message_ids,
                 "Use 'client_message_ids' (list) when 'to' has multiple destinations, "
                 "or pass one 'client_message_id' per messages[] entry"
             )
-        ids = [cid]
+        ids = iter([cid])
     else:
-        ids = [""] * len(destinations)
+        ids = itertools.repeat("")
 
-    items: list[SendItem] = []
     for dest, cid in zip(destinations, ids):
         msisdn = _normalize_msisdn(dest)
         if not msisdn.isdigit() or len(msisdn) < 8 or len(msisdn) > 15:
             raise ValueError(f"Invalid destination number: {dest!r}")
-        items.append(SendItem(to_addr=msisdn, content=content, client_message_id=cid))
-    return items
-
+        yield SendItem(to_addr=msisdn, content=content, client_message_id=cid)
 
-def expand_send_payload(payload: dict) -> tuple[list[SendItem], str]:
-    """
-    Normalize API / service payloads into items + optional client_batch_id.
-
-    Optional correlation fields:
-      client_batch_id / broadcast_id  — applied to the whole submit
-      client_message_id               — single destination
-      client_message_ids              — parallel to a multi-value 'to'
-      messages[].client_message_id    — per personalized entry
-    """
-    if not isinstance(payload, dict):
-        raise ValueError("Payload must be a JSON object")
-
-    client_batch_id = _clean_client_id(
-        payload.get("client_batch_id") or payload.get("broadcast_id"),
-        field="client_batch_id",
-    )
-    items: list[SendItem] = []
 
+def _iter_send_items(payload: dict) -> Iterator[SendItem]:
     if "messages" in payload:
         messages = payload.get("messages")
         if not isinstance(messages, list) or not messages:
@@ -117,15 +113,13 @@ def expand_send_payload(payload: dict) -> tuple[list[SendItem], str]:
             to_raw = entry.get("to")
             if to_raw is None:
                 raise ValueError("Each message requires 'to'")
-            items.extend(
-                _destinations_with_client_ids(
-                    to_raw,
-                    entry.get("client_message_id") or entry.get("message_id"),
-                    entry.get("client_message_ids"),
-                    content,
-                )
+            yield from _destinations_with_client_ids(
+                to_raw,
+                entry.get("client_message_id") or entry.get("message_id"),
+                entry.get("client_message_ids"),
+                content,
             )
-        return items, client_batch_id
+        return
 
     content = (payload.get("content") or "").strip()
     if not content:
@@ -133,13 +127,55 @@ def expand_send_payload(payload: dict) -> tuple[list[SendItem], str]:
     to_raw = payload.get("to")
     if to_raw is None:
         raise ValueError("'to' is required")
-    items = _destinations_with_client_ids(
+    yield from _destinations_with_client_ids(
         to_raw,
         payload.get("client_message_id") or payload.get("message_id"),
         payload.get("client_message_ids"),
         content,
     )
-    return items, client_batch_id
+
+
+class SendItems:
+    """
+    Lazily expanded send items.
+
+    Iterating yields fresh SendItem objects each time; nothing holds the whole
+    list. The payload is walked once up front so validation errors surface
+    before any row is created, and so ``len()`` is known.
+    """
+
+    def __init__(self, factory: Callable[[], Iterator[SendItem]]):
+        self._factory = factory
+        self._count = sum(1 for _ in factory())
+
+    def __iter__(self) -> Iterator[SendItem]:
+        return self._factory()
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def expand_send_payload(payload: dict) -> tuple[SendItems, str]:
+    """
+    Normalize API / service payloads into items + optional client_batch_id.
+
+    Items are generated on demand (see SendItems), so a huge payload is never
+    copied into a second list of SendItem objects.
+
+    Optional correlation fields:
+      client_batch_id / broadcast_id  — applied to the whole submit
+      client_message_id               — single destination
+      client_message_ids              — parallel to a multi-value 'to'
+      messages[].client_message_id    — per personalized entry
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Payload must be a JSON object")
+
+    client_batch_id = _clean_client_id(
+        payload.get("client_batch_id") or payload.get("broadcast_id"),
+        field="client_batch_id",
+    )
+    return SendItems(lambda: _iter_send_items(payload)), client_batch_id
 
 
 def batch_callback_url() -> str:
@@ -147,7 +183,7 @@ def batch_callback_url() -> str:
     return f"{base}/batch-callback"
 
 
-def submit_outbound_message(
+def new_outbound_message(
     *,
     workspace,
     jasmin_user: JasminUser,
@@ -162,9 +198,8 @@ def submit_outbound_message(
     client_message_id: str = "",
     created_by=None,
 ) -> OutboundMessage:
-    """Persist a message row and submit it to Jasmin /send."""
-    callback = dlr_callback_url()
-    message = OutboundMessage(
+    """Unsaved queued row for one /send."""
+    return OutboundMessage(
         workspace=workspace,
         jasmin_user=jasmin_user,
         to_addr=to_addr,
@@ -180,9 +215,79 @@ def submit_outbound_message(
         created_by=created_by,
         modified_by=created_by,
     )
-    message.save()
 
+
+def apply_send_result(message: OutboundMessage, result: JasminHttpResult, modified_by=None):
+    """Copy a /send result onto ``message`` (not saved)."""
+    message.submit_response = result.text
+    message.submitted_at = timezone.now()
+    if result.ok:
+        message.status = OutboundMessage.STATUS_SUBMITTED
+        message.jasmin_msg_id = result.message_id
+        message.error_message = ""
+    else:
+        message.status = OutboundMessage.STATUS_FAILED
+        message.error_message = result.error or result.text or "Submit failed"
+    message.modified_by = modified_by
+
+
+def defer_single_send(message: OutboundMessage, delay: float):
+    """Leave a saved single message queued; a worker submits it once its throughput slot is due."""
+    from quark.messaging.tasks import process_bulk_http_send
+
+    if not message.batch_id:
+        message.batch_id = uuid.uuid4().hex[:16]
+        message.save(update_fields=["batch_id", "modified_on"])
+    dispatch(process_bulk_http_send, message.batch_id, message.priority, countdown=max(0, math.ceil(delay)))
+
+
+def submit_outbound_message(
+    *,
+    workspace,
+    jasmin_user: JasminUser,
+    to_addr: str,
+    content: str,
+    from_addr: str = "",
+    dlr_level: int = 3,
+    priority: int = 0,
+    batch_id: str = "",
+    batch_kind: str = OutboundMessage.BATCH_SINGLE,
+    client_batch_id: str = "",
+    client_message_id: str = "",
+    created_by=None,
+) -> OutboundMessage:
+    """
+    Persist a message row and submit it to Jasmin /send.
+
+    The send is paced by the Jasmin user's throughput quota (see
+    quark.messaging.throttle). When it would wait longer than
+    JOYCE_THROTTLE_MAX_WAIT the row is left queued for a worker instead.
+    """
+    callback = dlr_callback_url()
     connection = resolve_jasmin_connection(workspace)
+    message = new_outbound_message(
+        workspace=workspace,
+        jasmin_user=jasmin_user,
+        to_addr=to_addr,
+        content=content,
+        from_addr=from_addr,
+        dlr_level=dlr_level,
+        priority=priority,
+        batch_id=batch_id,
+        batch_kind=batch_kind,
+        client_batch_id=client_batch_id,
+        client_message_id=client_message_id,
+        created_by=created_by,
+    )
+    message.save()
+
+    admission = admit(buckets_for(jasmin_user, connection), max_wait=throttle_max_wait())
+    if not admission.granted:
+        defer_single_send(message, admission.wait)
+        return message
+    if admission.wait:
+        time.sleep(admission.wait)
+
     client = JasminHttpClient(base_url=connection.http_api_url)
     result = client.send(
         username=jasmin_user.username,
@@ -195,16 +300,7 @@ def submit_outbound_message(
         dlr_url=callback,
     )
 
-    message.submit_response = result.text
-    message.submitted_at = timezone.now()
-    if result.ok:
-        message.status = OutboundMessage.STATUS_SUBMITTED
-        message.jasmin_msg_id = result.message_id
-        message.error_message = ""
-    else:
-        message.status = OutboundMessage.STATUS_FAILED
-        message.error_message = result.error or result.text or "Submit failed"
-    message.modified_by = created_by
+    apply_send_result(message, result, modified_by=created_by)
     message.save()
     return message
 
@@ -218,10 +314,10 @@ def submit_bulk(
     from_addr: str = "",
     dlr_level: int = 3,
     created_by=None,
-) -> tuple[str, list[OutboundMessage]]:
+) -> SubmitResult:
     """UI bulk helper: same content to many recipients (async or REST via submit_send)."""
-    items = [SendItem(to_addr=r, content=content) for r in recipients]
-    result = submit_send(
+    items = SendItems(lambda: (SendItem(to_addr=r, content=content) for r in recipients))
+    return submit_send(
         workspace=workspace,
         jasmin_user=jasmin_user,
         items=items,
@@ -229,14 +325,37 @@ def submit_bulk(
         dlr_level=dlr_level,
         created_by=created_by,
     )
-    return result.batch_id, result.messages
+
+
+def _chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_stream_chunk() -> int:
+    return max(1, int(getattr(settings, "JOYCE_BULK_CREATE_BATCH_SIZE", 5000)))
+
+
+def batch_status_counts(batch_id: str) -> dict[str, int]:
+    """Rows per status for one batch (a single grouped query)."""
+    rows = (
+        OutboundMessage.objects.filter(batch_id=batch_id)
+        .order_by()
+        .values_list("status")
+        .annotate(n=Count("id"))
+    )
+    return {status: n for status, n in rows}
 
 
 def _create_queued_messages(
     *,
     workspace,
     jasmin_user: JasminUser,
-    items: list[SendItem],
+    items: Iterable[SendItem],
     from_addr: str,
     dlr_level: int,
     priority: int,
@@ -264,7 +383,42 @@ def _create_queued_messages(
         )
         for item in items
     ]
-    return OutboundMessage.objects.bulk_create(messages)
+    messages = OutboundMessage.objects.bulk_create(messages, batch_size=bulk_stream_chunk())
+    record_created(messages)
+    return messages
+
+
+def _plan_rest_chunks(messages: list[OutboundMessage]) -> list[tuple[list[dict], list[OutboundMessage]]]:
+    """Split messages into sendbatch payloads: (REST messages[], rows covered)."""
+    return plan_sendbatch_chunks(
+        messages,
+        same_chunk=int(getattr(settings, "JOYCE_SENDBATCH_SAME_CONTENT_CHUNK", 2000)),
+        personal_chunk=int(getattr(settings, "JOYCE_SENDBATCH_PERSONALIZED_CHUNK", 500)),
+        max_bytes=int(getattr(settings, "JOYCE_SENDBATCH_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    )
+
+
+SENDBATCH_RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def _sendbatch_with_retry(client: JasminRestClient, **kwargs):
+    """
+    POST one sendbatch chunk, retrying when Jasmin (or a proxy in front of it)
+    turned it away. Connect errors are already retried by the shared session;
+    other failures may have been accepted, so they are not resent.
+    """
+    retries = int(getattr(settings, "JOYCE_SENDBATCH_RETRIES", 2))
+    backoff = float(getattr(settings, "JOYCE_SENDBATCH_RETRY_BACKOFF", 0.5))
+    attempt = 0
+    while True:
+        result = client.sendbatch(**kwargs)
+        if result.ok or result.status_code not in SENDBATCH_RETRY_STATUSES or attempt >= retries:
+            return result
+        attempt += 1
+        logger.warning(
+            "REST sendbatch got HTTP %s, retry %s/%s", result.status_code, attempt, retries
+        )
+        time.sleep(backoff * (2 ** (attempt - 1)))
 
 
 def _submit_via_rest(
@@ -277,7 +431,12 @@ def _submit_via_rest(
     priority: int,
     connection,
 ) -> list[str]:
-    """Chunk and POST sendbatch. Returns Jasmin batch ids."""
+    """
+    Chunk and POST sendbatch. Returns Jasmin batch ids (in chunk order).
+
+    Up to JOYCE_SENDBATCH_PARALLELISM chunks are in flight at once; row
+    updates stay on the calling thread as each chunk completes.
+    """
     client = JasminRestClient(base_url=connection.rest_api_url)
     callback = dlr_callback_url()
     batch_cb = batch_callback_url()
@@ -296,181 +455,273 @@ def _submit_via_rest(
         "errback_url": batch_cb,
     }
 
-    # Group consecutive identical content for denser chunks
-    same_chunk = int(getattr(settings, "JOYCE_SENDBATCH_SAME_CONTENT_CHUNK", 2000))
-    personal_chunk = int(getattr(settings, "JOYCE_SENDBATCH_PERSONALIZED_CHUNK", 500))
+    rest_chunks = _plan_rest_chunks(messages)
+    if not rest_chunks:
+        return []
 
-    jasmin_batch_ids: list[str] = []
-    # Build message groups: same content → one REST message with many tos
-    groups: list[tuple[str, list[OutboundMessage]]] = []
-    for msg in messages:
-        if groups and groups[-1][0] == msg.content:
-            groups[-1][1].append(msg)
-        else:
-            groups.append((msg.content, [msg]))
-
-    # Flatten into REST payloads of limited size
-    rest_chunks: list[tuple[list[dict], list[OutboundMessage]]] = []
-    current_msgs: list[dict] = []
-    current_objs: list[OutboundMessage] = []
-    current_count = 0
-
-    def flush():
-        nonlocal current_msgs, current_objs, current_count
-        if current_msgs:
-            rest_chunks.append((current_msgs, current_objs))
-        current_msgs, current_objs, current_count = [], [], 0
-
-    for content, objs in groups:
-        if len(objs) == 1:
-            entry = {"to": objs[0].to_addr, "content": content}
-            limit = personal_chunk
-            if current_count + 1 > limit and current_msgs:
-                flush()
-            current_msgs.append(entry)
-            current_objs.extend(objs)
-            current_count += 1
-            if current_count >= personal_chunk:
-                flush()
-        else:
-            # Split large same-content groups
-            for i in range(0, len(objs), same_chunk):
-                part = objs[i : i + same_chunk]
-                entry = {"to": [m.to_addr for m in part], "content": content}
-                if current_msgs:
-                    flush()
-                rest_chunks.append(([entry], part))
-
-    flush()
-
-    for payload_msgs, objs in rest_chunks:
-        result = client.sendbatch(
+    buckets = buckets_for(jasmin_user, connection, connection.rest_api_url)
+
+    def send_chunk(payload_msgs):
+        # A chunk goes out once the user's quota has room for all of its messages
+        pace(buckets, count=len(payload_msgs))
+        return _sendbatch_with_retry(
+            client,
             username=jasmin_user.username,
             password=jasmin_user.password,
             messages=payload_msgs,
             globals_=globals_,
             batch_config=batch_config,
         )
-        now = timezone.now()
-        if result.ok and result.data:
-            data = result.data.get("data") or {}
-            jbid = str(data.get("batchId") or "")
-            jasmin_batch_ids.append(jbid)
-            OutboundMessage.objects.filter(pk__in=[m.pk for m in objs]).update(
-                status=OutboundMessage.STATUS_SUBMITTED,
-                jasmin_batch_id=jbid,
-                submit_response=result.text[:2000],
-                submitted_at=now,
-                error_message="",
-                modified_on=now,
-            )
-        else:
-            err = result.error or result.text or "sendbatch failed"
-            OutboundMessage.objects.filter(pk__in=[m.pk for m in objs]).update(
+
+    parallelism = max(1, int(getattr(settings, "JOYCE_SENDBATCH_PARALLELISM", 4)))
+    jasmin_batch_ids: dict[int, str] = {}
+    with ThreadPoolExecutor(
+        max_workers=min(parallelism, len(rest_chunks)), thread_name_prefix="sendbatch"
+    ) as pool:
+        futures = {
+            pool.submit(send_chunk, payload_msgs): index
+            for index, (payload_msgs, _) in enumerate(rest_chunks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            objs = rest_chunks[index][1]
+            try:
+                result = future.result()
+            except Exception as exc:
+                logger.exception("REST sendbatch chunk %s crashed", index)
+                result = JasminHttpResult(ok=False, text="", error=str(exc))
+            jbid = _record_sendbatch_result(workspace, objs, result)
+            if jbid is not None:
+                jasmin_batch_ids[index] = jbid
+
+    return [jasmin_batch_ids[index] for index in sorted(jasmin_batch_ids)]
+
+
+def _record_status(messages: list[OutboundMessage], status: str):
+    """Mirror a QuerySet.update() of ``status`` in memory and in the dashboard rollup."""
+    for message in messages:
+        message.status = status
+    record_transitions(messages)
+
+
+def _record_sendbatch_result(workspace, objs: list[OutboundMessage], result) -> Optional[str]:
+    """Write one chunk's outcome to its rows; returns the Jasmin batch id on success."""
+    now = timezone.now()
+    if result.ok and result.data:
+        data = result.data.get("data") or {}
+        jbid = str(data.get("batchId") or "")
+        OutboundMessage.objects.filter(pk__in=[m.pk for m in objs]).update(
+            status=OutboundMessage.STATUS_SUBMITTED,
+            jasmin_batch_id=jbid,
+            # One payload row for the whole chunk
+            submit_payload_id=payload_id(result.text),
+            submitted_at=now,
+            error_message="",
+            modified_on=now,
+        )
+        _record_status(objs, OutboundMessage.STATUS_SUBMITTED)
+        return jbid
+
+    err = result.error or result.text or "sendbatch failed"
+    OutboundMessage.objects.filter(pk__in=[m.pk for m in objs]).update(
+        status=OutboundMessage.STATUS_FAILED,
+        submit_payload_id=payload_id(result.text),
+        error_message=err[:2000],
+        submitted_at=now,
+        modified_on=now,
+    )
+    _record_status(objs, OutboundMessage.STATUS_FAILED)
+    logger.error("REST sendbatch failed for workspace %s: %s", workspace.id, err)
+    return None
+
+
+def submit_queued_rest_batch(batch_id: str, limit: Optional[int] = None) -> list[str]:
+    """
+    Dispatch the queued rows of a bulk batch through REST sendbatch.
+
+    Used by the Celery handoff (see submit_send(defer_rest=True)); from, DLR
+    level and priority are read back from the queued rows. Rows are loaded
+    JOYCE_BULK_CREATE_BATCH_SIZE at a time, and loading stops once ``limit``
+    rows were dispatched (the rest stay queued for the next slice).
+    """
+    queued = (
+        OutboundMessage.objects.filter(batch_id=batch_id, status=OutboundMessage.STATUS_QUEUED)
+        .select_related("workspace", "jasmin_user")
+        .order_by("id")
+    )
+    size = bulk_stream_chunk()
+    jasmin_batch_ids: list[str] = []
+    connection = None
+    last_id = 0
+    taken = 0
+    while True:
+        if limit:
+            size = min(size, limit - taken)
+            if size <= 0:
+                return jasmin_batch_ids
+        messages = list(queued.filter(id__gt=last_id)[:size])
+        if not messages:
+            return jasmin_batch_ids
+        taken += len(messages)
+        last_id = messages[-1].id
+        first = messages[0]
+        if first.jasmin_user is None:
+            OutboundMessage.objects.filter(pk__in=[m.pk for m in messages]).update(
                 status=OutboundMessage.STATUS_FAILED,
-                submit_response=result.text[:2000],
-                error_message=err[:2000],
-                submitted_at=now,
-                modified_on=now,
+                error_message="Missing Jasmin user",
+                modified_on=timezone.now(),
             )
-            logger.error("REST sendbatch failed for workspace %s: %s", workspace.id, err)
-
-    return jasmin_batch_ids
+            _record_status(messages, OutboundMessage.STATUS_FAILED)
+            continue
+        if connection is None:
+            connection = resolve_jasmin_connection(first.workspace)
+        jasmin_batch_ids.extend(
+            _submit_via_rest(
+                workspace=first.workspace,
+                jasmin_user=first.jasmin_user,
+                messages=messages,
+                from_addr=first.from_addr,
+                dlr_level=first.dlr_level,
+                priority=first.priority,
+                connection=connection,
+            )
+        )
 
 
 def submit_send(
     *,
     workspace,
     jasmin_user: JasminUser,
-    items: list[SendItem],
+    items: Iterable[SendItem],
     from_addr: str = "",
     dlr_level: int = 3,
     priority: int = 0,
     client_batch_id: str = "",
     created_by=None,
+    defer_rest: Optional[bool] = None,
 ) -> SubmitResult:
     """
     Smart submit: one item → sync single send; many → REST sendbatch if available,
-    else queue async HTTP /send (one-by-one via Celery).
+    else queue async HTTP /send (pipelined via Celery).
+
+    With ``defer_rest`` (default JOYCE_SENDBATCH_ASYNC) the REST sendbatch
+    dispatch is handed to Celery too and the result comes back queued.
+
+    Bulk items are consumed JOYCE_BULK_CREATE_BATCH_SIZE at a time: each chunk
+    is bulk-created (and, for synchronous REST, submitted) before the next one
+    is built, so memory does not grow with the number of recipients. The
+    result carries per-status counts and a preview of the first rows.
     """
-    if not items:
+    total = len(items)
+    if not total:
         raise ValueError("No messages to send")
 
     batch_id = uuid.uuid4().hex[:16]
     client_batch_id = (client_batch_id or "").strip()
 
-    if len(items) == 1:
+    if total == 1:
+        item = next(iter(items))
         msg = submit_outbound_message(
             workspace=workspace,
             jasmin_user=jasmin_user,
-            to_addr=items[0].to_addr,
-            content=items[0].content,
+            to_addr=item.to_addr,
+            content=item.content,
             from_addr=from_addr,
             dlr_level=dlr_level,
             priority=priority,
             batch_id=batch_id,
             batch_kind=OutboundMessage.BATCH_SINGLE,
             client_batch_id=client_batch_id,
-            client_message_id=items[0].client_message_id,
+            client_message_id=item.client_message_id,
             created_by=created_by,
         )
+        connection = resolve_jasmin_connection(workspace)
         return SubmitResult(
-            batch_id=batch_id,
-            mode="single",
+            batch_id=msg.batch_id,
+            mode="single_async" if msg.status == OutboundMessage.STATUS_QUEUED else "single",
             message_count=1,
             messages=[msg],
             jasmin_batch_ids=[],
             client_batch_id=client_batch_id,
+            counts={msg.status: 1},
+            throttle=estimate(buckets_for(jasmin_user, connection), 0).as_dict(),
         )
 
     connection = resolve_jasmin_connection(workspace)
-    messages = _create_queued_messages(
-        workspace=workspace,
-        jasmin_user=jasmin_user,
-        items=items,
-        from_addr=from_addr,
-        dlr_level=dlr_level,
-        priority=priority,
-        batch_id=batch_id,
-        batch_kind=OutboundMessage.BATCH_BULK,
-        client_batch_id=client_batch_id,
-        created_by=created_by,
+    if defer_rest is None:
+        defer_rest = bool(getattr(settings, "JOYCE_SENDBATCH_ASYNC", False))
+    submit_now = connection.has_rest_api and not defer_rest
+    buckets = buckets_for(
+        jasmin_user, connection, connection.rest_api_url if connection.has_rest_api else ""
     )
+    if submit_now and estimate(buckets, total).wait > throttle_max_wait():
+        # Pacing the whole batch would hold the request too long: queue it
+        submit_now = False
 
-    if connection.has_rest_api:
-        jasmin_batch_ids = _submit_via_rest(
+    def create(chunk: list[SendItem]) -> list[OutboundMessage]:
+        return _create_queued_messages(
             workspace=workspace,
             jasmin_user=jasmin_user,
-            messages=messages,
+            items=chunk,
             from_addr=from_addr,
             dlr_level=dlr_level,
             priority=priority,
-            connection=connection,
-        )
-        # Refresh from DB
-        messages = list(
-            OutboundMessage.objects.filter(batch_id=batch_id).order_by("id")
-        )
-        return SubmitResult(
             batch_id=batch_id,
-            mode="bulk_rest",
-            message_count=len(messages),
-            messages=messages,
-            jasmin_batch_ids=jasmin_batch_ids,
+            batch_kind=OutboundMessage.BATCH_BULK,
             client_batch_id=client_batch_id,
+            created_by=created_by,
         )
 
-    # Async one-by-one classic /send
-    from quark.messaging.tasks import process_bulk_http_send
+    preview: list[OutboundMessage] = []
+    jasmin_batch_ids: list[str] = []
+    if submit_now:
+        for chunk in _chunked(items, bulk_stream_chunk()):
+            messages = create(chunk)
+            if len(preview) < SUBMIT_PREVIEW_LIMIT:
+                preview.extend(messages[: SUBMIT_PREVIEW_LIMIT - len(preview)])
+            jasmin_batch_ids.extend(
+                _submit_via_rest(
+                    workspace=workspace,
+                    jasmin_user=jasmin_user,
+                    messages=messages,
+                    from_addr=from_addr,
+                    dlr_level=dlr_level,
+                    priority=priority,
+                    connection=connection,
+                )
+            )
+        # Preview rows were updated in bulk; reload just those
+        preview = list(OutboundMessage.objects.filter(pk__in=[m.pk for m in preview]).order_by("id"))
+        mode = "bulk_rest"
+    else:
+        # Workers must never see half a batch
+        with transaction.atomic():
+            for chunk in _chunked(items, bulk_stream_chunk()):
+                messages = create(chunk)
+                if len(preview) < SUBMIT_PREVIEW_LIMIT:
+                    preview.extend(messages[: SUBMIT_PREVIEW_LIMIT - len(preview)])
+
+        if connection.has_rest_api:
+            from quark.messaging.tasks import process_rest_sendbatch
+
+            dispatch(process_rest_sendbatch, batch_id, priority)
+            mode = "bulk_rest_async"
+        else:
+            # Async classic /send
+            from quark.messaging.tasks import process_bulk_http_send
+
+            dispatch(process_bulk_http_send, batch_id, priority)
+            mode = "bulk_async"
 
-    process_bulk_http_send.delay(batch_id)
     return SubmitResult(
         batch_id=batch_id,
-        mode="bulk_async",
-        message_count=len(messages),
-        messages=messages,
-        jasmin_batch_ids=[],
+        mode=mode,
+        message_count=total,
+        messages=preview,
+        jasmin_batch_ids=jasmin_batch_ids,
         client_batch_id=client_batch_id,
+        counts=batch_status_counts(batch_id) if submit_now else {OutboundMessage.STATUS_QUEUED: total},
+        throttle=estimate(buckets, 0 if submit_now else total).as_dict(),
     )
 
 
@@ -478,54 +729,19 @@ def apply_batch_callback(payload: dict) -> Optional[OutboundMessage]:
     """
     Update an OutboundMessage from a Jasmin REST sendbatch success/error callback.
     Parameters: batchId, to, status, statusText
-    """
-    from quark.messaging.clients import SUCCESS_MSG_ID_RE
 
-    jbid = str(payload.get("batchId") or "").strip()
-    to_addr = _normalize_msisdn(payload.get("to"))
-    status_flag = str(payload.get("status") or "").strip()
-    status_text = str(payload.get("statusText") or "")
+    Batches of callbacks go through callback_ingest.apply_batch_callbacks.
+    """
+    from quark.messaging.callback_ingest import CALLBACK_UPDATE_FIELDS, apply_callback, callback_key, resolve
 
+    jbid, to_addr = callback_key(payload)
     if not jbid or not to_addr:
         return None
 
-    message = (
-        OutboundMessage.objects.filter(jasmin_batch_id=jbid, to_addr=to_addr)
-        .order_by("-created_on")
-        .first()
-    )
-    if not message:
-        message = (
-            OutboundMessage.objects.filter(to_addr=to_addr, status=OutboundMessage.STATUS_SUBMITTED)
-            .filter(jasmin_batch_id=jbid)
-            .order_by("-created_on")
-            .first()
-        )
+    message = resolve(jbid, [to_addr]).get(to_addr)
     if not message:
         return None
 
-    match = SUCCESS_MSG_ID_RE.search(status_text)
-    if match:
-        message.jasmin_msg_id = match.group(1)
-
-    if status_flag == "1" or status_flag.lower() in ("success", "true"):
-        message.status = OutboundMessage.STATUS_SUBMITTED
-        message.error_message = ""
-    else:
-        message.status = OutboundMessage.STATUS_FAILED
-        message.error_message = status_text[:2000] or "Batch send failed"
-
-    message.submit_response = status_text[:2000]
-    if not message.submitted_at:
-        message.submitted_at = timezone.now()
-    message.save(
-        update_fields=[
-            "jasmin_msg_id",
-            "status",
-            "error_message",
-            "submit_response",
-            "submitted_at",
-            "modified_on",
-        ]
-    )
+    apply_callback(message, payload)
+    message.save(update_fields=CALLBACK_UPDATE_FIELDS)
     return message
@@ -1,6 +1,6 @@
 #
 #  Copyright (c) 2026
-#  Celery tasks for async bulk HTTP submit and external DLR forwarding.
+#  Celery tasks for async bulk submit (HTTP /send, REST sendbatch) and external DLR forwarding.
 #
 from __future__ import annotations
 
@@ -14,61 +14,156 @@ logger = logging.getLogger(__name__)
 
 
 @shared_task(name="quark.messaging.tasks.process_bulk_http_send")
-def process_bulk_http_send(batch_id: str):
-    """Submit queued bulk messages one-by-one via classic Jasmin HTTP /send."""
-    from quark.messaging.models import OutboundMessage
-    from quark.jasmin.connection import resolve_jasmin_connection
-    from quark.messaging.clients import JasminHttpClient
-    from quark.messaging.models import dlr_callback_url
-
-    qs = OutboundMessage.objects.filter(
-        batch_id=batch_id,
-        status=OutboundMessage.STATUS_QUEUED,
-    ).select_related("jasmin_user", "workspace").order_by("id")
-
-    for message in qs.iterator():
-        if not message.jasmin_user_id:
-            message.status = OutboundMessage.STATUS_FAILED
-            message.error_message = "Missing Jasmin user"
-            message.save(update_fields=["status", "error_message", "modified_on"])
-            continue
-        try:
-            connection = resolve_jasmin_connection(message.workspace)
-            client = JasminHttpClient(base_url=connection.http_api_url)
-            result = client.send(
-                username=message.jasmin_user.username,
-                password=message.jasmin_user.password,
-                to=message.to_addr,
-                content=message.content,
-                from_addr=message.from_addr or "",
-                dlr_level=int(message.dlr_level),
-                priority=int(message.priority or 0),
-                dlr_url=dlr_callback_url(),
-            )
-            message.submit_response = result.text
-            message.submitted_at = timezone.now()
-            if result.ok:
-                message.status = OutboundMessage.STATUS_SUBMITTED
-                message.jasmin_msg_id = result.message_id
-                message.error_message = ""
-            else:
-                message.status = OutboundMessage.STATUS_FAILED
-                message.error_message = result.error or result.text or "Submit failed"
-            message.save(
-                update_fields=[
-                    "submit_response",
-                    "submitted_at",
-                    "status",
-                    "jasmin_msg_id",
-                    "error_message",
-                    "modified_on",
-                ]
+def process_bulk_http_send(batch_id: str, priority: int = 0, enqueued_at: float = None):
+    """
+    Submit queued bulk messages via classic Jasmin HTTP /send.
+
+    Requests are pipelined (JOYCE_BULK_HTTP_INFLIGHT per Jasmin endpoint) and
+    statuses written back in bulk; see quark.messaging.bulk_http. One run
+    submits a slice of the batch and re-queues the rest on its priority lane
+    (see quark.messaging.lanes).
+    """
+    from quark.messaging.bulk_http import submit_queued_batch
+    from quark.messaging.lanes import dispatch, record_wait, slice_size
+
+    record_wait(priority, enqueued_at)
+    stats = submit_queued_batch(batch_id, limit=slice_size())
+    logger.info(
+        "Bulk HTTP batch %s: %s submitted, %s failed%s",
+        batch_id,
+        stats.submitted,
+        stats.failed,
+        " (more queued)" if stats.remaining else "",
+    )
+    if stats.remaining:
+        dispatch(process_bulk_http_send, batch_id, priority)
+    return stats.as_dict()
+
+
+@shared_task(name="quark.messaging.tasks.process_rest_sendbatch")
+def process_rest_sendbatch(batch_id: str, priority: int = 0, enqueued_at: float = None):
+    """Dispatch a queued bulk batch through Jasmin REST sendbatch (deferred submit), a slice per run."""
+    from quark.messaging.lanes import dispatch, has_queued, record_wait, slice_size
+    from quark.messaging.services import submit_queued_rest_batch
+
+    record_wait(priority, enqueued_at)
+    jasmin_batch_ids = submit_queued_rest_batch(batch_id, limit=slice_size())
+    logger.info("REST sendbatch for batch %s: %s chunk(s) accepted", batch_id, len(jasmin_batch_ids))
+    if has_queued(batch_id):
+        dispatch(process_rest_sendbatch, batch_id, priority)
+    return jasmin_batch_ids
+
+
+@shared_task(name="quark.messaging.tasks.drain_dlr_buffer")
+def drain_dlr_buffer():
+    """
+    Apply sendbatch callbacks, then DLRs, queued in buffered ingest mode (Redis buffers only).
+
+    Callbacks go first: they set the ``jasmin_msg_id`` a sendbatch row's DLR is matched on.
+    A tick is skipped while the previous run still holds the drain lock.
+    """
+    from quark.messaging import callback_ingest
+    from quark.messaging.dlr_ingest import MODE_BUFFERED, RedisDLRBuffer, drain_locked, get_buffer, ingest_mode
+
+    if ingest_mode() != MODE_BUFFERED:
+        return None
+    buffers = [
+        (kind, buffer)
+        for kind, mode, buffer in (
+            ("batch callback", callback_ingest.ingest_mode(), callback_ingest.get_buffer()),
+            ("DLR", ingest_mode(), get_buffer()),
+        )
+        # The local queue lives in the web process and drains itself
+        if mode == MODE_BUFFERED and isinstance(buffer, RedisDLRBuffer)
+    ]
+    if not buffers:
+        return None
+    totals = drain_locked(buffers)
+    if totals is None:
+        logger.debug("DLR drain: previous run still in progress, skipping")
+        return {"locked": True}
+    for kind, stats in totals.items():
+        if stats["batches"]:
+            logger.info(
+                "Drained %s %s(s) in %s batch(es), %s unmatched (%s kept for retry)",
+                stats["received"],
+                kind,
+                stats["batches"],
+                stats["unmatched"],
+                stats["requeued"],
             )
-        except Exception as exc:
-            logger.exception("Async bulk send failed for message %s", message.pk)
-            message.status = OutboundMessage.STATUS_FAILED
-            message.error_message = str(exc)[:2000]
-            message.save(update_fields=["status", "error_message", "modified_on"])
+    return totals
+
+
+@shared_task(name="quark.messaging.tasks.drain_batch_callback_buffer")
+def drain_batch_callback_buffer():
+    """
+    Superseded by drain_dlr_buffer, which drains callbacks before DLRs; kept so
+    tasks already queued still run.
+    """
+    return drain_dlr_buffer()
+
+
+@shared_task(name="quark.messaging.tasks.forward_pending_dlrs")
+def forward_pending_dlrs():
+    """Queue one forward_workspace_dlrs task per workspace with due external DLRs (see quark.messaging.dlr_forward)."""
+    from quark.messaging.dlr_forward import due_workspace_ids, is_forwarding
+
+    queued = 0
+    for workspace_id in due_workspace_ids():
+        # A workspace still being forwarded is picked up again on a later tick
+        if not is_forwarding(workspace_id):
+            forward_workspace_dlrs.delay(workspace_id)
+            queued += 1
+    return {"workspaces": queued}
+
+
+@shared_task(name="quark.messaging.tasks.forward_workspace_dlrs")
+def forward_workspace_dlrs(workspace_id: int):
+    """Forward one workspace's pending DLRs to its external URL in batches."""
+    from quark.messaging.dlr_forward import forward_workspace
+
+    stats = forward_workspace(workspace_id)
+    if stats and (stats["forwarded"] or stats["retrying"] or stats["gave_up"]):
+        logger.info(
+            "External DLR forward for workspace %s: %s forwarded, %s to retry, %s given up",
+            workspace_id,
+            stats["forwarded"],
+            stats["retrying"],
+            stats["gave_up"],
+        )
+    return stats
+
+
+@shared_task(name="quark.messaging.tasks.maintain_message_partitions")
+def maintain_message_partitions():
+    """
+    Create upcoming message partitions, archive messages past workspace
+    retention and purge payloads no message references any more.
+    """
+    from django.core.cache import cache
+
+    from quark.messaging.partitions import archive_expired, ensure_partitions
+    from quark.messaging.payloads import purge_stale
+
+    # A slow archive must not overlap the next run
+    if not cache.add("joyce:message_partitions:lock", 1, 6 * 3600):
+        return None
+    try:
+        created = ensure_partitions()
+        archived = archive_expired()
+        # Superseded DLR bodies pile up with or without retention
+        purged = purge_stale()
+    finally:
+        cache.delete("joyce:message_partitions:lock")
+    if created or archived or purged:
+        logger.info(
+            "Message partitions: %s created, %s message(s) archived, %s payload(s) purged",
+            len(created),
+            sum(entry["rows"] for entry in archived),
+            purged,
+        )
+    return {"created": created, "archived": archived, "purged_payloads": purged}
 
 
 @shared_task(
@@ -81,11 +176,13 @@ def forward_external_dlr(self, message_id: int, attempt: int = 1):
     """
     Fire-and-forget forward of a DLR payload to the workspace external channel URL.
     Retries up to workspace.external_dlr_max_retries with external_dlr_retry_delay_secs.
+
+    Superseded by forward_pending_dlrs; kept so tasks already queued still run.
     """
     from quark.messaging.models import OutboundMessage
 
     try:
-        message = OutboundMessage.objects.select_related("workspace").get(pk=message_id)
+        message = OutboundMessage.objects.select_related("workspace", "dlr_payload").get(pk=message_id)
     except OutboundMessage.DoesNotExist:
         logger.warning("forward_external_dlr: message %s missing", message_id)
         return
@@ -136,11 +233,3 @@ def forward_external_dlr(self, message_id: int, attempt: int = 1):
             message_id,
             attempt,
         )
-
-
-def enqueue_external_dlr_forward(message):
-    """Schedule async external DLR forward if the workspace has a channel URL."""
-    workspace = message.workspace
-    if not workspace or not (workspace.external_dlr_url or "").strip():
-        return
-    forward_external_dlr.delay(message.pk, 1)
@@ -0,0 +1,255 @@
+#
+#  Copyright (c) 2026
+#  Token-bucket admission control in front of Jasmin /send and sendbatch.
+#
+"""
+Local pacing of submits to Jasmin.
+
+Jasmin rejects a message sent less than ``1 / http_throughput`` seconds after
+the previous one of the same user ("User throughput exceeded"). Joyce used to
+fire everything and record those rejections as failed messages; now every
+submit first reserves a slot in:
+
+* a bucket per Jasmin user and Jasmin instance, refilled at the user's
+  synced ``mt_credential.quotas.http_throughput`` (times ``HEADROOM``, so
+  network jitter does not bring two sends closer than Jasmin allows), and
+* a bucket per Jasmin endpoint at ``JOYCE_JASMIN_ENDPOINT_THROUGHPUT``
+  messages/s (0 = unlimited).
+
+Buckets never refuse: a reservation returns how long to wait before sending
+(GCRA, i.e. a token bucket stored as its "theoretical arrival time"). Callers
+sleep that long, or, when a request would wait more than
+``JOYCE_THROTTLE_MAX_WAIT`` seconds, leave the message queued for a worker.
+
+Buckets live in Redis at ``JOYCE_THROTTLE_URL`` so web and Celery processes
+share them; without it (or when Redis is down) each process paces on its own.
+Users without a throughput quota are not limited.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+
+from quark.messaging.http_pool import _origin
+
+logger = logging.getLogger(__name__)
+
+REDIS_PREFIX = "joyce:throttle:"
+DEFAULT_MAX_WAIT = 5.0
+# Share of the quota actually used
+HEADROOM = 0.9
+# Messages that may go out back to back; Jasmin allows no burst
+BURST = 1
+
+# KEYS[1]: bucket; ARGV: interval, tolerance, count, max wait (< 0: unbounded), commit
+_RESERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval, tolerance = tonumber(ARGV[1]), tonumber(ARGV[2])
+local count, max_wait, commit = tonumber(ARGV[3]), tonumber(ARGV[4]), ARGV[5] == '1'
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = math.max(now, tat + count * interval)
+local wait = math.max(0, new_tat - tolerance - now)
+if max_wait >= 0 and wait > max_wait then
+  return {0, tostring(wait), tostring(tat - now)}
+end
+if commit and count ~= 0 then
+  redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+end
+return {1, tostring(wait), tostring(new_tat - now)}
+"""
+
+
+@dataclass(frozen=True)
+class Bucket:
+    key: str
+    rate: float  # messages per second
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.rate
+
+    @property
+    def tolerance(self) -> float:
+        return BURST * self.interval
+
+    def backlog(self, ahead: float) -> int:
+        """Messages reserved but not yet due, from the seconds the bucket runs ahead."""
+        return max(0, math.ceil(round(ahead / self.interval - BURST, 6)))
+
+
+@dataclass
+class Admission:
+    granted: bool = True
+    wait: float = 0.0  # seconds until the reserved messages may be sent
+    backlog: int = 0  # messages waiting in the busiest bucket, this reservation included
+    rate: Optional[float] = None  # slowest bucket, messages per second
+
+    def as_dict(self) -> dict:
+        return {
+            "rate": round(self.rate, 3) if self.rate else None,
+            "backlog": self.backlog,
+            "delay_seconds": round(self.wait, 3),
+        }
+
+
+class LocalLimiter:
+    """Buckets of this process only."""
+
+    def __init__(self):
+        self._tats: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, bucket: Bucket, count: int, max_wait: float, commit: bool = True):
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tats.get(bucket.key, now), now)
+            new_tat = max(now, tat + count * bucket.interval)
+            wait = max(0.0, new_tat - bucket.tolerance - now)
+            if 0 <= max_wait < wait:
+                return False, wait, tat - now
+            if commit and count:
+                self._tats[bucket.key] = new_tat
+            return True, wait, new_tat - now
+
+
+class RedisLimiter:
+    """Buckets shared by every process through one Lua script per reservation."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._script = None
+        self._pid = None
+
+    @property
+    def script(self):
+        # One client per process: never reuse sockets inherited across fork
+        if self._client is None or self._pid != os.getpid():
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+            self._script = self._client.register_script(_RESERVE_SCRIPT)
+            self._pid = os.getpid()
+        return self._script
+
+    def reserve(self, bucket: Bucket, count: int, max_wait: float, commit: bool = True):
+        granted, wait, ahead = self.script(
+            keys=[REDIS_PREFIX + bucket.key],
+            args=[bucket.interval, bucket.tolerance, count, max_wait, "1" if commit else "0"],
+        )
+        return bool(granted), float(wait), float(ahead)
+
+
+class Throttle:
+    def __init__(self):
+        self.local = LocalLimiter()
+        url = (getattr(settings, "JOYCE_THROTTLE_URL", "") or "").strip()
+        self.shared = RedisLimiter(url) if url else None
+
+    def reserve(self, bucket: Bucket, count: int, max_wait: float, commit: bool = True):
+        if self.shared is not None:
+            try:
+                return self.shared.reserve(bucket, count, max_wait, commit)
+            except Exception as e:
+                logger.warning("Shared throttle unavailable, pacing per process: %s", e)
+        return self.local.reserve(bucket, count, max_wait, commit)
+
+    def admit(self, buckets: list[Bucket], count: int, max_wait: Optional[float], commit: bool = True) -> Admission:
+        limit = -1.0 if max_wait is None else max(0.0, max_wait)
+        admission = Admission()
+        reserved = []
+        for bucket in buckets:
+            granted, wait, ahead = self.reserve(bucket, count, limit, commit)
+            if not granted:
+                # All or nothing: hand back what the other buckets reserved
+                for held in reserved:
+                    self.reserve(held, -count, -1.0, commit)
+                return Admission(granted=False, wait=wait, backlog=bucket.backlog(ahead), rate=bucket.rate)
+            reserved.append(bucket)
+            admission.wait = max(admission.wait, wait)
+            admission.backlog = max(admission.backlog, bucket.backlog(ahead))
+            admission.rate = min(admission.rate or bucket.rate, bucket.rate)
+        return admission
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_throttle() -> Throttle:
+    global _throttle
+    if _throttle is None:
+        with _throttle_lock:
+            if _throttle is None:
+                _throttle = Throttle()
+    return _throttle
+
+
+def max_wait() -> float:
+    """Longest a synchronous request is paced before its messages go to a worker."""
+    return max(0.0, float(getattr(settings, "JOYCE_THROTTLE_MAX_WAIT", DEFAULT_MAX_WAIT)))
+
+
+def _rate(value) -> Optional[float]:
+    # Synced quotas are floats or None; forms may leave "ND" (not defined)
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        return None
+    return rate if rate > 0 else None
+
+
+def user_throughput(jasmin_user) -> Optional[float]:
+    """The Jasmin user's HTTP throughput quota (messages/s), or None when unlimited."""
+    quotas = ((jasmin_user.mt_credential or {}) if jasmin_user is not None else {}).get("quotas") or {}
+    return _rate(quotas.get("http_throughput"))
+
+
+def buckets_for(jasmin_user, connection, endpoint_url: str = "") -> list[Bucket]:
+    """Buckets a submit of ``jasmin_user`` to ``endpoint_url`` (default HTTP /send) draws from."""
+    if not getattr(settings, "JOYCE_THROTTLE_ENABLED", True):
+        return []
+    buckets = []
+    user_rate = user_throughput(jasmin_user)
+    if user_rate:
+        buckets.append(Bucket(f"user:{connection.endpoint_key}:{jasmin_user.username}", user_rate * HEADROOM))
+    endpoint_rate = _rate(getattr(settings, "JOYCE_JASMIN_ENDPOINT_THROUGHPUT", 0))
+    if endpoint_rate:
+        buckets.append(Bucket(f"endpoint:{_origin(endpoint_url or connection.http_api_url)}", endpoint_rate))
+    return buckets
+
+
+def admit(buckets: list[Bucket], count: int = 1, max_wait: Optional[float] = None) -> Admission:
+    """
+    Reserve ``count`` messages in every bucket and return the wait before sending.
+
+    With ``max_wait``, nothing is reserved when the wait would be longer
+    (``granted`` is False and ``wait`` is the delay it would have had).
+    """
+    if not buckets:
+        return Admission()
+    return get_throttle().admit(buckets, count, max_wait)
+
+
+def pace(buckets: list[Bucket], count: int = 1) -> Admission:
+    """Reserve ``count`` messages and sleep until they may be sent."""
+    admission = admit(buckets, count)
+    if admission.wait > 0:
+        time.sleep(admission.wait)
+    return admission
+
+
+def estimate(buckets: list[Bucket], count: int = 1) -> Admission:
+    """What ``admit`` would return now for ``count`` messages, without reserving them."""
+    if not buckets:
+        return Admission()
+    return get_throttle().admit(buckets, count, None, commit=False)
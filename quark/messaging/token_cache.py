@@ -0,0 +1,240 @@
+#
+#  Copyright (c) 2026
+#  Token → workspace cache for the Joyce messaging API.
+#
+"""
+Messaging API token resolution.
+
+Tokens are looked up by their SHA-256 (``WorkSpace.messaging_api_token_hash``),
+an exact match on an indexed column, so the plaintext never reaches a query
+or a cache key. Resolved tokens are kept for ``JOYCE_API_TOKEN_CACHE_TTL``
+seconds in:
+
+* a bounded LRU per process (``JOYCE_API_TOKEN_CACHE_SIZE``) holding the
+  workspace and owner, so a warm request does no query at all, and
+* optionally Redis at ``JOYCE_API_TOKEN_CACHE_URL``, holding
+  ``(workspace id, owner id, enabled)`` so a cold worker needs one primary-key
+  lookup instead of the token search.
+
+Saving a workspace's API fields drops its token from Redis and bumps the
+token's version stamp in the Django cache (see ``WorkSpace.save``). LRU
+entries remember the stamp they were read under, so every process drops a
+regenerated or disabled token on its next request. That needs a shared
+Django cache (``JOYCE_CACHE_URL``); without one the LRU is not used.
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+REDIS_PREFIX = "joyce:api-token:"
+DEFAULT_TTL = 30
+DEFAULT_SIZE = 4096
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest() if token else ""
+
+
+def _ttl() -> int:
+    return max(1, int(getattr(settings, "JOYCE_API_TOKEN_CACHE_TTL", DEFAULT_TTL)))
+
+
+def _version_key(token_hash: str) -> str:
+    return f"joyce:api-token:{token_hash}:version"
+
+
+def _version(token_hash: str) -> str:
+    key = _version_key(token_hash)
+    cache.add(key, uuid.uuid4().hex, timeout=None)
+    return cache.get(key)
+
+
+def _shared_django_cache() -> bool:
+    return bool((getattr(settings, "JOYCE_CACHE_URL", "") or "").strip())
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of token hash -> (workspace, owner, version stamp, expires at)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token_hash: str, version: str):
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            if entry[2] != version or entry[3] <= time.monotonic():
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+            return entry[0], entry[1]
+
+    def set(self, token_hash: str, workspace, user, version: str):
+        with self._lock:
+            self._entries[token_hash] = (workspace, user, version, time.monotonic() + _ttl())
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, token_hash: str):
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisTokenCache:
+    """Shared tier: token hash -> workspace id, owner id and enabled flag."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        # One client per process: never reuse sockets inherited across fork
+        if self._client is None or self._pid != os.getpid():
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+            self._pid = os.getpid()
+        return self._client
+
+    def get(self, token_hash: str) -> Optional[dict]:
+        raw = self.client.get(REDIS_PREFIX + token_hash)
+        return json.loads(raw) if raw else None
+
+    def set(self, token_hash: str, workspace):
+        value = {"w": workspace.pk, "u": workspace.created_by_id, "e": workspace.messaging_api_enabled}
+        self.client.setex(REDIS_PREFIX + token_hash, _ttl(), json.dumps(value))
+
+    def delete(self, token_hash: str):
+        self.client.delete(REDIS_PREFIX + token_hash)
+
+
+class TokenResolver:
+    def __init__(self):
+        self.local = LocalTokenCache(int(getattr(settings, "JOYCE_API_TOKEN_CACHE_SIZE", DEFAULT_SIZE)))
+        url = (getattr(settings, "JOYCE_API_TOKEN_CACHE_URL", "") or "").strip()
+        self.shared = RedisTokenCache(url) if url else None
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def resolve(self, token: str):
+        """(workspace, owner) for ``token``, or None when no workspace has it."""
+        token_hash = hash_token(token)
+        if not token_hash:
+            return None
+
+        # Read before the row: an invalidation racing the lookup leaves a stale stamp
+        version = _version(token_hash) if _shared_django_cache() else None
+        entry = self.local.get(token_hash, version) if version else None
+        if entry is not None:
+            self.stats["local_hits"] += 1
+            return self._copies(*entry)
+
+        workspace = self._from_shared(token_hash)
+        if workspace is not None:
+            self.stats["shared_hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            workspace = self._from_db(token_hash)
+            if workspace is None:
+                return None
+            self._shared_call("set", token_hash, workspace)
+
+        user = workspace.created_by if workspace.created_by_id else None
+        if version:
+            self.local.set(token_hash, workspace, user, version)
+        return self._copies(workspace, user)
+
+    def invalidate(self, token_hash: str):
+        if not token_hash:
+            return
+        self.local.delete(token_hash)
+        cache.set(_version_key(token_hash), uuid.uuid4().hex, timeout=None)
+        self._shared_call("delete", token_hash)
+
+    def _from_db(self, token_hash: str):
+        from quark.workspace.models import WorkSpace
+
+        return (
+            WorkSpace.objects.filter(messaging_api_token_hash=token_hash)
+            .select_related("created_by")
+            .first()
+        )
+
+    def _from_shared(self, token_hash: str):
+        from quark.workspace.models import WorkSpace
+
+        if self.shared is None:
+            return None
+        cached = self._shared_call("get", token_hash)
+        if not cached:
+            return None
+        workspace = WorkSpace.objects.filter(pk=cached["w"]).select_related("created_by").first()
+        # The row changed since it was cached: resolve it from scratch
+        if workspace is None or workspace.messaging_api_token_hash != token_hash:
+            return None
+        return workspace
+
+    def _shared_call(self, method: str, *args):
+        if self.shared is None:
+            return None
+        try:
+            return getattr(self.shared, method)(*args)
+        except Exception as e:
+            logger.warning("API token cache unavailable (%s): %s", method, e)
+            return None
+
+    @staticmethod
+    def _copies(workspace, user):
+        # Requests may annotate these instances; never share them across threads
+        return copy.copy(workspace), copy.copy(user) if user is not None else None
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> TokenResolver:
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = TokenResolver()
+    return _resolver
+
+
+def resolve_token(token: str):
+    return get_resolver().resolve(token)
+
+
+def invalidate_token_hash(token_hash: str):
+    get_resolver().invalidate(token_hash)
+
+
+def token_cache_stats() -> dict:
+    resolver = get_resolver()
+    stats = dict(resolver.stats, size=len(resolver.local))
+    lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["local_hits"] + stats["shared_hits"]) / lookups, 3) if lookups else None
+    return stats
@@ -1,16 +1,10 @@
 #
 #  Copyright (c) 2026
 #
-import csv
-from datetime import datetime, time, timedelta
-
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse
-from django.utils import timezone
-from django.utils.dateparse import parse_date
 from django.views import View
 from rest_framework import status
 from rest_framework.permissions import AllowAny
@@ -21,10 +15,19 @@ from smartmin.views import SmartCRUDL, SmartFormView, SmartReadView, SmartTempla
 import logging
 
 from quark.jasmin.models import JasminUser
+from quark.messaging.callback_ingest import buffer_callback, ingest_mode as callback_ingest_mode
 from quark.messaging.clients import JasminHttpClient
+from quark.messaging.dlr_ingest import MODE_BUFFERED, buffer_dlr, dlr_message_id, ingest_mode
+from quark.messaging.export import export_formats, export_response
 from quark.messaging.forms import BulkSendSMSForm, SendSMSForm
+from quark.messaging.message_log import (
+    InvalidCursor,
+    count_messages,
+    keyset_page,
+    outbound_message_filters,
+)
 from quark.messaging.models import OutboundMessage, dlr_callback_url
-from quark.messaging.services import submit_bulk, submit_outbound_message
+from quark.messaging.services import apply_batch_callback, submit_bulk, submit_outbound_message
 from quark.web.dashboard import operate_dashboard_stats
 from quark.web.renderers.renderers import CustomPlainTextRenderer, PlainTextRenderer
 from quark.workspace.views.base import BaseListView
@@ -38,38 +41,6 @@ MODE_CONFIGURE = "configure"
 MODE_OPERATE = "operate"
 
 
-def _aware_day_start(day):
-    dt = datetime.combine(day, time.min)
-    if timezone.is_naive(dt):
-        return timezone.make_aware(dt, timezone.get_current_timezone())
-    return dt
-
-
-def apply_outbound_message_filters(qs, params):
-    """Apply message-log filters from GET/POST query params."""
-    jasmin_user = (params.get("jasmin_user") or "").strip()
-    if jasmin_user.isdigit():
-        qs = qs.filter(jasmin_user_id=int(jasmin_user))
-
-    status_value = (params.get("status") or "").strip()
-    if status_value:
-        qs = qs.filter(status=status_value)
-
-    to_addr = (params.get("to") or "").strip()
-    if to_addr:
-        qs = qs.filter(to_addr__icontains=to_addr)
-
-    date_from = parse_date((params.get("date_from") or "").strip())
-    if date_from:
-        qs = qs.filter(created_on__gte=_aware_day_start(date_from))
-
-    date_to = parse_date((params.get("date_to") or "").strip())
-    if date_to:
-        qs = qs.filter(created_on__lt=_aware_day_start(date_to) + timedelta(days=1))
-
-    return qs
-
-
 def outbound_message_filter_querystring(params) -> str:
     """Build a querystring of active filters (no page/export)."""
     keep = ("search", "jasmin_user", "status", "to", "date_from", "date_to", "_order")
@@ -164,7 +135,7 @@ class BulkSendSMSView(WorkspacePermsMixin, SmartFormView):
         return kwargs
 
     def form_valid(self, form):
-        batch_id, submitted = submit_bulk(
+        result = submit_bulk(
             workspace=self.request.workspace,
             jasmin_user=form.cleaned_data["jasmin_user"],
             recipients=form.cleaned_data["recipients"],
@@ -173,20 +144,21 @@ class BulkSendSMSView(WorkspacePermsMixin, SmartFormView):
             dlr_level=int(form.cleaned_data["dlr_level"]),
             created_by=self.request.user,
         )
-        ok = sum(1 for m in submitted if m.status == OutboundMessage.STATUS_SUBMITTED)
-        queued = sum(1 for m in submitted if m.status == OutboundMessage.STATUS_QUEUED)
-        fail = len(submitted) - ok - queued
+        batch_id, total = result.batch_id, result.message_count
+        ok = result.counts.get(OutboundMessage.STATUS_SUBMITTED, 0)
+        queued = result.counts.get(OutboundMessage.STATUS_QUEUED, 0)
+        fail = total - ok - queued
         if queued and not ok:
             messages.success(
                 self.request,
-                f"Bulk batch {batch_id}: {queued} queued for async submit ({len(submitted)} total).",
+                f"Bulk batch {batch_id}: {queued} queued for async submit ({total} total).",
             )
         else:
             messages.success(
                 self.request,
                 f"Bulk batch {batch_id}: {ok} submitted, {fail} failed"
                 + (f", {queued} queued" if queued else "")
-                + f" ({len(submitted)} total).",
+                + f" ({total} total).",
             )
         return HttpResponseRedirect(f"{reverse('messaging.outboundmessage_list')}?search={batch_id}")
 
@@ -226,45 +198,44 @@ class OutboundMessageCRUDL(SmartCRUDL):
         add_button = False
         template_name = "messaging/message_list.html"
 
-        CSV_COLUMNS = (
-            ("created_on", "created_on"),
-            ("to_addr", "to"),
-            ("from_addr", "from"),
-            ("status", "status"),
-            ("jasmin_user", "jasmin_user"),
-            ("batch_kind", "kind"),
-            ("batch_id", "batch_id"),
-            ("client_batch_id", "client_batch_id"),
-            ("client_message_id", "client_message_id"),
-            ("jasmin_msg_id", "jasmin_msg_id"),
-            ("jasmin_batch_id", "jasmin_batch_id"),
-            ("dlr_status", "dlr_status"),
-            ("content", "content"),
-            ("error_message", "error_message"),
-            ("submitted_at", "submitted_at"),
-            ("delivered_at", "delivered_at"),
-            ("last_dlr_at", "last_dlr_at"),
-        )
-
         def get(self, request, *args, **kwargs):
-            if (request.GET.get("export") or "").strip().lower() == "csv":
-                return self.export_csv()
+            fmt = (request.GET.get("export") or "").strip().lower()
+            if fmt:
+                return self.export(fmt)
             return super().get(request, *args, **kwargs)
 
         def derive_queryset(self, **kwargs):
             qs = super().derive_queryset(**kwargs).select_related("jasmin_user")
-            return apply_outbound_message_filters(qs, self.request.GET)
+            qs, self.to_match = outbound_message_filters(qs, self.request.GET)
+            return qs
+
+        def lookup_field_orderable(self, field):
+            # Keyset pages are ranges of (created_on, id); no other order can use them
+            return field == "created_on"
+
+        def paginate_queryset(self, queryset, page_size):
+            params = self.request.GET
+            descending = self.derive_ordering() != "created_on"
+            try:
+                page = keyset_page(
+                    queryset,
+                    after=(params.get("after") or "").strip(),
+                    before=(params.get("before") or "").strip(),
+                    size=page_size,
+                    descending=descending,
+                )
+            except InvalidCursor:
+                page = keyset_page(queryset, size=page_size, descending=descending)
+            return None, page, page.object_list, page.has_next or page.has_previous
 
         def get_context_data(self, **kwargs):
             context = super().get_context_data(**kwargs)
             workspace = self.request.workspace
             context["workspace"] = workspace
             context["user"] = self.request.user
-            qs = self.derive_queryset()
-            context["status_counts"] = {
-                row["status"]: row["c"]
-                for row in qs.values("status").annotate(c=Count("id"))
-            }
+            exact = (self.request.GET.get("exact_count") or "").strip() == "1"
+            count = count_messages(self.object_list, workspace, self.request.GET, exact=exact)
+            context["status_counts"] = count.status_counts
             context["filter_jasmin_users"] = JasminUser.objects.filter(
                 group__workspace=workspace
             ).order_by("username")
@@ -277,34 +248,19 @@ class OutboundMessageCRUDL(SmartCRUDL):
                 "date_to": (self.request.GET.get("date_to") or "").strip(),
                 "search": (self.request.GET.get("search") or "").strip(),
             }
+            context["export_formats"] = export_formats()
+            context["to_match"] = getattr(self, "to_match", "")
             context["filter_query"] = outbound_message_filter_querystring(self.request.GET)
-            context["filtered_count"] = qs.count()
+            context["filtered_count"] = count.value
+            context["count_kind"] = count.kind
             return context
 
-        def export_csv(self):
-            qs = self.derive_queryset().order_by("-created_on")
-            response = HttpResponse(content_type="text/csv")
-            filename = timezone.now().strftime("joyce-messages-%Y%m%d-%H%M%S.csv")
-            response["Content-Disposition"] = f'attachment; filename="{filename}"'
-            writer = csv.writer(response)
-            writer.writerow([header for _, header in self.CSV_COLUMNS])
-
-            def fmt(value):
-                if value is None:
-                    return ""
-                if hasattr(value, "isoformat"):
-                    return value.isoformat(sep=" ", timespec="seconds")
-                return str(value)
-
-            for msg in qs.iterator(chunk_size=1000):
-                row = []
-                for attr, _header in self.CSV_COLUMNS:
-                    if attr == "jasmin_user":
-                        row.append(msg.jasmin_user.username if msg.jasmin_user_id else "")
-                    else:
-                        row.append(fmt(getattr(msg, attr, "")))
-                writer.writerow(row)
-            return response
+        def export(self, fmt):
+            gzip = (self.request.GET.get("gzip") or "").strip() == "1"
+            try:
+                return export_response(self.derive_queryset(), fmt, gzip=gzip)
+            except ValueError as exc:
+                return HttpResponse(str(exc), status=400, content_type="text/plain")
 
     class Read(WorkspacePermsMixin, SmartReadView):
         permission = "messaging.outboundmessage_read"
@@ -330,7 +286,7 @@ class OutboundMessageCRUDL(SmartCRUDL):
         template_name = "messaging/message_detail.html"
 
         def get_queryset(self):
-            return OutboundMessage.objects.filter(workspace=self.request.workspace)
+            return OutboundMessage.objects.filter(workspace=self.request.workspace).select_related("submit_payload")
 
         def get_context_data(self, **kwargs):
             context = super().get_context_data(**kwargs)
@@ -385,7 +341,8 @@ class BalanceRateView(WorkspacePermsMixin, SmartTemplateView):
 class DLRCallbackView(APIView):
     """
     Public Jasmin DLR callback. Must remain CSRF-exempt and return plain ACK/Jasmin.
-    Optionally enqueues async forward to the workspace external DLR URL.
+    Marks the DLR for forwarding when the workspace has an external DLR URL.
+    In buffered ingest mode the DLR is only queued here (see quark.messaging.dlr_ingest).
     """
 
     authentication_classes = []
@@ -400,15 +357,9 @@ class DLRCallbackView(APIView):
                 data = request.data
 
             payload = {k: data.get(k) for k in data.keys()}
-            logger.info("Received DLR: %s", payload)
-            msg_id = (
-                payload.get("id")
-                or payload.get("message_id")
-                or payload.get("msgid")
-                or ""
-            )
-            msg_id = str(msg_id).strip()
-            if msg_id:
+            logger.debug("Received DLR: %s", payload)
+            msg_id = dlr_message_id(payload)
+            if msg_id and not (ingest_mode() == MODE_BUFFERED and buffer_dlr(payload)):
                 message = (
                     OutboundMessage.objects.filter(jasmin_msg_id=msg_id)
                     .select_related("workspace")
@@ -417,15 +368,6 @@ class DLRCallbackView(APIView):
                 )
                 if message:
                     message.apply_dlr(payload)
-                    try:
-                        from quark.messaging.tasks import enqueue_external_dlr_forward
-
-                        enqueue_external_dlr_forward(message)
-                    except Exception:
-                        logger.exception(
-                            "Failed to enqueue external DLR forward for message %s",
-                            message.pk,
-                        )
 
             return Response("ACK/Jasmin", status=status.HTTP_200_OK, content_type="text/plain")
         except Exception:
@@ -441,6 +383,7 @@ class BatchCallbackView(APIView):
     """
     Public Jasmin REST sendbatch success/error callback.
     Updates jasmin_msg_id / status for matching OutboundMessage rows.
+    In buffered ingest mode the callback is only queued here (see quark.messaging.callback_ingest).
     """
 
     authentication_classes = []
@@ -457,10 +400,9 @@ class BatchCallbackView(APIView):
             # Also accept query params (Jasmin may GET)
             for k, v in request.query_params.items():
                 payload.setdefault(k, v)
-            logger.info("Received batch callback: %s", payload)
-            from quark.messaging.services import apply_batch_callback
-
-            apply_batch_callback(payload)
+            logger.debug("Received batch callback: %s", payload)
+            if not (callback_ingest_mode() == MODE_BUFFERED and buffer_callback(payload)):
+                apply_batch_callback(payload)
             return Response("ACK/Jasmin", status=status.HTTP_200_OK, content_type="text/plain")
         except Exception:
             logger.exception("Error processing batch callback")
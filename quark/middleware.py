@@ -6,6 +6,7 @@ from django.http import HttpResponseForbidden, HttpResponseRedirect
 from django.urls import reverse
 from django.utils import timezone
 
+from quark.workspace.cache import cached_workspace, remember_workspace
 from quark.workspace.models import WorkSpace, User
 
 
@@ -69,6 +70,16 @@ class WorkspaceMiddleware:
         if user.is_staff:
             workspace_id = request.headers.get(self.service_header_name, workspace_id)
 
+        # warm requests are served from the session / cache without queries
+        workspace = cached_workspace(request, workspace_id)
+        if workspace is None:
+            workspace = self.resolve_workspace(request, workspace_id)
+            remember_workspace(request, workspace_id, workspace)
+        return workspace
+
+    def resolve_workspace(self, request, workspace_id):
+        user = request.user
+
         if workspace_id:
             workspace = (WorkSpace.objects.filter(is_active=True, id=workspace_id)
                          .select_related(*self.select_related).first())
@@ -78,8 +89,8 @@ class WorkspaceMiddleware:
                 return workspace
 
         # otherwise if user only belongs to one workspace, we can use that
-        user_workspaces = User.get_workspaces_for_request(request)
-        if user_workspaces.count() == 1:
+        user_workspaces = list(User.get_workspaces_for_request(request).select_related(*self.select_related)[:2])
+        if len(user_workspaces) == 1:
             return user_workspaces[0]
 
         return None
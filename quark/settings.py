@@ -100,6 +100,19 @@ WSGI_APPLICATION = 'quark.wsgi.application'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
 
+# Cache shared by all web/worker processes. Set JOYCE_CACHE_URL (redis://...) in
+# multi-process deployments so invalidations (workspace resolution, locks) are
+# seen everywhere; without it each process keeps its own memory cache. Celery
+# task locks and the Jasmin user sync back-off need it.
+JOYCE_CACHE_URL = os.getenv("JOYCE_CACHE_URL", "")
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": JOYCE_CACHE_URL}
+        if JOYCE_CACHE_URL
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -215,6 +228,30 @@ JASMIN_PERSIST = True
 # to complete before giving up with an error.
 JASMIN_PB_TIMEOUT = int(os.getenv("JASMIN_PB_TIMEOUT", "30"))
 
+# Jasmin user sync cron (quark.crons.jasmin_user_sync): every endpoint's
+# user_get_all runs concurrently, each bounded by the timeout. Endpoints that
+# fail or answer slower than SLOW_SECS are skipped for BACKOFF_SECS, doubling
+# up to BACKOFF_MAX_SECS.
+JOYCE_JASMIN_USER_SYNC_TIMEOUT = float(os.getenv("JOYCE_JASMIN_USER_SYNC_TIMEOUT", "20"))
+JOYCE_JASMIN_USER_SYNC_SLOW_SECS = float(os.getenv("JOYCE_JASMIN_USER_SYNC_SLOW_SECS", "10"))
+JOYCE_JASMIN_USER_SYNC_BACKOFF_SECS = int(os.getenv("JOYCE_JASMIN_USER_SYNC_BACKOFF_SECS", "60"))
+JOYCE_JASMIN_USER_SYNC_BACKOFF_MAX_SECS = int(os.getenv("JOYCE_JASMIN_USER_SYNC_BACKOFF_MAX_SECS", "1800"))
+
+# Router/SMPP PB sessions are pooled per Jasmin endpoint (see quark.jasmin.pb_pool).
+# Set JASMIN_PB_POOL_MAX_SESSIONS=0 to go back to connect-per-operation.
+JASMIN_PB_POOL_MAX_SESSIONS = int(os.getenv("JASMIN_PB_POOL_MAX_SESSIONS", "4"))
+JASMIN_PB_POOL_IDLE_SECS = int(os.getenv("JASMIN_PB_POOL_IDLE_SECS", "300"))
+JASMIN_PB_POOL_KEEPALIVE_SECS = int(os.getenv("JASMIN_PB_POOL_KEEPALIVE_SECS", "60"))
+# A lease held this long is stuck on a hung broker (its caller gave up after
+# JASMIN_PB_TIMEOUT): the session is dropped so it cannot pin a pool slot.
+JASMIN_PB_POOL_LEASE_SECS = int(os.getenv("JASMIN_PB_POOL_LEASE_SECS", "90"))
+
+# How long (seconds) batched SMPP connector statuses are cached per Jasmin endpoint.
+JASMIN_CONNECTOR_STATUS_TTL = int(os.getenv("JASMIN_CONNECTOR_STATUS_TTL", "10"))
+
+# Resolved Jasmin connections cached per workspace in each process (see quark.jasmin.connection).
+JASMIN_CONNECTION_CACHE_SIZE = int(os.getenv("JASMIN_CONNECTION_CACHE_SIZE", "1024"))
+
 # Jasmin HTTP API (default port 1401) used for /send, /balance, /rate
 JASMIN_HTTP_API_URL = os.getenv(
     "JASMIN_HTTP_API_URL",
@@ -222,6 +259,12 @@ JASMIN_HTTP_API_URL = os.getenv(
 )
 JASMIN_HTTP_API_TIMEOUT = float(os.getenv("JASMIN_HTTP_API_TIMEOUT", "15"))
 
+# Shared keep-alive sessions for the Jasmin HTTP / REST APIs: connections kept
+# per host, and retries (with exponential backoff) on connect errors only
+JOYCE_HTTP_POOL_MAXSIZE = int(os.getenv("JOYCE_HTTP_POOL_MAXSIZE", "16"))
+JOYCE_HTTP_CONNECT_RETRIES = int(os.getenv("JOYCE_HTTP_CONNECT_RETRIES", "2"))
+JOYCE_HTTP_RETRY_BACKOFF = float(os.getenv("JOYCE_HTTP_RETRY_BACKOFF", "0.2"))
+
 # Jasmin RESTful API (default port 8080) used for /secure/sendbatch
 JASMIN_REST_API_URL = os.getenv(
     "JASMIN_REST_API_URL",
@@ -231,6 +274,46 @@ JASMIN_REST_API_URL = os.getenv(
 # Chunk sizes for REST sendbatch
 JOYCE_SENDBATCH_SAME_CONTENT_CHUNK = int(os.getenv("JOYCE_SENDBATCH_SAME_CONTENT_CHUNK", "2000"))
 JOYCE_SENDBATCH_PERSONALIZED_CHUNK = int(os.getenv("JOYCE_SENDBATCH_PERSONALIZED_CHUNK", "500"))
+# Upper bound on the serialized messages[] of one sendbatch request
+JOYCE_SENDBATCH_MAX_BYTES = int(os.getenv("JOYCE_SENDBATCH_MAX_BYTES", str(512 * 1024)))
+# sendbatch chunks posted concurrently, retries (with backoff) when Jasmin
+# answers 429/502/503/504, and whether bulk REST submits go to Celery by default
+JOYCE_SENDBATCH_PARALLELISM = int(os.getenv("JOYCE_SENDBATCH_PARALLELISM", "4"))
+JOYCE_SENDBATCH_RETRIES = int(os.getenv("JOYCE_SENDBATCH_RETRIES", "2"))
+JOYCE_SENDBATCH_RETRY_BACKOFF = float(os.getenv("JOYCE_SENDBATCH_RETRY_BACKOFF", "0.5"))
+JOYCE_SENDBATCH_ASYNC = os.getenv("JOYCE_SENDBATCH_ASYNC", "False").lower() in ("1", "true", "yes", "y", "on")
+
+# Bulk submits are created (and, over REST, sent) this many rows at a time
+JOYCE_BULK_CREATE_BATCH_SIZE = int(os.getenv("JOYCE_BULK_CREATE_BATCH_SIZE", "5000"))
+
+# Async bulk over HTTP /send (no REST API): concurrent requests per Jasmin
+# endpoint, and how many results are written back per bulk UPDATE
+JOYCE_BULK_HTTP_INFLIGHT = int(os.getenv("JOYCE_BULK_HTTP_INFLIGHT", "16"))
+JOYCE_BULK_HTTP_FLUSH_EVERY = int(os.getenv("JOYCE_BULK_HTTP_FLUSH_EVERY", "200"))
+
+# Admission control before Jasmin (see quark.messaging.throttle): sends are paced by
+# each Jasmin user's synced http_throughput quota and by an optional per-endpoint
+# rate (messages/s, 0 = unlimited). A request that would be paced longer than
+# JOYCE_THROTTLE_MAX_WAIT seconds is queued for the workers instead. Buckets are
+# shared through Redis at JOYCE_THROTTLE_URL, or kept per process when empty.
+JOYCE_THROTTLE_ENABLED = os.getenv("JOYCE_THROTTLE_ENABLED", "True").lower() in ("1", "true", "yes", "y", "on")
+JOYCE_THROTTLE_URL = os.getenv("JOYCE_THROTTLE_URL", "")
+JOYCE_THROTTLE_MAX_WAIT = float(os.getenv("JOYCE_THROTTLE_MAX_WAIT", "5"))
+JOYCE_JASMIN_ENDPOINT_THROUGHPUT = float(os.getenv("JOYCE_JASMIN_ENDPOINT_THROUGHPUT", "0"))
+
+# Queued batches are submitted this many messages per Celery task run; the rest is
+# re-queued on the batch's priority lane so urgent sends can run in between.
+JOYCE_DISPATCH_SLICE_SIZE = int(os.getenv("JOYCE_DISPATCH_SLICE_SIZE", "2000"))
+
+# Message log counts are approximate (rollup or planner estimate); where neither
+# applies, rows are counted up to this cap and shown as "more than".
+JOYCE_LOG_COUNT_CAP = int(os.getenv("JOYCE_LOG_COUNT_CAP", "10000"))
+
+# Monthly partitions of the message table (PostgreSQL, see quark.messaging.partitions)
+# are created this many months ahead; messages past a workspace's retention are
+# archived as gzipped JSONL under MEDIA_ROOT/JOYCE_MESSAGE_ARCHIVE_DIR.
+JOYCE_MESSAGE_PARTITIONS_AHEAD = int(os.getenv("JOYCE_MESSAGE_PARTITIONS_AHEAD", "3"))
+JOYCE_MESSAGE_ARCHIVE_DIR = os.getenv("JOYCE_MESSAGE_ARCHIVE_DIR", "message_archive")
 
 # Public base URL Joyce advertises to Jasmin for DLR callbacks.
 # When Jasmin runs in Docker and Joyce on the host, use host.docker.internal.
@@ -240,6 +323,60 @@ JOYCE_PUBLIC_BASE_URL = os.getenv(
 )
 JOYCE_DLR_CALLBACK_URL = os.getenv("JOYCE_DLR_CALLBACK_URL", "")
 
+# DLR ingestion: "sync" applies each DLR inside the /dlr request, "buffered"
+# queues it and applies DLRs in batches. The buffer is a Redis list at
+# JOYCE_DLR_BUFFER_URL (drained by Celery beat) or, when empty, an in-process queue.
+JOYCE_DLR_INGEST_MODE = os.getenv("JOYCE_DLR_INGEST_MODE", "sync")
+JOYCE_DLR_BUFFER_URL = os.getenv("JOYCE_DLR_BUFFER_URL", "")
+JOYCE_DLR_BATCH_SIZE = int(os.getenv("JOYCE_DLR_BATCH_SIZE", "500"))
+JOYCE_DLR_DRAIN_INTERVAL_SECS = float(os.getenv("JOYCE_DLR_DRAIN_INTERVAL_SECS", "1"))
+# DLRs that match no message yet (a sendbatch row whose callback is still
+# queued) are retried for this long before being dropped.
+JOYCE_DLR_UNMATCHED_RETRY_SECS = int(os.getenv("JOYCE_DLR_UNMATCHED_RETRY_SECS", "600"))
+# One drain runs at a time (a cache lock, shared through JOYCE_CACHE_URL); a
+# run stops after half this long and the lock expires after it.
+JOYCE_DLR_DRAIN_LOCK_SECS = int(os.getenv("JOYCE_DLR_DRAIN_LOCK_SECS", "300"))
+# Same for Jasmin sendbatch callbacks (/batch-callback), using the same buffer
+# URL, batch size and drain task (callbacks first); empty follows
+# JOYCE_DLR_INGEST_MODE, and buffering needs buffered DLRs.
+JOYCE_BATCH_CALLBACK_INGEST_MODE = os.getenv("JOYCE_BATCH_CALLBACK_INGEST_MODE", "")
+
+# Forwarding to workspace external DLR URLs: how often pending DLRs are sent,
+# and how many go per batch (per JSON array in array mode)
+JOYCE_EXTERNAL_DLR_FORWARD_INTERVAL_SECS = float(os.getenv("JOYCE_EXTERNAL_DLR_FORWARD_INTERVAL_SECS", "5"))
+JOYCE_EXTERNAL_DLR_BATCH_SIZE = int(os.getenv("JOYCE_EXTERNAL_DLR_BATCH_SIZE", "200"))
+# Each beat tick queues one forward task per workspace; a task stops after this
+# many rows or after starting requests for this many seconds, leaving the rest due.
+JOYCE_EXTERNAL_DLR_MAX_ROWS_PER_RUN = int(os.getenv("JOYCE_EXTERNAL_DLR_MAX_ROWS_PER_RUN", "1000"))
+JOYCE_EXTERNAL_DLR_RUN_SECS = float(os.getenv("JOYCE_EXTERNAL_DLR_RUN_SECS", "120"))
+
+# Messaging API token cache (see quark.messaging.token_cache): per-process LRU
+# (only with JOYCE_CACHE_URL, which carries its invalidations), plus an optional
+# Redis tier shared by all web workers.
+JOYCE_API_TOKEN_CACHE_TTL = int(os.getenv("JOYCE_API_TOKEN_CACHE_TTL", "30"))
+JOYCE_API_TOKEN_CACHE_SIZE = int(os.getenv("JOYCE_API_TOKEN_CACHE_SIZE", "4096"))
+JOYCE_API_TOKEN_CACHE_URL = os.getenv("JOYCE_API_TOKEN_CACHE_URL", "")
+
+# How long (seconds) a resolved workspace row is cached for WorkspaceMiddleware.
+# Membership and workspace saves invalidate it immediately (see quark.workspace.cache).
+JOYCE_WORKSPACE_CACHE_TTL = int(os.getenv("JOYCE_WORKSPACE_CACHE_TTL", "300"))
+
+# Native async messaging send view (quark.api.v1.messaging.AsyncMessagingSendView).
+# On by default under ASGI (quark/asgi.py), e.g.
+#   uvicorn quark.asgi:application --workers 4
+# Async /send connections per Jasmin endpoint and event loop, and how many
+# message rows are coalesced into one INSERT / UPDATE (or after how many ms).
+JOYCE_ASYNC_SEND_API = os.getenv("JOYCE_ASYNC_SEND_API", "False").lower() in ("1", "true", "yes", "y", "on")
+JOYCE_ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("JOYCE_ASYNC_HTTP_MAX_CONNECTIONS", "1000"))
+JOYCE_ASYNC_HTTP_KEEPALIVE = int(os.getenv("JOYCE_ASYNC_HTTP_KEEPALIVE", "200"))
+JOYCE_ASYNC_WRITE_BATCH = int(os.getenv("JOYCE_ASYNC_WRITE_BATCH", "200"))
+JOYCE_ASYNC_WRITE_DELAY_MS = int(os.getenv("JOYCE_ASYNC_WRITE_DELAY_MS", "5"))
+
+# Sending Jasmin users cached per process for the messaging API (see quark.jasmin.user_cache).
+# Changes reach other processes through JOYCE_CACHE_URL; entries expire after the TTL regardless.
+JOYCE_JASMIN_USER_CACHE_SIZE = int(os.getenv("JOYCE_JASMIN_USER_CACHE_SIZE", "2048"))
+JOYCE_JASMIN_USER_CACHE_TTL = int(os.getenv("JOYCE_JASMIN_USER_CACHE_TTL", "60"))
+
 # Fernet key for encrypting workspace Jasmin PB passwords at rest.
 # python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
 JOYCE_CREDENTIALS_KEY = os.getenv("JOYCE_CREDENTIALS_KEY", "").strip()
@@ -264,12 +401,29 @@ CELERY_IMPORTS = (
     "quark.crons.jasmin_user_sync",
     "quark.messaging.tasks",
 )
+# With Redis, workers poll queues in order (default queue, then the most urgent
+# priority lane first, see quark/celery.py) and reserve one task at a time, so
+# slices of a big low-priority batch never sit prefetched in front of urgent work.
+CELERY_BROKER_TRANSPORT_OPTIONS = {"queue_order_strategy": "priority"}
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_WORKER_PREFETCH_MULTIPLIER", "1"))
 # Beat ticks every minute; each workspace's jasmin_user_sync_interval_mins gates work.
 CELERY_BEAT_SCHEDULE = {
     "sync-jasmin-users": {
         "task": "quark.crons.jasmin_user_sync.sync_jasmin_users",
         "schedule": 60.0,
     },
+    "drain-dlr-buffer": {
+        "task": "quark.messaging.tasks.drain_dlr_buffer",
+        "schedule": JOYCE_DLR_DRAIN_INTERVAL_SECS,
+    },
+    "forward-pending-dlrs": {
+        "task": "quark.messaging.tasks.forward_pending_dlrs",
+        "schedule": JOYCE_EXTERNAL_DLR_FORWARD_INTERVAL_SECS,
+    },
+    "maintain-message-partitions": {
+        "task": "quark.messaging.tasks.maintain_message_partitions",
+        "schedule": 6 * 3600.0,
+    },
 }
 
 SMARTMIN_DEFAULT_MESSAGES = True
@@ -6,8 +6,8 @@ from __future__ import annotations
 
 from datetime import timedelta
 
-from django.db.models import Count, Q
-from django.db.models.functions import TruncDate
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from quark.jasmin.models import (
@@ -19,7 +19,7 @@ from quark.jasmin.models import (
     JasminSMPPConnector,
     JasminUser,
 )
-from quark.messaging.models import OutboundMessage
+from quark.messaging.models import MessageStatRollup, OutboundMessage
 
 _FAIL_STATUSES = (
     OutboundMessage.STATUS_FAILED,
@@ -36,34 +36,37 @@ def _delivery_rate(delivered: int, failed: int):
 
 
 def operate_dashboard_stats(workspace) -> dict:
-    """Business-side outbound SMS metrics for the Operate dashboard."""
-    qs = OutboundMessage.objects.filter(workspace=workspace)
-    now = timezone.now()
-    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    """
+    Business-side outbound SMS metrics for the Operate dashboard.
+
+    Counts come from MessageStatRollup (see quark.messaging.rollup), so the cost
+    depends on days × users × statuses, not on the size of the message log.
+    """
+    qs = MessageStatRollup.objects.filter(workspace=workspace)
+    today = timezone.localdate(timezone=workspace.timezone)
     week_ago = today - timedelta(days=6)
     series_start = today - timedelta(days=13)
+    total = Coalesce(Sum("count"), 0)
+
+    def count(*conditions, **filters):
+        return Coalesce(Sum("count", filter=Q(*conditions, **filters)), 0)
+
     fail_q = Q(status__in=_FAIL_STATUSES)
 
     totals = qs.aggregate(
-        total=Count("id"),
-        submitted=Count("id", filter=Q(status=OutboundMessage.STATUS_SUBMITTED)),
-        acked=Count("id", filter=Q(status=OutboundMessage.STATUS_ACKED)),
-        delivered=Count("id", filter=Q(status=OutboundMessage.STATUS_DELIVERED)),
-        failed=Count("id", filter=fail_q),
-        today=Count("id", filter=Q(created_on__gte=today)),
-        today_delivered=Count(
-            "id",
-            filter=Q(created_on__gte=today, status=OutboundMessage.STATUS_DELIVERED),
-        ),
-        today_failed=Count("id", filter=Q(created_on__gte=today) & fail_q),
-        week=Count("id", filter=Q(created_on__gte=week_ago)),
-        week_delivered=Count(
-            "id",
-            filter=Q(created_on__gte=week_ago, status=OutboundMessage.STATUS_DELIVERED),
-        ),
-        week_failed=Count("id", filter=Q(created_on__gte=week_ago) & fail_q),
-        bulk=Count("id", filter=Q(batch_kind=OutboundMessage.BATCH_BULK)),
-        single=Count("id", filter=Q(batch_kind=OutboundMessage.BATCH_SINGLE)),
+        total=total,
+        submitted=count(status=OutboundMessage.STATUS_SUBMITTED),
+        acked=count(status=OutboundMessage.STATUS_ACKED),
+        delivered=count(status=OutboundMessage.STATUS_DELIVERED),
+        failed=count(fail_q),
+        today=count(day__gte=today),
+        today_delivered=count(day__gte=today, status=OutboundMessage.STATUS_DELIVERED),
+        today_failed=count(fail_q, day__gte=today),
+        week=count(day__gte=week_ago),
+        week_delivered=count(day__gte=week_ago, status=OutboundMessage.STATUS_DELIVERED),
+        week_failed=count(fail_q, day__gte=week_ago),
+        bulk=count(batch_kind=OutboundMessage.BATCH_BULK),
+        single=count(batch_kind=OutboundMessage.BATCH_SINGLE),
     )
 
     delivery_rate = _delivery_rate(totals.get("delivered") or 0, totals.get("failed") or 0)
@@ -71,48 +74,36 @@ def operate_dashboard_stats(workspace) -> dict:
         totals.get("week_delivered") or 0, totals.get("week_failed") or 0
     )
 
-    status_rows = list(qs.values("status").annotate(c=Count("id")).order_by("-c"))
+    status_rows = [
+        row
+        for row in qs.values("status").annotate(c=total).order_by("-c")
+        if row["c"] > 0
+    ]
 
-    daily_raw = {
-        row["day"]: row["c"]
+    by_day = {
+        row["day"]: row
         for row in (
-            qs.filter(created_on__gte=series_start)
-            .annotate(day=TruncDate("created_on"))
+            qs.filter(day__gte=series_start)
             .values("day")
-            .annotate(c=Count("id"))
+            .annotate(
+                c=total,
+                delivered=count(status=OutboundMessage.STATUS_DELIVERED),
+                failed=count(fail_q),
+            )
         )
-        if row["day"] is not None
     }
     daily_series = []
+    daily_outcomes = []
     for offset in range(13, -1, -1):
-        day = (today - timedelta(days=offset)).date()
+        day = today - timedelta(days=offset)
+        row = by_day.get(day) or {}
         daily_series.append(
             {
                 "date": day.isoformat(),
                 "label": day.strftime("%b %d"),
-                "count": daily_raw.get(day, 0),
+                "count": row.get("c") or 0,
             }
         )
-
-    outcome_by_day = {
-        row["day"]: row
-        for row in (
-            qs.filter(created_on__gte=series_start)
-            .annotate(day=TruncDate("created_on"))
-            .values("day")
-            .annotate(
-                delivered=Count(
-                    "id", filter=Q(status=OutboundMessage.STATUS_DELIVERED)
-                ),
-                failed=Count("id", filter=fail_q),
-            )
-        )
-        if row["day"] is not None
-    }
-    daily_outcomes = []
-    for offset in range(13, -1, -1):
-        day = (today - timedelta(days=offset)).date()
-        row = outcome_by_day.get(day) or {}
         daily_outcomes.append(
             {
                 "date": day.isoformat(),
@@ -122,41 +113,42 @@ def operate_dashboard_stats(workspace) -> dict:
             }
         )
 
-    user_rows = []
-    for row in (
-        qs.values("jasmin_user_id", "jasmin_user__username")
-        .annotate(
-            total=Count("id"),
-            today=Count("id", filter=Q(created_on__gte=today)),
-            week=Count("id", filter=Q(created_on__gte=week_ago)),
-            delivered=Count("id", filter=Q(status=OutboundMessage.STATUS_DELIVERED)),
-            failed=Count("id", filter=fail_q),
-            bulk=Count("id", filter=Q(batch_kind=OutboundMessage.BATCH_BULK)),
-            single=Count("id", filter=Q(batch_kind=OutboundMessage.BATCH_SINGLE)),
-        )
-        .order_by("-week", "-total")[:25]
+    usernames = dict(
+        JasminUser.objects.filter(group__workspace=workspace).values_list("id", "username")
+    )
+    user_fields = ("total", "today", "week", "delivered", "failed", "bulk", "single")
+    per_user: dict[str, dict] = {}
+    for row in qs.values("jasmin_user_key").annotate(
+        total=total,
+        today=count(day__gte=today),
+        week=count(day__gte=week_ago),
+        delivered=count(status=OutboundMessage.STATUS_DELIVERED),
+        failed=count(fail_q),
+        bulk=count(batch_kind=OutboundMessage.BATCH_BULK),
+        single=count(batch_kind=OutboundMessage.BATCH_SINGLE),
     ):
-        username = row["jasmin_user__username"] or "Unassigned"
-        rate = _delivery_rate(row["delivered"] or 0, row["failed"] or 0)
-        user_rows.append(
-            {
-                "username": username,
-                "total": row["total"] or 0,
-                "today": row["today"] or 0,
-                "week": row["week"] or 0,
-                "delivered": row["delivered"] or 0,
-                "failed": row["failed"] or 0,
-                "bulk": row["bulk"] or 0,
-                "single": row["single"] or 0,
-                "delivery_rate": rate,
-            }
+        if not row["total"]:
+            continue
+        # Deleted users' rows fold into "Unassigned", as their messages do
+        username = usernames.get(row["jasmin_user_key"]) or "Unassigned"
+        merged = per_user.setdefault(
+            username, {"username": username, **{key: 0 for key in user_fields}}
         )
+        for key in user_fields:
+            merged[key] += row[key] or 0
 
-    active_users_week = (
-        qs.filter(created_on__gte=week_ago, jasmin_user_id__isnull=False)
-        .values("jasmin_user_id")
-        .distinct()
-        .count()
+    user_rows = sorted(per_user.values(), key=lambda u: (u["week"], u["total"]), reverse=True)[:25]
+    for row in user_rows:
+        row["delivery_rate"] = _delivery_rate(row["delivered"], row["failed"])
+
+    active_users_week = len(
+        {
+            key
+            for key, c in qs.filter(day__gte=week_ago, jasmin_user_key__in=list(usernames))
+            .values_list("jasmin_user_key")
+            .annotate(c=total)
+            if c > 0
+        }
     )
     enabled_users = JasminUser.objects.filter(
         group__workspace=workspace, enabled=True
@@ -176,7 +168,10 @@ def operate_dashboard_stats(workspace) -> dict:
         "user_week": [u["week"] for u in user_rows[:10]],
     }
 
-    recent = list(qs.select_related("jasmin_user")[:8])
+    # Latest rows only: served by the (workspace, -created_on) index
+    recent = list(
+        OutboundMessage.objects.filter(workspace=workspace).select_related("jasmin_user")[:8]
+    )
 
     return {
         "totals": totals,
@@ -0,0 +1,126 @@
+#
+#  Copyright (c) 2026
+#  Cached workspace resolution for WorkspaceMiddleware.
+#
+"""
+Session-scoped workspace resolution.
+
+After ``WorkspaceMiddleware`` resolves a workspace from the database, the
+session remembers ``(requested id, user, membership, versions)`` and the
+workspace row is kept in the Django cache. Later requests rebuild
+``request.workspace`` from one ``cache.get_many`` and no query.
+
+Two version stamps guard the entry:
+
+* the workspace version, bumped by ``WorkSpace.save`` (activation included)
+  and by membership changes in that workspace, queryset deletes included;
+* the user version, bumped when the user joins or leaves any workspace, since
+  that changes the "only one workspace" fallback, and on ``User.save``
+  (``is_staff`` grants any workspace).
+
+``QuerySet.update()`` on workspaces sends no signal: call ``bump_workspace``
+next to it.
+
+A stale stamp, or a workspace evicted from the cache, sends the request back
+through the database path.
+"""
+from __future__ import annotations
+
+import uuid
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+SESSION_KEY = "workspace_resolution"
+DEFAULT_TTL = 300
+
+
+def _workspace_version_key(workspace_id) -> str:
+    return f"joyce:workspace:{workspace_id}:version"
+
+
+def _workspace_key(workspace_id) -> str:
+    return f"joyce:workspace:{workspace_id}:row"
+
+
+def _user_version_key(user_id) -> str:
+    return f"joyce:workspace-user:{user_id}:version"
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "JOYCE_WORKSPACE_CACHE_TTL", DEFAULT_TTL))
+
+
+def _version(key: str) -> str:
+    cache.add(key, uuid.uuid4().hex, timeout=None)
+    return cache.get(key)
+
+
+def bump_workspace(workspace_id):
+    if workspace_id is None:
+        return
+    cache.set(_workspace_version_key(workspace_id), uuid.uuid4().hex, timeout=None)
+    cache.delete(_workspace_key(workspace_id))
+
+
+def bump_user(user_id):
+    if user_id is not None:
+        cache.set(_user_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def cached_workspace(request, requested_id) -> Optional[object]:
+    """The workspace remembered for this session, if every stamp still matches."""
+    entry = request.session.get(SESSION_KEY)
+    if not entry or entry.get("user") != request.user.pk or entry.get("requested") != requested_id:
+        return None
+
+    workspace_id = entry["workspace"]
+    keys = (_workspace_version_key(workspace_id), _workspace_key(workspace_id), _user_version_key(request.user.pk))
+    found = cache.get_many(keys)
+    row = found.get(keys[1])
+    if (
+        row is None
+        or found.get(keys[0]) != entry["workspace_version"]
+        or row[0] != entry["workspace_version"]
+        or found.get(keys[2]) != entry["user_version"]
+    ):
+        return None
+
+    workspace = row[1]
+    membership = entry.get("membership")
+    if membership:
+        from quark.workspace.models import WorkSpaceMembership
+
+        membership_id, role_code = membership
+        workspace._membership_cache[request.user] = WorkSpaceMembership(
+            id=membership_id, workspace=workspace, user_id=request.user.pk, role_code=role_code
+        )
+    return workspace
+
+
+def remember_workspace(request, requested_id, workspace):
+    """Store a database-resolved workspace for the following requests of this session."""
+    if workspace is None:
+        request.session.pop(SESSION_KEY, None)
+        return
+
+    workspace_version = _version(_workspace_version_key(workspace.pk))
+    user_version = _version(_user_version_key(request.user.pk))
+    membership = workspace.get_membership(request.user)
+
+    # Cache the row without per-request state
+    memberships, workspace._membership_cache = workspace._membership_cache, {}
+    try:
+        cache.set(_workspace_key(workspace.pk), (workspace_version, workspace), _ttl())
+    finally:
+        workspace._membership_cache = memberships
+
+    request.session[SESSION_KEY] = {
+        "requested": requested_id,
+        "user": request.user.pk,
+        "workspace": workspace.pk,
+        "workspace_version": workspace_version,
+        "user_version": user_version,
+        "membership": [membership.pk, membership.role_code] if membership else None,
+    }
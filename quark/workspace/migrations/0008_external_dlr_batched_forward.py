@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0007_alter_workspace_jasmin_rest_api_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='external_dlr_batch',
+            field=models.BooleanField(default=False, help_text='POST pending DLRs to the external URL as one JSON array instead of one request each.'),
+        ),
+    ]
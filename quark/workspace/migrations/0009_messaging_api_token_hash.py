@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    """Hash existing messaging API tokens so they keep authenticating."""
+    WorkSpace = apps.get_model("workspace", "WorkSpace")
+    for workspace in WorkSpace.objects.exclude(messaging_api_token="").only("id", "messaging_api_token"):
+        token_hash = hashlib.sha256(workspace.messaging_api_token.encode("utf-8")).hexdigest()
+        WorkSpace.objects.filter(pk=workspace.pk).update(messaging_api_token_hash=token_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0008_external_dlr_batched_forward'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='messaging_api_token_hash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA-256 of messaging_api_token; API requests are authenticated against this.', max_length=64),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspace', '0009_messaging_api_token_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='message_retention_months',
+            field=models.PositiveIntegerField(default=0, help_text='Months of messages kept before the current one; older messages are archived to a compressed file and removed from the message log. 0 keeps them forever.'),
+        ),
+    ]
@@ -23,6 +23,8 @@ from enum import Enum
 import uuid
 
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django_countries.fields import CountryField
@@ -30,6 +32,13 @@ from timezone_field import TimeZoneField
 from django.contrib.auth.models import Group, Permission, AbstractUser
 from smartmin.models import SmartModel
 
+from quark.jasmin.connection import CONNECTION_FIELDS, invalidate_jasmin_connection
+from quark.messaging.token_cache import hash_token, invalidate_token_hash
+from quark.workspace.cache import bump_user, bump_workspace
+
+# Fields that change who may authenticate with the messaging API token
+MESSAGING_API_FIELDS = ("messaging_api_enabled", "messaging_api_token")
+
 
 class User(AbstractUser):
     """
@@ -72,6 +81,11 @@ class User(AbstractUser):
     def name(self) -> str:
         return self.get_full_name()
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # is_staff lets a session resolve workspaces it is no member of
+        bump_user(self.pk)
+
     @property
     def get_workspaces(self):
         return self.workspaces.filter(is_active=True).order_by("name")
@@ -230,6 +244,13 @@ class WorkSpace(SmartModel):
         db_index=True,
         help_text="Bearer token for the Joyce messaging API. Regenerate from workspace settings.",
     )
+    messaging_api_token_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        db_index=True,
+        help_text="SHA-256 of messaging_api_token; API requests are authenticated against this.",
+    )
     external_dlr_url = models.URLField(
         max_length=512,
         blank=True,
@@ -250,6 +271,17 @@ class WorkSpace(SmartModel):
         default=5,
         help_text="Max forward attempts to the external DLR URL (default 5).",
     )
+    external_dlr_batch = models.BooleanField(
+        default=False,
+        help_text="POST pending DLRs to the external URL as one JSON array instead of one request each.",
+    )
+    message_retention_months = models.PositiveIntegerField(
+        default=0,
+        help_text=(
+            "Months of messages kept before the current one; older messages are archived to a "
+            "compressed file and removed from the message log. 0 keeps them forever."
+        ),
+    )
 
     jasmin_user_sync_interval_mins = models.PositiveIntegerField(
         default=5,
@@ -299,8 +331,24 @@ class WorkSpace(SmartModel):
         if self.pk is not None:
             # regenerate the prefix on each save
             self.prefix = self.generate_prefix(self.name)
+
+        update_fields = kwargs.get("update_fields")
+        token_changed = update_fields is None or bool(set(update_fields) & set(MESSAGING_API_FIELDS))
+        if token_changed:
+            # Still the hash of the token as last saved
+            previous_hash = self.messaging_api_token_hash
+            self.messaging_api_token_hash = hash_token(self.messaging_api_token)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"messaging_api_token_hash"}
         super().save(*args, **kwargs)
 
+        if token_changed:
+            invalidate_token_hash(previous_hash)
+            invalidate_token_hash(self.messaging_api_token_hash)
+        bump_workspace(self.pk)
+        if update_fields is None or set(update_fields) & set(CONNECTION_FIELDS):
+            invalidate_jasmin_connection(self.pk)
+
     @classmethod
     def create(cls, user, country, name: str, tz):
         """
@@ -369,6 +417,8 @@ class WorkSpace(SmartModel):
         self.users.remove(user)
         if user in self._membership_cache:
             del self._membership_cache[user]
+        bump_workspace(self.pk)
+        bump_user(user.pk)
 
     def get_owner(self) -> User:
         # look thru roles in order for the first added user
@@ -426,6 +476,7 @@ class WorkSpace(SmartModel):
         self.jasmin_http_api_url = ""
         self.jasmin_rest_api_url = ""
         self.jasmin_connection_tested_at = None
+        invalidate_jasmin_connection(self.pk)
         if save:
             self.save(
                 update_fields=[
@@ -444,6 +495,17 @@ class WorkSpace(SmartModel):
                 ]
             )
 
+    def regenerate_messaging_api_token(self) -> str:
+        """Issue a new messaging API token; the old one stops working immediately."""
+        import secrets
+
+        previous_hash = self.messaging_api_token_hash
+        self.messaging_api_enabled = True
+        self.messaging_api_token = secrets.token_urlsafe(32)
+        self.save(update_fields=["messaging_api_enabled", "messaging_api_token", "modified_on"])
+        invalidate_token_hash(previous_hash)
+        return self.messaging_api_token
+
     def is_jasmin_ready(self) -> bool:
         """
         Whether this workspace may use Configure/Operate against Jasmin.
@@ -472,6 +534,18 @@ class WorkSpaceMembership(models.Model):
     def role(self):
         return WorkSpaceRole.from_code(self.role_code)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_workspace(self.workspace_id)
+        bump_user(self.user_id)
+
     class Meta:
         unique_together = (("workspace", "user"),)
         db_table = "workspace_membership"
+
+
+@receiver(post_delete, sender=WorkSpaceMembership)
+def membership_deleted(sender, instance, **kwargs):
+    # Unlike an override of delete(), also runs for queryset and cascading deletes
+    bump_workspace(instance.workspace_id)
+    bump_user(instance.user_id)
@@ -1,3 +1,77 @@
-from django.test import TestCase
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from quark.middleware import WorkspaceMiddleware
+
+from .models import User, WorkSpace, WorkSpaceRole
+
+
+class WorkspaceMiddlewareCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="member", password="12345678")
+        self.workspace = WorkSpace.objects.create(
+            name="Primary Space", timezone="UTC", prefix="primaryspace",
+            created_by=self.user, modified_by=self.user,
+        )
+        self.workspace.add_user(self.user, WorkSpaceRole.ADMINISTRATOR)
+        self.session = SessionStore()
+        self.session["workspace_id"] = self.workspace.pk
+        self.session.save()
+        self.middleware = WorkspaceMiddleware(lambda request: HttpResponse())
+
+    def _request(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.session = SessionStore(self.session.session_key)
+        # Loading the session is SessionMiddleware's query, not ours
+        request.session.get("workspace_id")
+        return request
+
+    def _resolve(self):
+        request = self._request()
+        self.middleware(request)
+        request.session.save()
+        return request.workspace
+
+    def test_warm_requests_resolve_without_queries(self):
+        self.assertEqual(self._resolve(), self.workspace)
+
+        request = self._request()
+        with self.assertNumQueries(0):
+            self.middleware(request)
+        self.assertEqual(request.workspace, self.workspace)
+        self.assertEqual(request.workspace.get_user_role(self.user), WorkSpaceRole.ADMINISTRATOR)
+
+    def test_membership_and_activation_changes_invalidate(self):
+        self.assertEqual(self._resolve(), self.workspace)
+
+        self.workspace.remove_user(self.user)
+        self.assertIsNone(self._resolve())
+
+        self.workspace.add_user(self.user, WorkSpaceRole.ADMINISTRATOR)
+        self.assertEqual(self._resolve(), self.workspace)
+
+        self.workspace.is_active = False
+        self.workspace.save()
+        self.assertIsNone(self._resolve())
+
+    def test_bulk_membership_deletes_and_staff_changes_invalidate(self):
+        from .models import WorkSpaceMembership
+
+        self.assertEqual(self._resolve(), self.workspace)
+        WorkSpaceMembership.objects.filter(workspace=self.workspace, user=self.user).delete()
+        self.assertIsNone(self._resolve())
+
+        other = WorkSpace.objects.create(
+            name="Other Space", timezone="UTC", prefix="otherspace", created_by=self.user, modified_by=self.user,
+        )
+        self.user.is_staff = True
+        self.user.save()
+        self.session["workspace_id"] = other.pk
+        self.session.save()
+        self.assertEqual(self._resolve(), other)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertIsNone(self._resolve())
@@ -122,6 +122,17 @@ class WorkspaceSettingsForm(forms.ModelForm):
         help_text="How often to pull live quotas into Joyce. 0 disables automatic sync.",
         widget=_number(min="0"),
     )
+    message_retention_months = forms.IntegerField(
+        min_value=0,
+        required=False,
+        initial=0,
+        label="Message retention (months)",
+        help_text=(
+            "Whole months kept before the current one. Older messages are archived to a file "
+            "and removed from the log. 0 keeps everything."
+        ),
+        widget=_number(min="0"),
+    )
     messaging_api_enabled = forms.BooleanField(
         required=False,
         label="Enable Joyce messaging API",
@@ -132,7 +143,7 @@ class WorkspaceSettingsForm(forms.ModelForm):
         required=False,
         label="External DLR URL",
         widget=_text(placeholder="https://your-app.example.com/webhooks/dlr"),
-        help_text="Optional. After Joyce handles a DLR, it is forwarded here (async, with retries).",
+        help_text="Optional. After Joyce handles a DLR, it is forwarded here (async, batched, with retries).",
     )
     external_dlr_method = forms.ChoiceField(
         required=False,
@@ -166,6 +177,12 @@ class WorkspaceSettingsForm(forms.ModelForm):
         widget=_number(min="1", max="20"),
         help_text="Default 5.",
     )
+    external_dlr_batch = forms.BooleanField(
+        required=False,
+        label="Forward DLRs as a JSON array",
+        help_text="POST only. Your endpoint receives a list of DLR objects per request.",
+        widget=forms.CheckboxInput(attrs={"class": "checkbox checkbox-sm"}),
+    )
 
     class Meta:
         model = WorkSpace
@@ -182,11 +199,13 @@ class WorkspaceSettingsForm(forms.ModelForm):
             "jasmin_http_api_url",
             "jasmin_rest_api_url",
             "jasmin_user_sync_interval_mins",
+            "message_retention_months",
             "messaging_api_enabled",
             "external_dlr_url",
             "external_dlr_method",
             "external_dlr_retry_delay_secs",
             "external_dlr_max_retries",
+            "external_dlr_batch",
         )
 
     def __init__(self, *args, **kwargs):
@@ -283,6 +302,8 @@ class WorkspaceSettingsForm(forms.ModelForm):
             instance.external_dlr_retry_delay_secs = 60
         if self.cleaned_data.get("external_dlr_max_retries") in (None, ""):
             instance.external_dlr_max_retries = 5
+        if self.cleaned_data.get("message_retention_months") in (None, ""):
+            instance.message_retention_months = 0
         if not self.cleaned_data.get("external_dlr_method"):
             instance.external_dlr_method = "POST"
 
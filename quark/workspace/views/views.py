@@ -188,11 +188,13 @@ class WorkspaceCRUDL(SmartCRUDL):
             "jasmin_http_api_url",
             "jasmin_rest_api_url",
             "jasmin_user_sync_interval_mins",
+            "message_retention_months",
             "messaging_api_enabled",
             "external_dlr_url",
             "external_dlr_method",
             "external_dlr_retry_delay_secs",
             "external_dlr_max_retries",
+            "external_dlr_batch",
         )
 
         @classmethod
@@ -239,8 +241,6 @@ class WorkspaceCRUDL(SmartCRUDL):
             return super().post(request, *args, **kwargs)
 
         def regenerate_messaging_api_token(self, request):
-            import secrets
-
             workspace = self.derive_workspace()
             want_enabled = request.POST.get("messaging_api_enabled") in (
                 "on",
@@ -256,12 +256,7 @@ class WorkspaceCRUDL(SmartCRUDL):
                     },
                     status=400,
                 )
-            token = secrets.token_urlsafe(32)
-            workspace.messaging_api_enabled = True
-            workspace.messaging_api_token = token
-            workspace.save(
-                update_fields=["messaging_api_enabled", "messaging_api_token", "modified_on"]
-            )
+            token = workspace.regenerate_messaging_api_token()
             return JsonResponse(
                 {
                     "ok": True,